@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, models, transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from common.uuids import uuid7
+
+LAYOUTS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+
+
+class Command(BaseCommand):
+    help = ("Compares insert throughput and primary key index size of random (uuid4) and time-ordered (uuid7) "
+            "keys in a throwaway test database of the configured backend")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000)
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT transaction")
+        parser.add_argument("--cache-kb", type=int, default=2048,
+                            help="SQLite page cache size; keep it below the index size to see the difference")
+
+    def handle(self, *args, **options):
+        test_name = None
+        if connection.vendor == "sqlite":
+            # an on-disk database, so the index has to go through the page cache like in production
+            test_name = os.path.join(tempfile.mkdtemp(), "bench_primary_keys.sqlite3")
+            connection.settings_dict["TEST"]["NAME"] = test_name
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA cache_size = -{options['cache_kb']}")
+            self.stdout.write(f"{connection.vendor}, {options['rows']} rows in batches of {options['batch_size']}")
+            self.stdout.write(f"{'layout':<8} {'rows/s':>10} {'last 10% rows/s':>16} {'index KB':>10}")
+            for layout, make_key in LAYOUTS.items():
+                rate, tail_rate, index_kb = self.measure(f"bench_keys_{layout}", make_key, options)
+                self.stdout.write(f"{layout:<8} {rate:>10.0f} {tail_rate:>16.0f} {index_kb if index_kb is not None else '-':>10}")
+        finally:
+            teardown_databases(databases, verbosity=0)
+            if test_name and os.path.exists(test_name):
+                os.remove(test_name)
+
+    def measure(self, table, make_key, options):
+        key_field, time_field = models.UUIDField(), models.DateTimeField()
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {table} (id {key_field.db_type(connection)} NOT NULL PRIMARY KEY, "
+                           f"created {time_field.db_type(connection)} NOT NULL, payload varchar(64) NOT NULL)")
+        sql = f"INSERT INTO {table} (id, created, payload) VALUES (%s, %s, %s)"
+        rows, batch_size = options["rows"], options["batch_size"]
+        created = time_field.get_db_prep_value(timezone.now(), connection)
+        timings = []
+        for start in range(0, rows, batch_size):
+            batch = [(key_field.get_db_prep_value(make_key(), connection), created, f"row {index}")
+                     for index in range(start, min(start + batch_size, rows))]
+            started = time.perf_counter()
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            timings.append((len(batch), time.perf_counter() - started))
+
+        tail = timings[-max(1, len(timings) // 10):]
+        rate = rows / sum(elapsed for _count, elapsed in timings)
+        tail_rate = sum(count for count, _elapsed in tail) / sum(elapsed for _count, elapsed in tail)
+        return rate, tail_rate, self.index_kb(table)
+
+    @staticmethod
+    def index_kb(table):
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute("SELECT pg_indexes_size(%s)", [table])
+                    return cursor.fetchone()[0] // 1024
+                if connection.vendor == "sqlite":
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [f"sqlite_autoindex_{table}_1"])
+                    return (cursor.fetchone()[0] or 0) // 1024
+        except DatabaseError:
+            pass
+        return None
@@ -0,0 +1,198 @@
+"""
+Per-endpoint request metrics: SQL count, DB time, render time and response size.
+
+``RequestMetricsMiddleware`` times every query of a sampled request through
+``connection.execute_wrapper``, adds a ``Server-Timing`` header and records the
+request in ``registry``, which keeps the last ``WINDOW`` requests per endpoint and
+turns them into percentiles on demand (``/metrics/`` or the periodic log line).
+
+A query text that repeats ``N_PLUS_ONE_THRESHOLD`` times in one request is reported
+as a likely N+1. Queries are compared by their SQL with the parameters left out, so
+the same lookup for different rows counts as one template.
+
+A streaming response is timed up to its first byte; the queries it runs while the
+body is sent are not counted and its size is recorded as 0.
+
+Settings, all optional, in ``REQUEST_METRICS``: ``ENABLED``, ``SAMPLE_RATE``,
+``WINDOW``, ``N_PLUS_ONE_THRESHOLD``, ``SERVER_TIMING`` and ``LOG_INTERVAL``
+(seconds between summary log lines, 0 turns them off).
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SAMPLE_RATE": 1.0,
+    "WINDOW": 1000,
+    "N_PLUS_ONE_THRESHOLD": 5,
+    "SERVER_TIMING": True,
+    "LOG_INTERVAL": 0,
+}
+# "IN (%s, %s, %s)" of any length is the same template
+PLACEHOLDER_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+
+
+def metrics_option(name):
+    return getattr(settings, "REQUEST_METRICS", {}).get(name, DEFAULTS[name])
+
+
+def sql_template(sql):
+    return PLACEHOLDER_LIST_RE.sub("(%s...)", sql)
+
+
+def percentile(values, fraction):
+    # nearest rank on a sorted list
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class QueryRecorder:
+    """
+    The ``execute_wrapper`` of one request: counts and times its queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        templates = Counter()
+        for sql, count in self.statements.items():
+            templates[sql_template(sql)] += count
+        return [(sql, count) for sql, count in templates.most_common() if count >= threshold]
+
+
+class EndpointStats:
+
+    def __init__(self, window):
+        self.requests = 0
+        self.n_plus_one = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, total, db, render, queries, size, n_plus_one):
+        self.requests += 1
+        self.n_plus_one += bool(n_plus_one)
+        self.samples.append((total, db, render, queries, size))
+
+    def summary(self):
+        columns = list(zip(*self.samples)) or [()] * 5
+        total, db, render, queries, size = (sorted(column) for column in columns)
+        return {
+            "requests": self.requests,
+            "n_plus_one": self.n_plus_one,
+            "window": len(self.samples),
+            "total_ms": {"p50": percentile(total, 0.5), "p95": percentile(total, 0.95),
+                         "p99": percentile(total, 0.99), "max": total[-1] if total else 0.0},
+            "db_ms": {"p50": percentile(db, 0.5), "p95": percentile(db, 0.95), "p99": percentile(db, 0.99)},
+            "render_ms": {"p50": percentile(render, 0.5), "p95": percentile(render, 0.95)},
+            "queries": {"p50": percentile(queries, 0.5), "p95": percentile(queries, 0.95),
+                        "max": queries[-1] if queries else 0},
+            "response_bytes": {"p50": percentile(size, 0.5), "max": size[-1] if size else 0},
+        }
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._last_log = time.monotonic()
+
+    def record(self, endpoint, *sample):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats(metrics_option("WINDOW"))
+            stats.add(*sample)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.summary() for endpoint, stats in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def log_if_due(self):
+        interval = metrics_option("LOG_INTERVAL")
+        if not interval:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_log < interval:
+                return
+            self._last_log = now
+        for endpoint, summary in self.snapshot().items():
+            logger.info("%s requests=%d p50=%.1fms p95=%.1fms p99=%.1fms db_p95=%.1fms queries_p95=%s n+1=%d",
+                        endpoint, summary["requests"], summary["total_ms"]["p50"], summary["total_ms"]["p95"],
+                        summary["total_ms"]["p99"], summary["db_ms"]["p95"], summary["queries"]["p95"],
+                        summary["n_plus_one"])
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_option("ENABLED") or random.random() >= metrics_option("SAMPLE_RATE"):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._metrics_view_done = None
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        view_done = request._metrics_view_done
+        render = time.perf_counter() - view_done if view_done is not None else 0.0
+        render = min(render, total)
+        size = 0 if response.streaming else len(response.content)
+        repeated = recorder.repeated(metrics_option("N_PLUS_ONE_THRESHOLD"))
+        match = request.resolver_match
+        endpoint = f"{request.method} /{match.route}" if match is not None else f"{request.method} <unresolved>"
+
+        if repeated:
+            sql, count = repeated[0]
+            logger.warning("Possible N+1 on %s: %d x %s", endpoint, count, sql[:300])
+        if metrics_option("SERVER_TIMING"):
+            response["Server-Timing"] = (
+                f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+                f"render;dur={render * 1000:.2f}, total;dur={total * 1000:.2f}"
+            )
+        registry.record(endpoint, total * 1000, recorder.duration * 1000, render * 1000, recorder.count, size,
+                        bool(repeated))
+        registry.log_if_due()
+        return response
+
+    def process_template_response(self, request, response):
+        # called when the view returns a DRF/template response, right before it is rendered
+        request._metrics_view_done = time.perf_counter()
+        return response
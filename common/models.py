@@ -1,10 +1,11 @@
-import uuid
-
 from django.db import models
 
+from common.uuids import uuid7
+
 
 class BaseModel(models.Model):
-    id = models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, unique=True)
+    # time-ordered keys: inserts append to the primary key index (see common.uuids)
+    id = models.UUIDField(default=uuid7, editable=False, primary_key=True, unique=True)
     created_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
 
@@ -1,3 +1,76 @@
-from django.test import TestCase
+import datetime
+import uuid
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from common.metrics import QueryRecorder, percentile, registry, sql_template
+from common.uuids import uuid7, uuid7_time
+from core.models import User
+from store.models import Category
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+
+    def test_server_timing_header_and_snapshot(self):
+        Category.objects.create(name="Shoes")
+        response = self.client.get("/store/category/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, total;dur=')
+
+        snapshot = registry.snapshot()
+        self.assertIn("GET /store/category/", snapshot)
+        self.assertEqual(snapshot["GET /store/category/"]["requests"], 1)
+
+    @override_settings(REQUEST_METRICS={"SAMPLE_RATE": 0})
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get("/store/category/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_repeated_templates_are_flagged(self):
+        recorder = QueryRecorder()
+        execute = lambda sql, params, many, context: None
+        for index in range(5):
+            recorder(execute, 'SELECT * FROM "store_size" WHERE "id" = %s', [index], False, {})
+        recorder(execute, 'SELECT * FROM "store_size" WHERE "id" IN (%s, %s)', [1, 2], False, {})
+        recorder(execute, 'SELECT * FROM "store_size" WHERE "id" IN (%s, %s, %s)', [1, 2, 3], False, {})
+
+        self.assertEqual(recorder.count, 7)
+        self.assertEqual(recorder.repeated(5), [('SELECT * FROM "store_size" WHERE "id" = %s', 5)])
+        self.assertEqual(recorder.repeated(2)[1][1], 2)
+        self.assertEqual(sql_template("IN (%s, %s, %s)"), "IN (%s...)")
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertIn(self.client.get("/common/metrics/").status_code, (401, 403))
+        admin = User.objects.create_superuser(email="admin@example.com", full_name="Admin", password="secret")
+        self.client.force_authenticate(admin)
+        response = self.client.get("/common/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("GET /common/metrics/", response.json()["data"])
+
+
+class UUID7Tests(SimpleTestCase):
+
+    def test_keys_are_version_7_and_strictly_increasing(self):
+        keys = [uuid7() for _index in range(20000)]
+        self.assertEqual({(key.version, key.variant) for key in keys}, {(7, uuid.RFC_4122)})
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertEqual([key.hex for key in keys], sorted(key.hex for key in keys))
+
+    def test_timestamp_round_trips(self):
+        created = datetime.datetime(2023, 5, 17, 10, 30, 15, 123000, tzinfo=datetime.timezone.utc)
+        self.assertEqual(uuid7_time(uuid7(created)), created)
+        self.assertLess(uuid7(created), uuid7(created + datetime.timedelta(milliseconds=1)))
+        self.assertIsNone(uuid7_time(uuid.uuid4()))
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from common.views import RequestMetricsView
+
+
+urlpatterns = [
+    path("metrics/", RequestMetricsView.as_view(), name="request-metrics"),
+]
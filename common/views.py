@@ -1,3 +1,17 @@
-from django.shortcuts import render
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from common.metrics import registry
+
+
+class RequestMetricsView ( APIView ):
+    
+    permission_classes = [ IsAdminUser ]
+    
+    def get ( self, request):
+        return Response({'status':'successful','message':'request metrics per endpoint','data':registry.snapshot() })
+    
+    def delete ( self, request):
+        registry.reset()
+        return Response({'status':'successful','message':'request metrics have been reset','data':[] })
@@ -6,4 +6,7 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        from core import signals
\ No newline at end of file
+        from core import signals
+        from core.email_templates import email_templates
+
+        email_templates.precompile()
\ No newline at end of file
@@ -7,3 +7,25 @@ GENDER_CHOICES = (
     (GENDER_FEMALE, "Female"),
     (GENDER_OTHERS, "Others"),
 )
+
+EMAIL_PENDING = "P"
+EMAIL_SENDING = "S"
+EMAIL_SENT = "D"
+EMAIL_FAILED = "F"
+
+EMAIL_STATUS_CHOICES = (
+    (EMAIL_PENDING, "Pending"),
+    (EMAIL_SENDING, "Sending"),
+    (EMAIL_SENT, "Sent"),
+    (EMAIL_FAILED, "Failed"),
+)
+
+OTP_ACTIVATION = "A"
+OTP_EMAIL_CHANGE = "E"
+OTP_PASSWORD_RESET = "P"
+
+OTP_PURPOSE_CHOICES = (
+    (OTP_ACTIVATION, "Account Activation"),
+    (OTP_EMAIL_CHANGE, "Email Change"),
+    (OTP_PASSWORD_RESET, "Password Reset"),
+)
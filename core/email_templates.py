@@ -0,0 +1,102 @@
+"""
+Email body rendering from templates compiled once per process.
+
+``render_to_string`` goes through the engine's loader chain on every call;
+``EmailTemplates`` resolves each template once (``precompile`` runs from
+``CoreConfig.ready``), keeps the compiled ``Template`` and times every render, so
+``render_stats()`` shows what each email in the signup flow costs.
+"""
+import logging
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+ACTIVATION_TEMPLATE = "activation_email.html"
+EMAIL_CHANGE_TEMPLATE = "email_change.html"
+PASSWORD_RESET_TEMPLATE = "password_reset.html"
+VERIFICATION_TEMPLATE = "verification_email.html"
+
+EMAIL_TEMPLATES = (ACTIVATION_TEMPLATE, EMAIL_CHANGE_TEMPLATE, PASSWORD_RESET_TEMPLATE, VERIFICATION_TEMPLATE)
+
+
+class RenderStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed, renders=1):
+        self.count += renders
+        self.total += elapsed
+        self.max = max(self.max, elapsed / renders)
+
+    def as_dict(self):
+        return {
+            "renders": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class EmailTemplates:
+
+    def __init__(self, names=EMAIL_TEMPLATES):
+        self.names = names
+        self._templates = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def precompile(self):
+        for name in self.names:
+            try:
+                self.get(name)
+            except TemplateDoesNotExist:
+                logger.warning("Email template %s does not exist", name)
+
+    def get(self, name):
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = get_template(name)
+        return template
+
+    def render(self, name, context):
+        return self.render_many(name, [context])[0]
+
+    def render_many(self, name, contexts):
+        """
+        Renders ``name`` once per context in ``contexts``, e.g. one per recipient.
+        """
+        template = self.get(name)
+        started = time.perf_counter()
+        rendered = [template.render(context) for context in contexts]
+        elapsed = time.perf_counter() - started
+        if rendered:
+            with self._lock:
+                self._stats.setdefault(name, RenderStats()).add(elapsed, len(rendered))
+        logger.debug("Rendered %s x%d in %.2fms", name, len(rendered), elapsed * 1000)
+        return rendered
+
+    def stats(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def reset(self):
+        # dropped on template edits in development, see core.signals
+        self._templates.clear()
+
+
+email_templates = EmailTemplates()
+
+
+def render_email(name, context):
+    return email_templates.render(name, context)
+
+
+def render_stats():
+    return email_templates.stats()
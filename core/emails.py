@@ -1,53 +1,57 @@
-import random
-import threading
 import warnings
 
-from django.conf import settings
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
-from django.utils import timezone
-
-from core.models import Otp, User
-
-
-def send_otp_email(user, subject, template_name, code_expiry_time):
-    try:
-        user = User.objects.get(id=user.id)
-    except User.DoesNotExist:
-        warnings.warn(f"User with this id {user.id} does not exist")
-        return
-    code = random.randint(1000, 9999)
-    otp = Otp.objects.create(user=user, code=code,
-                             expiry_date=timezone.now() + timezone.timedelta(minutes=code_expiry_time))
-    context = {'full_name': user.full_name, 'code': otp.code}
-    message = render_to_string(template_name, context)
-    send_email(subject, message, user.email)
+from core.choices import OTP_ACTIVATION, OTP_EMAIL_CHANGE, OTP_PASSWORD_RESET
+from core.email_templates import (ACTIVATION_TEMPLATE, EMAIL_CHANGE_TEMPLATE, PASSWORD_RESET_TEMPLATE,
+                                  VERIFICATION_TEMPLATE, email_templates, render_email)
+from core.models import User
+from core.otp import issue_otps
+from core.outbox import enqueue_email, enqueue_emails, outbox_email
+
+
+def send_otp_email(user, purpose, subject, template_name, code_expiry_time):
+    send_otp_emails([user], purpose, subject, template_name, code_expiry_time)
+
+
+def send_otp_emails(users, purpose, subject, template_name, code_expiry_time):
+    """
+    Issues an OTP for each of ``users`` and queues their emails, rendering the
+    template once per recipient from the compiled template. The query count does not
+    depend on the number of users.
+    """
+    ids = [user.id for user in users]
+    found = {user.id: user for user in User.objects.filter(id__in=ids)}
+    for missing in [user_id for user_id in ids if user_id not in found]:
+        warnings.warn(f"User with this id {missing} does not exist")
+    if not found:
+        return []
+    issued = issue_otps(found.values(), purpose, code_expiry_time)
+    messages = email_templates.render_many(template_name, [
+        {'full_name': otp.user.full_name, 'code': code} for otp, code in issued
+    ])
+    return enqueue_emails([outbox_email(subject, message, otp.user.email)
+                           for (otp, _code), message in zip(issued, messages)])
 
 
 def send_email(subject, message, to):
-    msg = EmailMessage(subject=subject, body=message, from_email=settings.EMAIL_HOST_USER, to=[to])
-    msg.content_subtype = 'html'
-    msg.send()
+    # queued in the outbox and delivered by core.outbox after the transaction commits
+    return enqueue_email(subject, message, to)
 
 
 class Util:
     @staticmethod
     def email_activation(user):
-        t = threading.Thread(target=send_otp_email, args=(user, 'Activate Your Account', 'activation_email.html', 15))
-        t.start()
+        send_otp_email(user, OTP_ACTIVATION, 'Activate Your Account', ACTIVATION_TEMPLATE, 15)
 
     @staticmethod
     def email_change(user):
-        t = threading.Thread(target=send_otp_email, args=(user, 'Change Your Email', 'email_change.html', 10))
-        t.start()
+        send_otp_email(user, OTP_EMAIL_CHANGE, 'Change Your Email', EMAIL_CHANGE_TEMPLATE, 10)
 
     @staticmethod
     def email_verified(user):
         context = {'full_name': user.full_name}
-        message = render_to_string("verification_email.html", context)
+        message = render_email(VERIFICATION_TEMPLATE, context)
         send_email('Account Verified', message, user.email)
 
     @staticmethod
     def password_activation(user):
-        t = threading.Thread(target=send_otp_email, args=(user, 'Change Your Password', 'password_reset.html', 10))
-        t.start()
\ No newline at end of file
+        send_otp_email(user, OTP_PASSWORD_RESET, 'Change Your Password', PASSWORD_RESET_TEMPLATE, 10)
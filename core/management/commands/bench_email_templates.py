@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from core.email_templates import EMAIL_TEMPLATES, EmailTemplates
+
+
+class Command(BaseCommand):
+    help = "Times rendering each email template with render_to_string and with the precompiled templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=1000, help="Renders per template")
+
+    def handle(self, *args, **options):
+        renders = options["renders"]
+        contexts = [{"full_name": f"User {index}", "code": 1000 + index % 9000} for index in range(renders)]
+        templates = EmailTemplates()
+        templates.precompile()
+
+        self.stdout.write(f"{'template':<26} {'render_to_string ms':>20} {'precompiled ms':>15} {'per email us':>13}")
+        for name in EMAIL_TEMPLATES:
+            started = time.perf_counter()
+            for context in contexts:
+                render_to_string(name, context)
+            uncached = (time.perf_counter() - started) * 1000
+
+            templates.render_many(name, contexts)
+            stats = templates.stats()[name]
+            self.stdout.write(f"{name:<26} {uncached:>20.2f} {stats['total_ms']:>15.2f} "
+                              f"{stats['mean_ms'] * 1000:>13.1f}")
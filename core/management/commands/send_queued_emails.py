@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.choices import EMAIL_SENT
+from core.models import OutboxEmail
+from core.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Delivers the queued outbox emails, retrying failed sends with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Deliver what is due and exit")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when the outbox is empty")
+        parser.add_argument("--prune-days", type=int, default=None, help="Delete sent emails older than this")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            sent = deliver_pending(options["batch_size"])
+            if sent:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"Sent {sent} emails in {elapsed:.2f}s.")
+            if options["prune_days"] is not None:
+                self.prune(options["prune_days"])
+            if options["once"]:
+                return
+            if not sent:
+                time.sleep(options["interval"])
+
+    def prune(self, days):
+        cutoff = timezone.now() - timezone.timedelta(days=days)
+        deleted, _ = OutboxEmail.objects.filter(status=EMAIL_SENT, sent_at__lt=cutoff).delete()
+        if deleted:
+            self.stdout.write(f"Pruned {deleted} sent emails.")
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.otp import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes used and expired OTPs in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = sweep_expired(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} OTPs in {elapsed:.2f}s."))
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def delete_plaintext_otps(apps, schema_editor):
+    # the old rows hold plaintext codes and were saved already expired, none can be verified
+    apps.get_model("core", "Otp").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxemail"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_plaintext_otps, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="otp",
+            name="code",
+        ),
+        migrations.AddField(
+            model_name="otp",
+            name="code_hash",
+            field=models.CharField(default="", max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="otp",
+            name="purpose",
+            field=models.CharField(
+                choices=[("A", "Account Activation"), ("E", "Email Change"), ("P", "Password Reset")],
+                default="A",
+                max_length=1,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="otp",
+            name="expiry_date",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="otp",
+            index=models.Index(fields=["user", "code_hash"], name="otp_user_code_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="otp",
+            index=models.Index(fields=["expiry_date"], name="otp_expiry_idx"),
+        ),
+    ]
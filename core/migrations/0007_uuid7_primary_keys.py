@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:18
+
+import common.uuids
+from django.db import migrations, models
+
+# The new key default is generated in Python, not by the database, so only the
+# migration state changes. A plain AlterField would make SQLite copy every table.
+MODELS = [
+    "customer",
+    "otp",
+    "outboxemail",
+    "seller",
+    "user",
+]
+
+
+def uuid7_key():
+    return models.UUIDField(
+        default=common.uuids.uuid7,
+        editable=False,
+        primary_key=True,
+        serialize=False,
+        unique=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_otp_hashed_codes"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(model_name=name, name="id", field=uuid7_key())
+                for name in MODELS
+            ]
+        ),
+    ]
@@ -1,4 +1,3 @@
-from uuid import uuid4
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
@@ -6,7 +5,8 @@ from django.utils import timezone
 from django_countries.fields import CountryField
 
 from common.models import BaseModel
-from core.choices import GENDER_CHOICES
+from common.uuids import uuid7
+from core.choices import EMAIL_PENDING, EMAIL_STATUS_CHOICES, GENDER_CHOICES, OTP_PURPOSE_CHOICES
 from core.validators import validate_full_name, validate_phone_number
 from .managers import CustomUserManager
 
@@ -20,7 +20,7 @@ def upload_path(instance, filename):
 
 
 class User(AbstractUser):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     username = None
     full_name = models.CharField(max_length=255, validators=[validate_full_name])
     email = models.EmailField(unique=True)
@@ -71,16 +71,45 @@ class Customer(BaseModel):
 
 class Otp(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="otp")
-    code = models.PositiveIntegerField(null=True)
+    purpose = models.CharField(choices=OTP_PURPOSE_CHOICES, max_length=1)
+    # HMAC of the code, see core.otp.hash_code; the code itself is only ever emailed
+    code_hash = models.CharField(max_length=64)
+    # set once the code is used or replaced by a newer one
     expired = models.BooleanField(default=False)
-    expiry_date = models.DateTimeField(null=True, auto_now_add=True, editable=False)
+    expiry_date = models.DateTimeField()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["user", "code_hash"], name="otp_user_code_idx"),
+            models.Index(fields=["expiry_date"], name="otp_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.full_name} ----- {self.get_purpose_display()}"
+
+    @property
+    def is_valid(self):
+        return not self.expired and self.expiry_date > timezone.now()
+
+
+class OutboxEmail(BaseModel):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    content_subtype = models.CharField(max_length=20, default="html")
+    status = models.CharField(choices=EMAIL_STATUS_CHOICES, max_length=1, default=EMAIL_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a pending email is due, or when the lease of a sending one runs out
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.user.full_name} ----- {self.code}"
-
-    def save(self, *args, **kwargs):
-        self.expiry_date += timezone.timedelta(minutes=15)
-        if timezone.now() == self.expiry_date:
-            self.expired = True
-            self.delete()
-        super(Otp, self).save(*args, **kwargs)
+        return f"{self.subject} -- {', '.join(self.to)} -- {self.get_status_display()}"
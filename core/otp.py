@@ -0,0 +1,117 @@
+"""
+One-time codes for account activation, email change and password reset.
+
+Only an HMAC of each code is stored, keyed on ``SECRET_KEY``, the user and the
+purpose, so a code is found through the ``(user, code_hash)`` index instead of being
+compared row by row. A code is valid while it is unused and ``expiry_date`` is in the
+future; that is checked when it is verified, and ``sweep_expired`` only reclaims the
+space. Failed verifications are counted in the cache per user and purpose.
+
+Settings, all optional, in ``OTP``: ``DIGITS``, ``MAX_ATTEMPTS`` and
+``ATTEMPT_WINDOW`` (seconds the failed attempts are remembered).
+"""
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from core.models import Otp
+
+DEFAULTS = {
+    "DIGITS": 4,
+    "MAX_ATTEMPTS": 5,
+    "ATTEMPT_WINDOW": 900,
+}
+
+
+def otp_option(name):
+    return getattr(settings, "OTP", {}).get(name, DEFAULTS[name])
+
+
+def generate_code():
+    digits = otp_option("DIGITS")
+    return secrets.randbelow(9 * 10 ** (digits - 1)) + 10 ** (digits - 1)
+
+
+def hash_code(user_id, purpose, code):
+    message = f"{user_id}:{purpose}:{str(code).strip()}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def issue_otps(users, purpose, ttl_minutes):
+    """
+    Issues a fresh code for each of ``users``, replacing their unused codes for the
+    same purpose. Returns ``[(otp, code), ...]``; the plain codes are not kept anywhere.
+    """
+    users = list(users)
+    if not users:
+        return []
+    now = timezone.now()
+    Otp.objects.filter(user__in=users, purpose=purpose, expired=False).update(expired=True, updated_date=now)
+    expiry_date = now + timezone.timedelta(minutes=ttl_minutes)
+    codes = [generate_code() for _user in users]
+    otps = Otp.objects.bulk_create([
+        Otp(user=user, purpose=purpose, code_hash=hash_code(user.id, purpose, code), expiry_date=expiry_date)
+        for user, code in zip(users, codes)
+    ])
+    return list(zip(otps, codes))
+
+
+def issue_otp(user, purpose, ttl_minutes):
+    return issue_otps([user], purpose, ttl_minutes)[0]
+
+
+def attempts_key(user_id, purpose):
+    return f"otp:attempts:{user_id}:{purpose}"
+
+
+def verify_otp(user, purpose, code):
+    """
+    Uses up ``code`` if it is a valid code of ``user`` for ``purpose``. The check and
+    the use are one conditional UPDATE, so a code can never be redeemed twice.
+
+    Raises ``Throttled`` once ``MAX_ATTEMPTS`` wrong codes were tried within
+    ``ATTEMPT_WINDOW``.
+    """
+    key = attempts_key(user.id, purpose)
+    window = otp_option("ATTEMPT_WINDOW")
+    if (cache.get(key) or 0) >= otp_option("MAX_ATTEMPTS"):
+        raise Throttled(detail="Too many incorrect codes, please request a new one later.")
+
+    now = timezone.now()
+    used = Otp.objects.filter(user=user, code_hash=hash_code(user.id, purpose, code), purpose=purpose,
+                              expired=False, expiry_date__gt=now).update(expired=True, updated_date=now)
+    if used:
+        cache.delete(key)
+        return True
+
+    # add() starts the window on the first failure; incr() keeps its expiry
+    if not cache.add(key, 1, timeout=window):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=window)
+    return False
+
+
+def sweep_expired(now=None, batch_size=1000):
+    """
+    Deletes used and expired codes in batches of ``batch_size``, each in its own short
+    transaction, so the sweep never holds a lock on the whole table. Returns the
+    number of deleted codes.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        batch = list(Otp.objects.filter(Q(expired=True) | Q(expiry_date__lte=now))
+                     .order_by().values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += Otp.objects.filter(pk__in=batch).delete()[0]
+        if len(batch) < batch_size:
+            return deleted
@@ -0,0 +1,200 @@
+"""
+DB-backed outbox for outgoing email.
+
+``enqueue_email`` only inserts an ``OutboxEmail`` row, so a request never waits on
+SMTP. Rows are delivered in batches over one reused connection by either a small,
+bounded in-process worker pool (woken after the enqueuing transaction commits) or the
+``send_queued_emails`` management command, or both; a row is claimed with a
+conditional UPDATE before it is sent, so concurrent workers never send it twice.
+Failed sends are retried with exponential backoff until ``MAX_ATTEMPTS``.
+
+Settings, all optional, in ``EMAIL_QUEUE``: ``WORKERS`` (in-process threads, 0 leaves
+delivery to the management command), ``BATCH_SIZE``, ``MAX_ATTEMPTS``,
+``BACKOFF_SECONDS`` (first retry delay, doubled per attempt) and ``LEASE_SECONDS``
+(how long a claimed row is locked before another worker may retry it).
+"""
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.choices import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENDING, EMAIL_SENT
+from core.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "WORKERS": 2,
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_SECONDS": 30,
+    "LEASE_SECONDS": 300,
+}
+
+
+def queue_option(name):
+    return getattr(settings, "EMAIL_QUEUE", {}).get(name, DEFAULTS[name])
+
+
+def outbox_email(subject, body, to, from_email=None, content_subtype="html"):
+    return OutboxEmail(
+        subject=subject,
+        body=body,
+        to=[to] if isinstance(to, str) else list(to),
+        from_email=from_email if from_email is not None else settings.EMAIL_HOST_USER,
+        content_subtype=content_subtype,
+    )
+
+
+def enqueue_email(subject, body, to, from_email=None, content_subtype="html"):
+    email = outbox_email(subject, body, to, from_email, content_subtype)
+    email.save()
+    transaction.on_commit(mail_queue.wake)
+    return email
+
+
+def enqueue_emails(emails):
+    """
+    Queues many ``outbox_email(...)`` instances with a single INSERT.
+    """
+    emails = OutboxEmail.objects.bulk_create(emails)
+    transaction.on_commit(mail_queue.wake)
+    return emails
+
+
+def claim_batch(batch_size=None, now=None):
+    """
+    Leases up to ``batch_size`` due emails to this worker and returns them. Both pending
+    rows and rows whose lease ran out (a worker died mid-send) are due.
+    """
+    now = now or timezone.now()
+    due = (OutboxEmail.objects.filter(Q(status=EMAIL_PENDING) | Q(status=EMAIL_SENDING), next_attempt_at__lte=now)
+           .order_by("next_attempt_at").values_list("pk", flat=True)[:batch_size or queue_option("BATCH_SIZE")])
+    token = secrets.token_hex(16)
+    lease = now + timezone.timedelta(seconds=queue_option("LEASE_SECONDS"))
+    # re-checks the due condition so a row claimed by another worker in between is skipped
+    OutboxEmail.objects.filter(Q(status=EMAIL_PENDING) | Q(status=EMAIL_SENDING), pk__in=list(due),
+                               next_attempt_at__lte=now).update(
+        status=EMAIL_SENDING, claim_token=token, next_attempt_at=lease, updated_date=now)
+    return list(OutboxEmail.objects.filter(claim_token=token, status=EMAIL_SENDING))
+
+
+def backoff(attempts):
+    return timezone.timedelta(seconds=queue_option("BACKOFF_SECONDS") * 2 ** (attempts - 1))
+
+
+def to_message(email, connection):
+    message = EmailMessage(subject=email.subject, body=email.body, from_email=email.from_email or None,
+                           to=email.to, connection=connection)
+    message.content_subtype = email.content_subtype
+    return message
+
+
+def deliver(emails):
+    """
+    Sends ``emails`` over a single backend connection and records the outcome of each
+    with one UPDATE for the sent ones and a bulk update for the failures.
+    """
+    if not emails:
+        return 0
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        failed = [(email, error) for email in emails]
+    else:
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([to_message(email, connection)])
+                    sent.append(email.pk)
+                except Exception as error:
+                    failed.append((email, error))
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(status=EMAIL_SENT, sent_at=now, claim_token="",
+                                                      last_error="", updated_date=now)
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = repr(error)
+        email.claim_token = ""
+        email.updated_date = now
+        if email.attempts >= queue_option("MAX_ATTEMPTS"):
+            email.status = EMAIL_FAILED
+            logger.error("Giving up on email %s to %s: %r", email.pk, email.to, error)
+        else:
+            email.status = EMAIL_PENDING
+            email.next_attempt_at = now + backoff(email.attempts)
+    if failed:
+        OutboxEmail.objects.bulk_update(
+            [email for email, _error in failed],
+            ["attempts", "last_error", "claim_token", "status", "next_attempt_at", "updated_date"],
+        )
+    return len(sent)
+
+
+def deliver_pending(batch_size=None, now=None):
+    """
+    Delivers due emails batch by batch until none are left. Returns the number sent.
+    """
+    total = 0
+    while True:
+        batch = claim_batch(batch_size, now)
+        if not batch:
+            return total
+        total += deliver(batch)
+
+
+class MailQueue:
+    """
+    At most ``WORKERS`` threads draining the outbox. A burst of wake-ups while every
+    worker is busy collapses into one more pass instead of queueing a task per email.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._running = 0
+        self._dirty = False
+
+    def wake(self):
+        workers = queue_option("WORKERS")
+        if workers <= 0:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._running >= workers:
+                return
+            self._running += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail-queue")
+        self._executor.submit(self._drain)
+
+    def _drain(self):
+        try:
+            while True:
+                with self._lock:
+                    self._dirty = False
+                try:
+                    deliver_pending()
+                except Exception:
+                    logger.exception("Mail queue worker failed")
+                with self._lock:
+                    if not self._dirty:
+                        self._running -= 1
+                        return
+        finally:
+            connections.close_all()
+
+
+mail_queue = MailQueue()
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils.autoreload import file_changed
 
+from core.email_templates import email_templates
 from core.models import Customer, Seller
 
 User = get_user_model()
@@ -32,3 +34,9 @@ def handle_seller_user_account_deletion(sender, instance, **kwargs):
         user.delete()
     except User.DoesNotExist:
         pass
+
+
+@receiver(file_changed)
+def handle_template_file_changed(sender, file_path, **kwargs):
+    if file_path.suffix == ".html":
+        email_templates.reset()
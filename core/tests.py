@@ -1,3 +1,142 @@
-from django.test import TestCase
+import re
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.exceptions import Throttled
+
+from core.choices import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENDING, EMAIL_SENT, OTP_ACTIVATION, OTP_PASSWORD_RESET
+from core.email_templates import ACTIVATION_TEMPLATE, email_templates
+from core.emails import Util, send_otp_emails
+from core.models import Otp, OutboxEmail, User
+from core.otp import issue_otp, sweep_expired, verify_otp
+from core.outbox import claim_batch, deliver_pending, enqueue_email
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FlakyBackend(EmailBackend):
+
+    def send_messages(self, messages):
+        if any("bounce@example.com" in message.to for message in messages):
+            raise ConnectionError("550 mailbox unavailable")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_QUEUE={"WORKERS": 0, "BATCH_SIZE": 10, "MAX_ATTEMPTS": 2, "BACKOFF_SECONDS": 60})
+class OutboxTests(TestCase):
+
+    @override_settings(EMAIL_BACKEND="core.tests.CountingBackend")
+    def test_queued_emails_are_sent_in_batches_over_one_connection(self):
+        CountingBackend.opened = 0
+        for index in range(25):
+            enqueue_email("Welcome", "<p>Hi</p>", f"user{index}@example.com")
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_pending(), 25)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(mail.outbox[0].content_subtype, "html")
+        # one connection per batch of 10
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertEqual(OutboxEmail.objects.filter(status=EMAIL_SENT).count(), 25)
+
+    @override_settings(EMAIL_BACKEND="core.tests.FlakyBackend")
+    def test_failed_sends_are_retried_with_backoff_then_given_up(self):
+        enqueue_email("Welcome", "<p>Hi</p>", "ok@example.com")
+        bounced = enqueue_email("Welcome", "<p>Hi</p>", "bounce@example.com")
+
+        self.assertEqual(deliver_pending(), 1)
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), (EMAIL_PENDING, 1))
+        self.assertGreater(bounced.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+        self.assertIn("550", bounced.last_error)
+
+        # not due yet
+        self.assertEqual(deliver_pending(), 0)
+        with self.assertLogs("core.outbox", "ERROR"):
+            self.assertEqual(deliver_pending(now=bounced.next_attempt_at), 0)
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), (EMAIL_FAILED, 2))
+
+    def test_a_claimed_email_is_not_claimed_again_until_its_lease_runs_out(self):
+        email = enqueue_email("Welcome", "<p>Hi</p>", "user@example.com")
+        self.assertEqual([claimed.pk for claimed in claim_batch()], [email.pk])
+        self.assertEqual(claim_batch(), [])
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_SENDING)
+        self.assertEqual([claimed.pk for claimed in claim_batch(now=email.next_attempt_at)], [email.pk])
+
+
+@override_settings(EMAIL_QUEUE={"WORKERS": 0})
+class EmailRenderingTests(TestCase):
+
+    def test_batch_otp_emails_render_one_body_per_recipient(self):
+        users = [User.objects.create_user(email=f"user{index}@example.com", full_name=f"User {index}", password=None)
+                 for index in range(3)]
+        renders = email_templates.stats().get(ACTIVATION_TEMPLATE, {}).get("renders", 0)
+
+        with self.assertNumQueries(4):
+            emails = send_otp_emails(users, OTP_ACTIVATION, "Activate Your Account", ACTIVATION_TEMPLATE, 15)
+
+        by_email = {user.email: user for user in users}
+        for email in emails:
+            user = by_email[email.to[0]]
+            code = re.search(r"<h2>(\d+)</h2>", email.body).group(1)
+            self.assertTrue(verify_otp(user, OTP_ACTIVATION, code))
+        self.assertEqual(email_templates.stats()[ACTIVATION_TEMPLATE]["renders"], renders + 3)
+
+    def test_util_queues_instead_of_sending(self):
+        user = User.objects.create_user(email="user@example.com", full_name="Jane Doe", password=None)
+        Util.email_verified(user)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn("Jane Doe", OutboxEmail.objects.get(to=["user@example.com"]).body)
+
+
+@override_settings(OTP={"MAX_ATTEMPTS": 3, "ATTEMPT_WINDOW": 60})
+class OtpTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", full_name="Jane Doe", password=None)
+
+    def test_code_is_stored_hashed_and_can_be_used_once(self):
+        otp, code = issue_otp(self.user, OTP_ACTIVATION, 15)
+        self.assertNotIn(str(code), otp.code_hash)
+        self.assertFalse(verify_otp(self.user, OTP_PASSWORD_RESET, code))
+        self.assertTrue(verify_otp(self.user, OTP_ACTIVATION, code))
+        self.assertFalse(verify_otp(self.user, OTP_ACTIVATION, code))
+
+    def test_expired_and_replaced_codes_are_rejected(self):
+        _otp, old_code = issue_otp(self.user, OTP_ACTIVATION, 15)
+        otp, code = issue_otp(self.user, OTP_ACTIVATION, 15)
+        self.assertFalse(verify_otp(self.user, OTP_ACTIVATION, old_code))
+
+        Otp.objects.filter(pk=otp.pk).update(expiry_date=timezone.now())
+        self.assertFalse(verify_otp(self.user, OTP_ACTIVATION, code))
+
+    def test_wrong_codes_are_rate_limited(self):
+        _otp, code = issue_otp(self.user, OTP_ACTIVATION, 15)
+        for _attempt in range(3):
+            self.assertFalse(verify_otp(self.user, OTP_ACTIVATION, "0"))
+        with self.assertRaises(Throttled):
+            verify_otp(self.user, OTP_ACTIVATION, code)
+
+    def test_sweeper_deletes_used_and_expired_codes_in_batches(self):
+        for _index in range(5):
+            issue_otp(self.user, OTP_ACTIVATION, 15)
+        live, _code = issue_otp(self.user, OTP_PASSWORD_RESET, 15)
+        stale, _code = issue_otp(self.user, OTP_ACTIVATION, 15)
+        Otp.objects.filter(pk=stale.pk).update(expiry_date=timezone.now() - timezone.timedelta(minutes=1))
+
+        self.assertEqual(sweep_expired(batch_size=2), 6)
+        self.assertEqual(list(Otp.objects.values_list("pk", flat=True)), [live.pk])
@@ -20,10 +20,23 @@ DATABASES = {
     },
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": config("CACHE_LOCATION", "/var/tmp/ecommerce_cache"),
+    }
+}
+
 INSTALLED_APPS.remove("debug_toolbar")
 
 MIDDLEWARE.remove("debug_toolbar.middleware.DebugToolbarMiddleware")
 
+REQUEST_METRICS = {
+    **REQUEST_METRICS,
+    "SAMPLE_RATE": config("METRICS_SAMPLE_RATE", 0.1, cast=float),
+    "LOG_INTERVAL": 300,
+}
+
 STORAGES = {
     "default": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
@@ -98,6 +98,7 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "common.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
@@ -151,6 +152,63 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ecommerce",
+    }
+}
+
+# Product detail cache: in-process LRU (LOCAL_*) in front of the CACHES alias
+PRODUCT_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 300,
+    "LOCAL_MAXSIZE": 1024,
+    "LOCAL_TTL": 5,
+}
+
+# Category tree and list cache (see store.categories); entries are dropped when categories change
+CATEGORY_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 3600,
+    "LOCAL_MAXSIZE": 8,
+    "LOCAL_TTL": 5,
+}
+
+# Coupon validity cache (see store.coupons); short-lived, usage limits are enforced in the database
+COUPON_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 30,
+    "LOCAL_MAXSIZE": 1024,
+    "LOCAL_TTL": 5,
+}
+
+# Slugs kept in the in-process slug -> product id map (see store.slugs)
+SLUG_MAP_MAX_SIZE = 100_000
+
+# Per-endpoint SQL count and latency percentiles (see common.metrics), served at common/metrics/
+REQUEST_METRICS = {
+    "ENABLED": True,
+    "SAMPLE_RATE": 1.0,
+    "WINDOW": 1000,
+    "N_PLUS_ONE_THRESHOLD": 5,
+    "SERVER_TIMING": True,
+    "LOG_INTERVAL": 0,
+}
+
+# Keep the unfiltered catalog facet counts in store.FacetCount (see store.facets)
+MATERIALIZED_FACET_COUNTS = False
+
+# Flash sale scheduling (see store.flash_sales), run by the run_flash_sales command
+FLASH_SALES = {
+    "WARM_AHEAD_SECONDS": 60,
+    "INTERVAL": 15,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -216,6 +274,23 @@ EMAIL_BACKEND = (
     "django.core.mail.backends.console.EmailBackend"  # using terminal to receive email
 )
 
+# Outgoing email is queued in core.OutboxEmail (see core.outbox); WORKERS = 0 leaves
+# delivery to the send_queued_emails command
+EMAIL_QUEUE = {
+    "WORKERS": 2,
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_SECONDS": 30,
+    "LEASE_SECONDS": 300,
+}
+
+# One-time codes, see core.otp
+OTP = {
+    "DIGITS": 4,
+    "MAX_ATTEMPTS": 5,
+    "ATTEMPT_WINDOW": 900,
+}
+
 # Gmail settings for development
 # EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 #
@@ -16,6 +16,7 @@ urlpatterns = [
     path("__debug__/", include("debug_toolbar.urls")),
         # applications url
     path('store/', include('store.api.urls')),
+    path('common/', include('common.urls')),
 ]
 
 if settings.DEBUG:
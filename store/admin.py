@@ -1,13 +1,18 @@
 from urllib.parse import urlencode
 
 from django.contrib import admin, messages
-from django.db.models import Count
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
-from store.api.forms import ProductAdminForm
-from store.models import Category, CartItem, Address, Country, Cart, Colour, ColourInventory, CouponCode, Product, ProductImage, Size, SizeInventory, Order, OrderItem
+from store.api.forms import CouponCodeAdminForm, ProductAdminForm, RepriceForm
+from store.categories import adjust_counts_for
+from store.flash_sales import cancel
+from store.repricing import apply_plan, plan_repricing
+from store.search import search_products
+from store.models import Category, CartItem, Address, Country, Cart, Colour, ColourInventory, CouponCode, CouponRedemption, FlashSale, Product, ProductImage, Size, SizeInventory, Order, OrderItem
 
 # Register your models here.
 admin.site.register((Size,))
@@ -15,21 +20,30 @@ admin.site.register((Size,))
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "products_count",)
-    list_filter = ("name",)
-    ordering = ("name",)
-
-    @admin.display(ordering="products_count")
+    list_display = ("indented_name", "products_count", "tree_products_count",)
+    list_filter = ("depth",)
+    list_select_related = ("parent",)
+    ordering = ("path",)
+    readonly_fields = ("depth", "product_count", "tree_product_count",)
+    search_fields = ("name",)
+
+    @admin.display(description="Name", ordering="path")
+    def indented_name(self, category):
+        return format_html('{}{}', mark_safe("&mdash; " * category.depth), category.name)
+
+    # stored in-stock counts (see store.categories), no COUNT per changelist view
+    @admin.display(description="Products", ordering="product_count")
     def products_count(self, category):
         url = (reverse("admin:store_product_changelist")
                + "?"
                + urlencode({"category__id": str(category.id)})
                )
 
-        return format_html('<a href="{}">{} Products</a>', url, category.products_count)
+        return format_html('<a href="{}">{} Products</a>', url, category.product_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(products_count=Count("products"))
+    @admin.display(description="With subcategories", ordering="tree_product_count")
+    def tree_products_count(self, category):
+        return category.tree_product_count
 
 
 @admin.register(Colour)
@@ -70,6 +84,7 @@ class ColourInventoryInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    actions = ("reprice",)
     inlines = (ProductImageAdmin, SizeInventoryInline, ColourInventoryInline)
     form = ProductAdminForm
     list_display = ("seller_name", "title", "category", "price", "percentage_off", "discount_price",
@@ -79,7 +94,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_select_related = ("category",)
     ordering = ("title", "category", "percentage_off",)
     readonly_fields = ("product_images",)
+    reprice_preview_rows = 50
     search_fields = ("title", "category__name",)
+    search_result_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        product_ids = search_products(search_term, limit=self.search_result_limit)
+        return queryset.filter(id__in=product_ids), False
 
     @staticmethod
     def seller_name(obj: Product):
@@ -93,6 +116,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description="Clear inventory")
     def clear_inventory(self, request, queryset):
+        adjust_counts_for(queryset.filter(inventory__gt=0), -1)
         updated_count = queryset.update(inventory=0)
         self.message_user(
                 request,
@@ -100,6 +124,36 @@ class ProductAdmin(admin.ModelAdmin):
                 messages.ERROR,
         )
 
+    # rules are applied to the whole selection at once and written with bulk_update,
+    # no save() per product (see store.repricing)
+    @admin.action(description="Reprice selected products")
+    def reprice(self, request, queryset):
+        form = RepriceForm(request.POST if "rules" in request.POST else None)
+        plan = None
+        if form.is_valid():
+            try:
+                plan = plan_repricing(queryset, form.cleaned_data["rules"])
+            except ValueError as error:
+                form.add_error("rules", str(error))
+        if plan is not None and "apply" in request.POST:
+            updated = apply_plan(plan)
+            self.message_user(request, f"{updated} products were repriced.", messages.SUCCESS)
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Reprice products",
+            "opts": self.model._meta,
+            "form": form,
+            "queryset": queryset,
+            "plan": plan,
+            "changes": list(plan.changes(limit=self.reprice_preview_rows)) if plan is not None else [],
+            "summary": plan.summary() if plan is not None else None,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "select_across": request.POST.get("select_across", "0"),
+        }
+        return TemplateResponse(request, "admin/store/product/reprice.html", context)
+
     @staticmethod
     def product_images(obj: Product):
         product_images = obj.images.all()
@@ -115,13 +169,47 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(CouponCode)
 class CouponCodeAdmin(admin.ModelAdmin):
-    list_display = ("code", "price", "expired",)
+    form = CouponCodeAdminForm
+    list_display = ("code", "price", "expired", "times_used", "max_uses",)
     list_filter = ("expired", "price",)
     list_per_page = 20
     ordering = ("code", "expired",)
     search_fields = ("price",)
 
 
+# the redemption ledger is written by store.coupons only
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ("coupon", "order", "amount", "created_date",)
+    list_select_related = ("coupon", "order",)
+    search_fields = ("coupon__code",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FlashSale)
+class FlashSaleAdmin(admin.ModelAdmin):
+    actions = ("cancel_sales",)
+    autocomplete_fields = ("products",)
+    list_display = ("title", "percentage_off", "starts_at", "ends_at", "status", "warmed_at",)
+    list_filter = ("status",)
+    ordering = ("-starts_at",)
+    readonly_fields = ("status", "warmed_at",)
+    search_fields = ("title",)
+
+    # the run_flash_sales command starts and ends sales; cancelling an active one ends it now
+    @admin.action(description="Cancel selected flash sales")
+    def cancel_sales(self, request, queryset):
+        sales = list(queryset)
+        for sale in sales:
+            cancel(sale)
+        self.message_user(request, f"{len(sales)} flash sales were cancelled.", messages.SUCCESS)
+
+
 @admin.register( Order )
 class Order (admin.ModelAdmin):
     list_display = ('customer', 'transaction_ref', 'placed_at', 'total_price', 'address', 'payment_status', 'shipping_status',)
@@ -28,4 +28,26 @@ SHIPPING_STATUS_SHIPPED = "PR"
 SHIPPING_STATUS_CHOICES = (
     (SHIPPING_STATUS_PENDING, "Pending"),
     (SHIPPING_STATUS_SHIPPED, "Shipping"),
-)
\ No newline at end of file
+)
+
+RESERVATION_HELD = "H"
+RESERVATION_COMMITTED = "C"
+RESERVATION_RELEASED = "R"
+
+RESERVATION_STATUS_CHOICES = (
+    (RESERVATION_HELD, "Held"),
+    (RESERVATION_COMMITTED, "Committed"),
+    (RESERVATION_RELEASED, "Released"),
+)
+
+FLASH_SALE_SCHEDULED = "S"
+FLASH_SALE_ACTIVE = "A"
+FLASH_SALE_ENDED = "E"
+FLASH_SALE_CANCELLED = "C"
+
+FLASH_SALE_STATUS_CHOICES = (
+    (FLASH_SALE_SCHEDULED, "Scheduled"),
+    (FLASH_SALE_ACTIVE, "Active"),
+    (FLASH_SALE_ENDED, "Ended"),
+    (FLASH_SALE_CANCELLED, "Cancelled"),
+)
@@ -2,7 +2,8 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory
 
-from store.models import ColourInventory, Product, SizeInventory
+from store.models import ColourInventory, CouponCode, Product, SizeInventory
+from store.repricing import RULES, parse_rules
 
 
 class ProductAdminForm(forms.ModelForm):
@@ -48,3 +49,33 @@ class ProductAdminForm(forms.ModelForm):
                     quantity = 0
                 total_quantity += quantity
         return total_quantity
+
+
+class CouponCodeAdminForm(forms.ModelForm):
+    class Meta:
+        model = CouponCode
+        fields = "__all__"
+
+    # A limit below the current usage would fail the couponcode_usage_within_limit constraint
+    def clean_max_uses(self):
+        max_uses = self.cleaned_data.get("max_uses")
+        if max_uses is None or self.instance._state.adding:
+            return max_uses
+        times_used = CouponCode.objects.filter(pk=self.instance.pk).values_list("times_used", flat=True).first() or 0
+        if max_uses < times_used:
+            raise ValidationError(f"The code has already been used {times_used} times.")
+        return max_uses
+
+
+class RepriceForm(forms.Form):
+    rules = forms.CharField(
+        widget=forms.TextInput(attrs={"size": 60}),
+        help_text=f"Comma separated, applied left to right, e.g. markup:5,round:0.05,charm:99. "
+                  f"Rules: {', '.join(RULES)}.",
+    )
+
+    def clean_rules(self):
+        try:
+            return parse_rules(self.cleaned_data["rules"])
+        except ValueError as error:
+            raise ValidationError(str(error))
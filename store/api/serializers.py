@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 # from ecommerce.store.models import Size
 from store.models import (Product, Category, Size, Colour, 
@@ -10,7 +11,7 @@ class ProductSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Product
-        fields = ['seller', 'title', 'slug', 'products', 
+        fields = ['id', 'seller', 'title', 'slug', 'category', 'description', 
                  'style', 'price', 'shipping_out_days', 
                  'shipping_fee', 'inventory', 'percentage_off', 
                  'flash_sale_start_date', 'flash_sale_end_date',
@@ -23,6 +24,131 @@ class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['name',]
+
+
+class CategoryListSerializer(CategorySerializer):
+    
+    class Meta(CategorySerializer.Meta):
+        fields = ['id', 'name', 'parent', 'depth', 'product_count', 'tree_product_count',]
+        read_only_fields = ['depth', 'product_count', 'tree_product_count',]
+        
+
+class ProductImageReadSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(source='_image', read_only=True)
+    
+    class Meta:
+        model = ProductImage
+        fields = ['id', 'image',]
+        
+
+class SizeInventoryReadSerializer(serializers.ModelSerializer):
+    size = serializers.CharField(source='size.title', read_only=True)
+    
+    class Meta:
+        model = SizeInventory
+        fields = ['id', 'size', 'quantity', 'extra_price',]
+        
+
+class ColourInventoryReadSerializer(serializers.ModelSerializer):
+    colour = serializers.CharField(source='colour.name', read_only=True)
+    hex_code = serializers.CharField(source='colour.hex_code', read_only=True)
+    
+    class Meta:
+        model = ColourInventory
+        fields = ['id', 'colour', 'hex_code', 'quantity', 'extra_price',]
+        
+
+class ProductReviewReadSerializer(serializers.ModelSerializer):
+    customer = serializers.CharField(source='customer.user.full_name', read_only=True)
+    
+    class Meta:
+        model = ProductReview
+        fields = ['id', 'customer', 'ratings', 'description', 'created_date',]
+        
+
+class ProductReadSerializer(serializers.ModelSerializer):
+    """
+    Read representation of a product with sparse fieldsets (``?fields=``) and
+    optional nested relations (``?expand=``). ``setup_queryset`` loads exactly the
+    columns and relations the chosen representation renders, so a page costs the same
+    number of queries whatever its size.
+    """
+    
+    discount_price = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
+    average_ratings = serializers.FloatField(read_only=True)
+    
+    # model columns each rendered field needs, when they differ from the field name
+    field_columns = {
+        'seller': ['seller'],
+        'category': ['category'],
+        'discount_price': ['price', 'percentage_off'],
+        'average_ratings': ['rating_count', 'rating_sum'],
+    }
+    
+    expandable = {
+        'category': lambda: CategorySerializer(read_only=True),
+        'images': lambda: ProductImageReadSerializer(many=True, read_only=True),
+        'sizes': lambda: SizeInventoryReadSerializer(source='size_inventory', many=True, read_only=True),
+        'colours': lambda: ColourInventoryReadSerializer(source='color_inventory', many=True, read_only=True),
+        'reviews': lambda: ProductReviewReadSerializer(source='product_reviews', many=True, read_only=True),
+    }
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'seller', 'title', 'slug', 'category', 'description', 
+                 'style', 'price', 'discount_price', 'effective_price',
+                 'shipping_out_days', 
+                 'shipping_fee', 'inventory', 'percentage_off', 
+                 'flash_sale_start_date', 'flash_sale_end_date',
+                 'featured_product', 'average_ratings', 'rating_count', ]
+        read_only_fields = fields
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = self.context.get('fields'), self.context.get('expand', ())
+        if fields:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+        for name in expand:
+            self.fields[name] = self.expandable[name]()
+    
+    @classmethod
+    def parse_params(cls, query_params):
+        """
+        Reads ``?fields=a,b`` and ``?expand=x,y`` into ``(fields, expand)``.
+        """
+        fields = [name for name in query_params.get('fields', '').split(',') if name]
+        expand = [name for name in query_params.get('expand', '').split(',') if name]
+        unknown = (set(fields) - set(cls.Meta.fields) - set(cls.expandable)) | (set(expand) - set(cls.expandable))
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        expand += [name for name in fields if name in cls.expandable and name not in expand and name != 'category']
+        return fields, expand
+    
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None, expand=()):
+        # id, created_date and effective_price are always needed for the keyset cursor
+        columns = {'id', 'created_date', 'effective_price'}
+        for name in (fields or cls.Meta.fields):
+            if name in cls.Meta.fields:
+                columns.update(cls.field_columns.get(name, [name]))
+        
+        if 'category' in expand:
+            queryset = queryset.select_related('category')
+            columns.update(['category', 'category__name'])
+        
+        prefetches = {
+            'images': Prefetch('images', queryset=ProductImage.objects.only('id', 'product', '_image')),
+            'sizes': Prefetch('size_inventory', queryset=SizeInventory.objects.select_related('size').only(
+                'id', 'product', 'quantity', 'extra_price', 'size', 'size__title')),
+            'colours': Prefetch('color_inventory', queryset=ColourInventory.objects.select_related('colour').only(
+                'id', 'product', 'quantity', 'extra_price', 'colour', 'colour__name', 'colour__hex_code')),
+            'reviews': Prefetch('product_reviews', queryset=ProductReview.objects.select_related(
+                'customer__user').only('id', 'product', 'ratings', 'description', 'created_date',
+                                       'customer', 'customer__user', 'customer__user__full_name')),
+        }
+        queryset = queryset.prefetch_related(*[prefetches[name] for name in expand if name in prefetches])
+        return queryset.only(*columns)
         
         
 class SizeSerializer(serializers.ModelSerializer):
@@ -91,6 +217,94 @@ class OrderSerializer(serializers.ModelSerializer):
                   'shipping_status',]
         
 
+class CheckoutSerializer(serializers.Serializer):
+    
+    address = serializers.PrimaryKeyRelatedField(queryset=Address.objects.all(), required=False, allow_null=True)
+    coupon_code = serializers.CharField(max_length=8, required=False, allow_blank=True)
+        
+
+class VariantListField(serializers.Field):
+    """
+    Size or colour stock of an imported row, either ``"S:10;M:5:2.50"``
+    (``name:quantity[:extra price]``, the CSV form), ``{"S": 10}`` or
+    ``[{"name": "S", "quantity": 10, "extra_price": "2.50"}]``. Returns a list of
+    ``(name, quantity, extra_price)``.
+    """
+    quantity_field = serializers.IntegerField(min_value=0)
+    extra_price_field = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+
+    def to_internal_value(self, data):
+        if data in (None, ""):
+            return []
+        if isinstance(data, str):
+            data = [part.split(":") for part in data.split(";") if part.strip()]
+        elif isinstance(data, dict):
+            data = [(name, quantity) for name, quantity in data.items()]
+        elif isinstance(data, list):
+            data = [(item.get("name"), item.get("quantity"), item.get("extra_price", 0))
+                    if isinstance(item, dict) else item for item in data]
+        else:
+            raise serializers.ValidationError("Expected name:quantity pairs.")
+
+        variants = []
+        for parts in data:
+            if not 1 < len(parts) < 4:
+                raise serializers.ValidationError(f"'{':'.join(map(str, parts))}' is not name:quantity[:extra price].")
+            name = str(parts[0]).strip()
+            quantity = self.quantity_field.run_validation(parts[1])
+            extra_price = self.extra_price_field.run_validation(parts[2] if len(parts) > 2 else 0)
+            variants.append((name, quantity, extra_price))
+        return variants
+
+    def to_representation(self, value):
+        return [{"name": name, "quantity": quantity, "extra_price": extra_price}
+                for name, quantity, extra_price in value]
+
+
+class ImageListField(serializers.Field):
+
+    def to_internal_value(self, data):
+        if data in (None, ""):
+            return []
+        if isinstance(data, str):
+            data = data.split(";")
+        if not isinstance(data, list):
+            raise serializers.ValidationError("Expected a list of image paths.")
+        return [str(path).strip() for path in data if str(path).strip()]
+
+    def to_representation(self, value):
+        return value
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a product import. Category, size and colour names are resolved by
+    ``store.importer.ProductImporter``, so validating a row never queries the database.
+    """
+
+    title = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+    style = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    price = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0)
+    shipping_out_days = serializers.IntegerField(min_value=0, required=False, default=0)
+    shipping_fee = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False, default=0)
+    inventory = serializers.IntegerField(min_value=0, required=False, default=0)
+    percentage_off = serializers.IntegerField(min_value=0, max_value=100, required=False, default=0)
+    featured_product = serializers.BooleanField(required=False, default=False)
+    sizes = VariantListField(required=False, default=list)
+    colours = VariantListField(required=False, default=list)
+    images = ImageListField(required=False, default=list)
+
+
+class ProductImportSerializer(serializers.Serializer):
+    
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=["csv", "jsonl"], required=False)
+    create_missing = serializers.BooleanField(required=False, default=False)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+
 class OrderItemSerializers(serializers.ModelSerializer):
     
     class Meta:
@@ -112,6 +326,16 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['cart','product','size','colour','quantity', 'extra_price',]
         
+
+class CartItemPricingSerializer(CartItemSerializer):
+    # filled from CartItemQuerySet.with_pricing() annotations
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    line_discount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    
+    class Meta(CartItemSerializer.Meta):
+        fields = CartItemSerializer.Meta.fields + ['unit_price', 'line_discount', 'line_total',]
+        
         
 class CountrySerializer(serializers.ModelSerializer):
     
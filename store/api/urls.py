@@ -3,5 +3,16 @@ from store.api import views
 
 urlpatterns = [
     path('category/', views.CategoryView.as_view(), name='category'),
+    path('category/tree/', views.CategoryTreeView.as_view(), name='category-tree'),
     path('product/', views.ProductView.as_view(), name='product'),
+    path('product/import/', views.ProductImportView.as_view(), name='product-import'),
+    path('product/facets/', views.ProductFacetView.as_view(), name='product-facets'),
+    path('product/search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('product/flash-sales/', views.FlashSaleProductView.as_view(), name='product-flash-sales'),
+    path('product/<uuid:product_id>/', views.ProductDetalView.as_view(), name='product-detail'),
+    path('product/<slug:slug>/', views.ProductSlugDetailView.as_view(), name='product-detail-slug'),
+    path('export/<slug:dataset>.<slug:file_format>', views.ExportView.as_view(), name='export'),
+    path('cart/<uuid:cart_id>/', views.CartDetailView.as_view(), name='cart-detail'),
+    path('cart/<uuid:cart_id>/checkout/', views.CheckoutView.as_view(), name='checkout'),
+    path('coupon/<str:code>/', views.CouponView.as_view(), name='coupon'),
 ]
@@ -1,23 +1,42 @@
+from django.http import HttpResponsePermanentRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 # from rest_framework import rest_framework
 from rest_framework.views import APIView
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.generics import RetrieveUpdateDestroyAPIView, ListCreateAPIView , ListAPIView , CreateAPIView
+from rest_framework.generics import RetrieveUpdateDestroyAPIView, ListCreateAPIView , ListAPIView , CreateAPIView, RetrieveAPIView
 from store.models import (Product, Category, Size, Colour, 
                           ColourInventory, SizeInventory, ProductImage, 
                           ProductReview, ProductReviewImage, CouponCode, Order, OrderItem, 
                           Cart, CartItem, Country, Address)
-from store.api.serializers import (ProductSerializer, CategorySerializer, SizeSerializer, ColourSerializer, 
+from store.api.serializers import (ProductSerializer, CategorySerializer, CategoryListSerializer, SizeSerializer, ColourSerializer, 
                           ColourInventorySerializer, SizeInventorySerializer, ProductImageSerialer, 
                           ProductReviewSerializer, ProductReviewImageSerializers, CouponCodeSerializers, OrderSerializer, 
                           OrderItemSerializers, CartSerializer, CartItemSerializer, CountrySerializer,
-                          AddressSerializer)
+                          AddressSerializer, CartItemPricingSerializer, CheckoutSerializer, ProductReadSerializer,
+                          ProductImportSerializer)
+from store.cache import product_cache
+from store.categories import category_list, category_tree
+from store.checkout import place_order
+from store.coupons import validate as validate_coupon
+from store.conditional import make_etag, not_modified_response, set_conditional_headers
+from store.export import DATASETS, FORMATS, buffered, export_lines
+from store.facets import compute_facets, has_filters, is_materialized, materialized_facets
+from store.filters import ProductFilter
+from store.flash_sales import active_sale_products
+from store.importer import detect_format, import_products
+from store.pagination import ProductPagination
+from store.search import search_products
+from store.slugs import current_slug, slug_map
 
 class CategoryView( ListCreateAPIView ):
     
-    serializer_class = CategorySerializer
+    serializer_class = CategoryListSerializer
     # permission_classes = [ IsAuthenticated, ]
     
     def post (self, request, *args, **kwargs):
@@ -32,15 +51,25 @@ class CategoryView( ListCreateAPIView ):
     
     def get (self, request, *args, **kwargs):
         
-        qs = Category.objects.filter( )
-        serializer = CategorySerializer(qs , many = True)
-        return Response( {'status':'successful', 'message':'All categories has been fetched','data':serializer.data } , status=status.HTTP_200_OK )
+        data = category_list(lambda: self.serializer_class(Category.objects.filter( ), many = True).data)
+        return Response( {'status':'successful', 'message':'All categories has been fetched','data':data } , status=status.HTTP_200_OK )
+
+
+class CategoryTreeView( APIView ):
+    # permission_classes = [ IsAuthenticated, ]
+    
+    def get (self, request, *args, **kwargs):
+        
+        return Response( {'status':'successful', 'message':'The category tree has been fetched','data':category_tree() } , status=status.HTTP_200_OK )
     
 
 
 class ProductView(ListCreateAPIView):
     
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ProductPagination
+    filterset_class = ProductFilter
     # permission_classes = [IsAuthenticated,]
 
     def post (self, request, *args, **kwargs):
@@ -56,9 +85,25 @@ class ProductView(ListCreateAPIView):
 
     def get ( self, request, *args, **kwargs):
         
-        qs = Product.objects.all( )
-        serializer = ProductSerializer(qs, data = request.data)
-        return Response( {'status':'successful', 'message':'All products has been fetched','data':serializer.data } , status=status.HTTP_200_OK )
+        qs = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_page_freshness(qs)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        fields, expand = ProductReadSerializer.parse_params(request.query_params)
+        page = self.paginate_queryset(ProductReadSerializer.setup_queryset(qs, fields, expand))
+        serializer = ProductReadSerializer(page, many = True, context = {**self.get_serializer_context(),
+                                                                          'fields': fields, 'expand': expand})
+        response = Response( {'status':'successful', 'message':'All products has been fetched','data':serializer.data,
+                              **dict(self.paginator.get_pagination_data()) } , status=status.HTTP_200_OK )
+        return set_conditional_headers(response, etag, last_modified)
+
+    def get_page_freshness(self, qs):
+        # (id, updated_date) of the rows on the requested page only; the page itself is not loaded
+        rows = list(self.paginator.get_page_queryset(qs, self.request).values_list('id', 'updated_date'))
+        last_modified = max((updated_date for _id, updated_date in rows), default=None)
+        return make_etag(self.request.get_full_path(), *rows), last_modified
     
         
     
@@ -74,9 +119,25 @@ class ProductDetalView ( RetrieveUpdateDestroyAPIView ):
         return product
     
     def get ( self, request, product_id):
-        product = self.object(product_id)
-        serializer = self.serializer_class(product)
-        return Response({'status':'successful','message':'the detail information about the product','data':serializer.data }, status = status.HTTP_200_OK )
+        # Product.updated_date is bumped whenever the product or any of its images,
+        # inventories or reviews change, so it alone decides freshness
+        last_modified = Product.objects.filter(id = product_id).values_list('updated_date', flat = True).first()
+        if last_modified is None:
+            raise NotFound()
+        etag = make_etag(product_id, last_modified.isoformat())
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = product_cache.get(product_id, lambda: self.get_detail_data(product_id), version = last_modified.timestamp())
+        response = Response({'status':'successful','message':'the detail information about the product','data':data }, status = status.HTTP_200_OK )
+        return set_conditional_headers(response, etag, last_modified)
+
+    def get_detail_data(self, product_id):
+        expand = list(ProductReadSerializer.expandable)
+        qs = ProductReadSerializer.setup_queryset(Product.objects.all(), expand = expand)
+        product = get_object_or_404( qs, id = product_id )
+        return dict(ProductReadSerializer(product, context = {'expand': expand}).data)
 
     def put ( self, request, product_id, format=None):
         product = self.get_object(product_id)
@@ -90,9 +151,172 @@ class ProductDetalView ( RetrieveUpdateDestroyAPIView ):
         product = self.get_object(product_id)
         product.delete()
         return Response({'status':'successful','message':'the product has been deleted successful','data':[] }, status = status.HTTP_200_OK )
+
+
+class ProductSlugDetailView ( ProductDetalView ):
+    
+    http_method_names = ['get', 'head', 'options']
+    
+    def get ( self, request, slug):
+        product_id = slug_map.resolve(slug)
+        if product_id is not None:
+            try:
+                response = super().get(request, product_id)
+            except NotFound:
+                response = None
+            # the map may be stale if another process renamed or deleted the product
+            if response is not None and (response.status_code == status.HTTP_304_NOT_MODIFIED
+                                         or response.data['data'].get('slug') == slug):
+                return response
+            slug_map.discard(slug)
+
+        new_slug = current_slug(slug)
+        if new_slug is None:
+            raise NotFound()
+        location = reverse('product-detail-slug', args = [new_slug])
+        if request.META.get('QUERY_STRING'):
+            location = f"{location}?{request.META['QUERY_STRING']}"
+        return HttpResponsePermanentRedirect(location)
+
+
+class CartDetailView ( RetrieveAPIView ):
+    
+    serializer_class = CartItemPricingSerializer
+    # permission_classes = [ IsAuthenticated ]
+    
+    def get ( self, request, cart_id):
+        cart = get_object_or_404( Cart, id = cart_id )
+        serializer = self.serializer_class( cart.items.with_pricing(), many = True )
+        data = {'items': serializer.data, **cart.items.totals()}
+        return Response({'status':'successful','message':'the cart and its totals','data':data }, status = status.HTTP_200_OK )
+
+
+class CheckoutView ( CreateAPIView ):
+    
+    serializer_class = CheckoutSerializer
+    # permission_classes = [ IsAuthenticated ]
+    
+    def post ( self, request, cart_id):
+        cart = get_object_or_404( Cart, id = cart_id )
+        serializer = self.serializer_class( data = request.data )
+        serializer.is_valid( raise_exception = True )
+        order = place_order( cart, **serializer.validated_data )
+        return Response({'status':'successful','message':'the order has been placed','data':OrderSerializer(order).data }, status = status.HTTP_201_CREATED )
+
+
+class CouponView ( APIView ):
+    
+    # permission_classes = [ IsAuthenticated ]
+    
+    def get ( self, request, code):
+        # answered from the coupon cache; the usage limit is only enforced at checkout
+        coupon = validate_coupon(code)
+        data = {'code': coupon['code'], 'price': coupon['price'], 'expiry_date': coupon['expiry_date']}
+        return Response({'status':'successful','message':'the coupon code is valid','data':data }, status = status.HTTP_200_OK )
+
+
+class ProductSearchView ( ListAPIView ):
     
+    serializer_class = ProductReadSerializer
+    pagination_class = None
+    max_results = 100
+    # permission_classes = [ IsAuthenticated ]
+    
+    def get ( self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'status':'fail','message':'the search query (q) is required','data':[] }, status = status.HTTP_400_BAD_REQUEST )
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 30)), self.max_results))
+        except ValueError:
+            limit = 30
         
+        product_ids = search_products(query, limit = limit)
+        fields, expand = ProductReadSerializer.parse_params(request.query_params)
+        products = ProductReadSerializer.setup_queryset(Product.objects.filter(id__in = product_ids), fields, expand)
+        # keep the relevance order of the search backend
+        by_id = {product.id: product for product in products}
+        ranked = [by_id[product_id] for product_id in product_ids if product_id in by_id]
+        serializer = self.serializer_class(ranked, many = True, context = {**self.get_serializer_context(),
+                                                                           'fields': fields, 'expand': expand})
+        return Response({'status':'successful','message':'the products matching the search','data':serializer.data }, status = status.HTTP_200_OK )
+
 
+class FlashSaleProductView ( ListAPIView ):
+    
+    serializer_class = ProductReadSerializer
+    pagination_class = None
+    max_results = 100
+    # permission_classes = [ IsAuthenticated ]
+    
+    def get ( self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 30)), self.max_results))
+        except ValueError:
+            limit = 30
         
+        # ending soonest first, straight off the flash sale index
+        fields, expand = ProductReadSerializer.parse_params(request.query_params)
+        products = ProductReadSerializer.setup_queryset(active_sale_products(), fields, expand)[:limit]
+        serializer = self.serializer_class(products, many = True, context = {**self.get_serializer_context(),
+                                                                             'fields': fields, 'expand': expand})
+        return Response({'status':'successful','message':'the products on flash sale','data':serializer.data }, status = status.HTTP_200_OK )
+
+
+class ProductFacetView ( APIView ):
+    
+    # permission_classes = [ IsAuthenticated ]
+    
+    def get ( self, request, *args, **kwargs):
+        if is_materialized() and not has_filters(request.query_params):
+            facets = materialized_facets()
+        else:
+            _total, facets = compute_facets(request.query_params)
+        return Response({'status':'successful','message':'the facet counts of the products','data':facets }, status = status.HTTP_200_OK )
+
+
+class ProductImportView ( CreateAPIView ):
+    
+    serializer_class = ProductImportSerializer
+    permission_classes = [ IsAuthenticated ]
+    
+    def post ( self, request, *args, **kwargs):
+        seller = getattr(request.user, 'seller', None)
+        if seller is None and not request.user.is_staff:
+            raise PermissionDenied('Only sellers can import products')
+        
+        serializer = self.serializer_class( data = request.data )
+        serializer.is_valid(raise_exception = True)
+        upload = serializer.validated_data['file']
+        file_format = serializer.validated_data.get('format') or detect_format(upload.name)
+        report = import_products(upload.file, file_format, seller = seller,
+                                 create_missing = serializer.validated_data['create_missing'],
+                                 dry_run = serializer.validated_data['dry_run'])
+        
+        if report.errors and not report.created:
+            return Response({'status':'fail','message':'no product could be imported','data':report.as_dict() }, status = status.HTTP_400_BAD_REQUEST )
+        return Response({'status':'successful','message':f'{report.created} products have been imported','data':report.as_dict() }, status = status.HTTP_201_CREATED )
+
+
+class ExportView ( APIView ):
+    
+    permission_classes = [ IsAdminUser ]
+    
+    def get ( self, request, dataset, file_format):
+        if dataset not in DATASETS or file_format not in FORMATS:
+            raise NotFound('Unknown export')
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            try:
+                updated_since = parse_datetime(updated_since)
+            except ValueError:
+                updated_since = None
+            if updated_since is None:
+                return Response({'status':'fail','message':'updated_since must be an ISO 8601 datetime','data':[] }, status = status.HTTP_400_BAD_REQUEST )
+            if timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since)
         
-    
\ No newline at end of file
+        response = StreamingHttpResponse(buffered(export_lines(dataset, file_format, updated_since = updated_since or None)),
+                                         content_type = FORMATS[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{dataset}-{timezone.now():%Y%m%d%H%M%S}.{file_format}"'
+        return response
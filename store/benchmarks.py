@@ -0,0 +1,287 @@
+"""
+Reproducible benchmarks of the store API hot paths.
+
+``generate_data`` builds a synthetic shop (sellers, customers, products with size and
+colour variants, reviews, carts and past orders) with ``bulk_create`` from a seeded
+random generator, so every run measures the same shapes of data. ``run_benchmarks``
+sends each scenario's requests through the Django test client, which exercises the
+whole middleware and DRF stack without a network, and records the latency
+percentiles, the throughput and the query count of every scenario.
+
+Results are plain dicts, saved as JSON by the ``benchmark_api`` command; ``compare``
+checks them against a saved baseline. Latency may drift by ``tolerance`` before it
+counts as a regression; any extra query always does.
+"""
+import platform
+import random
+import statistics
+import time
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from common.metrics import QueryRecorder
+from core.models import Customer, Seller, User
+from store.categories import refresh_category_counts
+from store.models import (Cart, CartItem, Category, Colour, ColourInventory, Order, OrderItem, Product,
+                          ProductImage, ProductReview, Size, SizeInventory)
+
+DATASET_DEFAULTS = {
+    "sellers": 10,
+    "customers": 50,
+    "categories": 8,
+    "products": 1000,
+    "variants": 3,
+    "reviews": 5,
+    "carts": 50,
+    "cart_items": 5,
+    "orders": 200,
+    "seed": 1,
+}
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+COLOURS = [("Black", "#000000"), ("White", "#ffffff"), ("Red", "#ff0000"), ("Blue", "#0000ff"),
+           ("Green", "#00ff00"), ("Yellow", "#ffff00")]
+
+
+class Dataset:
+    """
+    The ids of the generated rows the scenarios pick their requests from.
+    """
+
+    def __init__(self, options, products, carts):
+        self.options = options
+        self.products = products
+        self.carts = carts
+        self.checkout_items = []
+
+
+def generate_data(**options):
+    options = {**DATASET_DEFAULTS, **options}
+    rng = random.Random(options["seed"])
+    variants = max(0, min(options["variants"], len(SIZES)))
+
+    users = User.objects.bulk_create([
+        User(email=f"bench-seller-{index}@example.com", full_name=f"Seller {index}", is_customer=False)
+        for index in range(options["sellers"])
+    ] + [
+        User(email=f"bench-customer-{index}@example.com", full_name=f"Customer {index}")
+        for index in range(options["customers"])
+    ])
+    sellers = Seller.objects.bulk_create([
+        Seller(user=user, company_name=f"{user.full_name} Ltd") for user in users[:options["sellers"]]
+    ])
+    customers = Customer.objects.bulk_create([Customer(user=user) for user in users[options["sellers"]:]])
+
+    categories = [Category(name=f"Category {index}") for index in range(options["categories"])]
+    for category in categories:
+        # bulk_create skips Category.save, which sets the path the category_tree filter reads
+        category.path, category.depth = f"{category.pk.hex}/", 0
+    Category.objects.bulk_create(categories)
+    sizes = [Size.objects.get_or_create(title=title)[0] for title in SIZES[:variants]]
+    colours = [Colour.objects.get_or_create(name=name, defaults={"hex_code": hex_code})[0]
+               for name, hex_code in COLOURS[:variants]]
+
+    products, reviews = [], []
+    for index in range(options["products"]):
+        product = Product(
+            seller=rng.choice(sellers) if sellers else None,
+            title=f"Benchmark product {index}", slug=f"benchmark-product-{index}",
+            category=rng.choice(categories) if categories else None,
+            description="A synthetic product used by the benchmark suite.",
+            price=Decimal(rng.randint(500, 50000)) / 100, percentage_off=rng.choice([0, 0, 10, 25, 50]),
+            shipping_fee=Decimal(rng.randint(0, 1500)) / 100, shipping_out_days=rng.randint(1, 7),
+            inventory=rng.randint(50, 500), featured_product=rng.random() < 0.1,
+        )
+        product._slug_assigned = True
+        for _review in range(options["reviews"] if customers else 0):
+            rating = rng.randint(1, 5)
+            reviews.append(ProductReview(product=product, customer=rng.choice(customers), ratings=rating,
+                                         description="Synthetic review."))
+            product.rating_count += 1
+            product.rating_sum += rating
+            setattr(product, f"rating_{rating}_count", getattr(product, f"rating_{rating}_count") + 1)
+        products.append(product)
+    Product.objects.bulk_create(products, batch_size=500)
+    SizeInventory.objects.bulk_create([
+        SizeInventory(product=product, size=size, quantity=rng.randint(5, 50))
+        for product in products for size in sizes
+    ], batch_size=1000)
+    ColourInventory.objects.bulk_create([
+        ColourInventory(product=product, colour=colour, quantity=rng.randint(5, 50))
+        for product in products for colour in colours
+    ], batch_size=1000)
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, _image=f"store/images/benchmark-{index}.png")
+        for index, product in enumerate(products)
+    ], batch_size=1000)
+    ProductReview.objects.bulk_create(reviews, batch_size=1000)
+
+    carts = Cart.objects.bulk_create([Cart(customer=rng.choice(customers) if customers else None)
+                                      for _cart in range(options["carts"])])
+    CartItem.objects.bulk_create([
+        cart_item(rng, cart, products, sizes) for cart in carts for _item in range(options["cart_items"])
+    ], batch_size=1000)
+
+    now = timezone.now()
+    orders, order_items = [], []
+    for index in range(options["orders"] if customers else 0):
+        customer = rng.choice(customers)
+        lines = [(rng.choice(products), rng.randint(1, 3)) for _line in range(rng.randint(1, 5))]
+        order = Order(customer=customer, transaction_ref=f"bench-{index}",
+                      placed_at=now - timezone.timedelta(days=rng.randint(0, 365)),
+                      total_price=sum(product.price * quantity for product, quantity in lines))
+        orders.append(order)
+        order_items += [OrderItem(customer=customer, order=order, product=product, quantity=quantity,
+                                  unit_price=product.price, ordered=True) for product, quantity in lines]
+    Order.objects.bulk_create(orders, batch_size=1000)
+    OrderItem.objects.bulk_create(order_items, batch_size=1000)
+
+    refresh_category_counts()
+
+    dataset = Dataset(options, [product.pk for product in products], [cart.pk for cart in carts])
+    # the checkout scenario buys from the first products; give them enough stock for any run
+    checkout_products = [product.pk for product in products[:50]]
+    Product.objects.filter(pk__in=checkout_products).update(inventory=10 ** 6)
+    SizeInventory.objects.filter(product__in=checkout_products).update(quantity=10 ** 6)
+    dataset.checkout_items = [(pk, sizes[0].title if sizes else None) for pk in checkout_products]
+    return dataset
+
+
+def cart_item(rng, cart, products, sizes):
+    return CartItem(cart=cart, product=rng.choice(products), quantity=rng.randint(1, 3),
+                    size=rng.choice(sizes).title if sizes else None, extra_price=0)
+
+
+class Scenario:
+
+    def __init__(self, name, method, path, prepare=None):
+        self.name = name
+        self.method = method
+        # path(dataset, iteration, prepared) -> url
+        self.path = path
+        # prepare(dataset, iteration) runs outside the timed request
+        self.prepare = prepare
+
+
+def new_checkout_cart(dataset, iteration):
+    # checkout empties the cart, so every request gets a fresh one
+    cart = Cart.objects.create()
+    items = dataset.checkout_items
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, size=size, quantity=1, extra_price=0)
+        for product_id, size in (items[(iteration + offset) % len(items)]
+                                 for offset in range(dataset.options["cart_items"]))
+    ])
+    return cart.pk
+
+
+SCENARIOS = [
+    Scenario("product-list", "get", lambda dataset, index, prepared: "/store/product/?page_size=30"),
+    Scenario("product-list-expanded", "get", lambda dataset, index, prepared:
+             "/store/product/?page_size=30&expand=category,images,sizes,colours,reviews"),
+    Scenario("product-detail", "get", lambda dataset, index, prepared:
+             f"/store/product/{dataset.products[index * 7919 % len(dataset.products)]}/"),
+    Scenario("category-list", "get", lambda dataset, index, prepared: "/store/category/"),
+    Scenario("cart-totals", "get", lambda dataset, index, prepared:
+             f"/store/cart/{dataset.carts[index % len(dataset.carts)]}/"),
+    Scenario("checkout", "post", lambda dataset, index, prepared: f"/store/cart/{prepared}/checkout/",
+             prepare=new_checkout_cart),
+]
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_scenario(client, scenario, dataset, iterations, warmup):
+    timings, queries, errors = [], [], 0
+    for index in range(warmup + iterations):
+        prepared = scenario.prepare(dataset, index) if scenario.prepare else None
+        url = scenario.path(dataset, index, prepared)
+        # the test client resets connection.queries on request_started, so count with a wrapper
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(url)
+            elapsed = time.perf_counter() - started
+        if index < warmup:
+            continue
+        errors += response.status_code >= 400
+        timings.append(elapsed * 1000)
+        queries.append(recorder.count)
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "throughput": round(iterations / (sum(timings) / 1000), 1),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(percentile(timings, 0.5), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "queries": max(queries),
+    }
+
+
+def median_round(rounds):
+    # the per-metric median of repeated runs, which keeps one noisy run from failing a comparison
+    return {metric: statistics.median(result[metric] for result in rounds) if metric != "errors"
+            else sum(result[metric] for result in rounds) for metric in rounds[0]}
+
+
+def run_benchmarks(dataset, scenarios=None, iterations=200, warmup=20, rounds=3):
+    """
+    Runs ``scenarios`` (names, all by default) against ``dataset`` ``rounds`` times and
+    returns the median results as a JSON-serializable dict.
+    """
+    scenarios = [SCENARIOS_BY_NAME[name] for name in scenarios] if scenarios else SCENARIOS
+    # measure the production stack: no debug toolbar and DEBUG off
+    middleware = [name for name in settings.MIDDLEWARE if not name.startswith("debug_toolbar.")]
+    results = {}
+    with override_settings(DEBUG=False, MIDDLEWARE=middleware):
+        client = Client()
+        cache.clear()
+        for scenario in scenarios:
+            results[scenario.name] = median_round([run_scenario(client, scenario, dataset, iterations, warmup)
+                                                   for _round in range(rounds)])
+    return {
+        "meta": {
+            "created": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "dataset": dataset.options,
+            "iterations": iterations,
+            "warmup": warmup,
+            "rounds": rounds,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(baseline, results, tolerance=0.25):
+    """
+    Returns ``[(scenario, metric, baseline value, value), ...]`` for every metric that
+    regressed: a latency percentile more than ``tolerance`` above the baseline, a
+    throughput more than ``tolerance`` below it, or any growth in the query count.
+    Scenarios missing from either side are skipped.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if current[metric] > before[metric] * (1 + tolerance):
+                regressions.append((name, metric, before[metric], current[metric]))
+        if current["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append((name, "throughput", before["throughput"], current["throughput"]))
+        if current["queries"] > before["queries"]:
+            regressions.append((name, "queries", before["queries"], current["queries"]))
+    return regressions
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    A small thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache:
+    """
+    An in-process ``LocalLRUCache`` in front of a Django cache backend.
+
+    A cold key is rebuilt by a single caller: threads in this process queue on a
+    striped lock and other processes wait on a ``cache.add`` lock key, polling the
+    shared tier until the winner has stored the value.
+    """
+
+    lock_stripes = 64
+
+    def __init__(self, prefix, alias="default", timeout=300, local_maxsize=1024, local_ttl=5,
+                 lock_timeout=10, lock_poll_interval=0.05):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.lock_poll_interval = lock_poll_interval
+        self.local = LocalLRUCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._locks = [threading.Lock() for _ in range(self.lock_stripes)]
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, *parts):
+        return ":".join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING)
+        if value is not MISSING:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.shared.set(key, value, self.timeout)
+        self.local.set(key, value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        self.shared.delete_many(keys)
+
+    def get_or_build(self, key, builder):
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._locks[hash(key) % self.lock_stripes]:
+            value = self.get(key)
+            if value is not MISSING:
+                return value
+
+            lock_key = f"{key}:lock"
+            acquired = self.shared.add(lock_key, 1, self.lock_timeout)
+            if not acquired:
+                value = self._wait_for(key)
+                if value is not MISSING:
+                    return value
+            try:
+                value = builder()
+                self.set(key, value)
+                return value
+            finally:
+                if acquired:
+                    self.shared.delete(lock_key)
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            value = self.shared.get(key, MISSING)
+            if value is not MISSING:
+                self.local.set(key, value)
+                return value
+        return MISSING
+
+
+class ProductDetailCache:
+    """
+    Caches the serialized product detail payload by product id and version.
+    """
+
+    def __init__(self, **options):
+        self.cache = TwoTierCache("store:product", **options)
+
+    def get(self, product_id, builder, version=None):
+        """
+        ``version`` (e.g. the product's ``updated_date``) is folded into the key, so a
+        versioned entry can never be served stale even if an invalidation is missed.
+        """
+        return self.cache.get_or_build(self.key(product_id, version), builder)
+
+    def put(self, product_id, data, version=None):
+        """
+        Stores a payload ahead of the first request, e.g. the sale prices a product will
+        have once a flash sale starts (see store.flash_sales).
+        """
+        self.cache.set(self.key(product_id, version), data)
+
+    def key(self, product_id, version=None):
+        parts = ("id", product_id) if version is None else ("id", product_id, version)
+        return self.cache.make_key(*parts)
+
+    def invalidate(self, product_id, version=None):
+        """
+        Drops the entry of one version; newer versions are stored under new keys anyway,
+        this only frees the superseded payload before its timeout.
+        """
+        self.cache.delete(self.key(product_id, version))
+
+
+def cache_options(setting_name):
+    return {key.lower(): value for key, value in getattr(settings, setting_name, {}).items()}
+
+
+product_cache = ProductDetailCache(**cache_options("PRODUCT_CACHE"))
@@ -0,0 +1,146 @@
+"""
+The category tree: stored in-stock product counts and the cached tree payloads.
+
+``Category.product_count`` counts the in-stock products of a category itself and
+``tree_product_count`` adds those of its subcategories. They are adjusted in place by
+``adjust_counts`` whenever a product is created, deleted, moved to another category
+or goes in or out of stock, with one UPDATE over the category and its ancestors (read
+off the materialized path). ``refresh_category_counts`` recomputes them from scratch
+with one grouped query, after a category is moved and from the
+``refresh_category_counts`` command.
+
+The tree and the flat category list are cached in ``category_cache`` and dropped on
+commit only when a category or the counts change, so other product edits never
+touch them.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from store.cache import TwoTierCache, cache_options
+from store.models import Category, Product
+
+category_cache = TwoTierCache("store:category", **cache_options("CATEGORY_CACHE"))
+TREE_KEY = category_cache.make_key("tree")
+LIST_KEY = category_cache.make_key("list")
+
+
+def in_stock(inventory):
+    return (inventory or 0) > 0
+
+
+def adjust_counts(deltas):
+    """
+    Applies ``{category id: change in in-stock products}`` to the stored counts of the
+    categories and of all their ancestors.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+    tree = Counter()
+    for pk, path in Category.objects.filter(pk__in=list(deltas)).values_list("pk", "path"):
+        for ancestor in Category.path_ids(path) or [pk]:
+            tree[ancestor] += deltas[pk]
+
+    def change(values):
+        return Case(*[When(pk=pk, then=Value(delta)) for pk, delta in values.items()],
+                    default=Value(0), output_field=IntegerField())
+
+    Category.objects.filter(pk__in=list(tree)).update(
+        product_count=F("product_count") + change(deltas),
+        tree_product_count=F("tree_product_count") + change(tree),
+    )
+    invalidate()
+
+
+def adjust_counts_for(products, delta):
+    """
+    Adds ``delta`` to the counts of the categories of ``products`` (a queryset), once
+    per product.
+    """
+    rows = products.order_by().values_list("category_id").annotate(total=Count("pk"))
+    adjust_counts({category_id: total * delta for category_id, total in rows})
+
+
+def refresh_category_counts():
+    """
+    Recomputes every stored count with one grouped query and writes only the categories
+    whose counts drifted. Returns the number of updated categories.
+    """
+    own = dict(Product.objects.filter(inventory__gt=0, category__isnull=False).order_by()
+               .values_list("category_id").annotate(total=Count("pk")))
+    categories = list(Category.objects.order_by().only("id", "path", "product_count", "tree_product_count"))
+    tree = Counter()
+    for category in categories:
+        for ancestor in Category.path_ids(category.path) or [category.pk]:
+            tree[ancestor] += own.get(category.pk, 0)
+
+    changed = []
+    for category in categories:
+        counts = (own.get(category.pk, 0), tree[category.pk])
+        if (category.product_count, category.tree_product_count) != counts:
+            category.product_count, category.tree_product_count = counts
+            changed.append(category)
+    Category.objects.bulk_update(changed, ["product_count", "tree_product_count"], batch_size=500)
+    if changed:
+        invalidate()
+    return len(changed)
+
+
+def rebuild_paths():
+    """
+    Recomputes every path and depth from the parent links, top level categories first.
+    Returns the number of updated categories.
+    """
+    categories = {category.pk: category for category in Category.objects.order_by().only("id", "parent", "path",
+                                                                                           "depth")}
+    paths = {}
+
+    def path_of(category):
+        if category.pk not in paths:
+            parent = categories.get(category.parent_id)
+            paths[category.pk] = (path_of(parent) if parent else "") + f"{category.pk.hex}/"
+        return paths[category.pk]
+
+    changed = []
+    for category in categories.values():
+        path = path_of(category)
+        depth = path.count("/") - 1
+        if (category.path, category.depth) != (path, depth):
+            category.path, category.depth = path, depth
+            changed.append(category)
+    Category.objects.bulk_update(changed, ["path", "depth"], batch_size=500)
+    if changed:
+        invalidate()
+    return len(changed)
+
+
+def build_tree():
+    nodes, roots = {}, []
+    rows = Category.objects.order_by("path").values("id", "name", "parent_id", "depth", "product_count",
+                                                   "tree_product_count")
+    for row in rows:
+        node = {"id": str(row["id"]), "name": row["name"], "depth": row["depth"],
+                "product_count": row["product_count"], "tree_product_count": row["tree_product_count"],
+                "children": []}
+        nodes[row["id"]] = node
+        # ordering by path puts every parent before its children
+        parent = nodes.get(row["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    for node in nodes.values():
+        node["children"].sort(key=lambda child: child["name"].lower())
+    roots.sort(key=lambda node: node["name"].lower())
+    return roots
+
+
+def category_tree():
+    return category_cache.get_or_build(TREE_KEY, build_tree)
+
+
+def category_list(builder):
+    return category_cache.get_or_build(LIST_KEY, builder)
+
+
+def invalidate():
+    transaction.on_commit(lambda: category_cache.delete(TREE_KEY, LIST_KEY))
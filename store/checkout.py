@@ -0,0 +1,74 @@
+import secrets
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from store import coupons
+from store.inventory import reserve_items
+from store.models import Order, OrderItem
+
+PRICED_LINE_FIELDS = ("product_id", "size", "colour", "quantity", "unit_price", "extra_price", "line_total")
+
+
+def get_coupon(code):
+    if not code:
+        return None
+    return coupons.validate(code)
+
+
+def place_order(cart, address=None, coupon_code=None):
+    """
+    Turns ``cart`` into an ``Order`` with one ``OrderItem`` per cart line, reserving the
+    stock and emptying the cart in the same transaction.
+
+    Prices are snapshotted from ``CartItemQuerySet.with_pricing()`` so the order keeps
+    what the customer was charged even if the product is repriced later. The query
+    count does not grow with the size of the cart (beyond the batches SQLite splits
+    large INSERTs into).
+
+    The transaction starts by deleting exactly the lines that were priced. If another
+    checkout of the same cart got them first, or the cart changed in between, fewer
+    rows are deleted and the whole order is rolled back.
+    """
+    # reads happen before the transaction so SQLite takes its write lock on the first write
+    lines = list(cart.items.with_pricing().values("id", *PRICED_LINE_FIELDS))
+    if not lines:
+        raise ValidationError({"cart": "The cart is empty."})
+    coupon = get_coupon(coupon_code)
+
+    subtotal = sum((line["line_total"] for line in lines), Decimal("0"))
+    total = max(subtotal - coupon["price"], Decimal("0")) if coupon is not None else subtotal
+
+    claimed = Q()
+    for line in lines:
+        claimed |= Q(pk=line["id"], quantity=line["quantity"])
+
+    with transaction.atomic():
+        if cart.items.filter(claimed).delete()[0] != len(lines):
+            raise ValidationError({"cart": "The cart has changed or was already checked out, please try again."})
+        order = Order.objects.create(
+            customer_id=cart.customer_id,
+            address=address,
+            transaction_ref=secrets.token_hex(16),
+            total_price=total,
+        )
+        if coupon is not None:
+            # the usage limit is enforced here, in the transaction; validation above was cached
+            coupons.redeem(coupon, order, subtotal - total)
+        reserve_items(lines, order=order, cart=cart)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                customer_id=cart.customer_id,
+                order=order,
+                product_id=line["product_id"],
+                quantity=line["quantity"],
+                unit_price=line["unit_price"] + (line["extra_price"] or 0),
+                size=line["size"],
+                colour=line["colour"],
+                ordered=True,
+            )
+            for line in lines
+        ])
+    return order
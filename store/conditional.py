@@ -0,0 +1,24 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Returns a 304 (or 412) response if the client's ``If-None-Match`` /
+    ``If-Modified-Since`` headers already match, otherwise ``None``.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_conditional_headers(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
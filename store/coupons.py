@@ -0,0 +1,106 @@
+"""
+Coupon validation and redemption.
+
+``validate`` answers "can this code be used?" from a ``TwoTierCache`` keyed by the
+upper-cased code, so a busy checkout page does not query ``CouponCode`` per request.
+Entries live for ``TIMEOUT`` seconds (``LOCAL_TTL`` in-process); unknown codes are
+cached too, so guessing codes does not reach the database either.
+
+The cache never decides whether a coupon is used up. ``redeem`` takes a use with one
+conditional UPDATE (``times_used = times_used + 1 WHERE times_used < max_uses``), so
+concurrent checkouts can neither lose an increment nor go over the limit, and writes
+a ``CouponRedemption`` row to the ledger in the same transaction. A coupon found used
+up is cached as such, so later validations fail without a query.
+
+Settings, all optional, in ``COUPON_CACHE``: ``ALIAS``, ``TIMEOUT``,
+``LOCAL_MAXSIZE`` and ``LOCAL_TTL``.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from store.cache import TwoTierCache, cache_options
+from store.models import CouponCode, CouponRedemption
+
+coupon_cache = TwoTierCache("store:coupon", **cache_options("COUPON_CACHE"))
+
+INVALID_MESSAGE = "This coupon code is invalid or has expired."
+USED_UP_MESSAGE = "This coupon code has already been used the maximum number of times."
+
+
+def normalize(code):
+    return code.strip().upper()
+
+
+def snapshot(code):
+    coupon = (CouponCode.objects.filter(code=code)
+              .values("id", "code", "price", "expired", "expiry_date", "max_uses", "times_used").first())
+    if coupon is not None:
+        times_used = coupon.pop("times_used")
+        coupon["used_up"] = coupon["max_uses"] is not None and times_used >= coupon["max_uses"]
+    return coupon
+
+
+def lookup(code):
+    """
+    The cached state of ``code`` as a dict, or ``None`` for an unknown code.
+    """
+    code = normalize(code)
+    return coupon_cache.get_or_build(coupon_cache.make_key(code), lambda: snapshot(code))
+
+
+def validate(code, now=None):
+    """
+    The coupon ``code`` stands for, as returned by ``lookup``, or ``ValidationError``
+    if it cannot be used. A coupon that passes can still be used up by the time it is
+    redeemed.
+    """
+    now = now or timezone.now()
+    coupon = lookup(code)
+    if coupon is None or coupon["expired"] or coupon["expiry_date"] <= now:
+        raise ValidationError({"coupon_code": INVALID_MESSAGE})
+    if coupon["used_up"]:
+        raise ValidationError({"coupon_code": USED_UP_MESSAGE})
+    return coupon
+
+
+def invalidate(*codes):
+    keys = [coupon_cache.make_key(normalize(code)) for code in codes]
+    transaction.on_commit(lambda: coupon_cache.delete(*keys))
+
+
+def redeem(coupon, order, amount, now=None):
+    """
+    Takes one use of ``coupon`` (a ``validate`` result) for ``order`` and records it.
+    Must run inside the transaction that creates the order, so a failed checkout
+    gives the use back.
+    """
+    now = now or timezone.now()
+    taken = CouponCode.objects.filter(
+        Q(max_uses__isnull=True) | Q(times_used__lt=F("max_uses")),
+        pk=coupon["id"], expired=False, expiry_date__gt=now,
+    ).update(times_used=F("times_used") + 1, updated_date=now)
+    if not taken:
+        # remember it is used up (or gone) until the entry expires
+        state = snapshot(coupon["code"])
+        coupon_cache.set(coupon_cache.make_key(coupon["code"]), state)
+        used_up = state is not None and state["used_up"]
+        raise ValidationError({"coupon_code": USED_UP_MESSAGE if used_up else INVALID_MESSAGE})
+    return CouponRedemption.objects.create(coupon_id=coupon["id"], order=order, customer_id=order.customer_id,
+                                           amount=amount)
+
+
+def release(order):
+    """
+    Gives the coupon use of an unpaid order back.
+    """
+    with transaction.atomic():
+        redemption = CouponRedemption.objects.filter(order=order).select_related("coupon").first()
+        if redemption is None:
+            return False
+        redemption.delete()
+        CouponCode.objects.filter(pk=redemption.coupon_id, times_used__gt=0).update(
+            times_used=F("times_used") - 1, updated_date=timezone.now())
+    invalidate(redemption.coupon.code)
+    return True
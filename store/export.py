@@ -0,0 +1,109 @@
+"""
+Streaming exports of the catalog and the order history as CSV or NDJSON.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (a server-side
+cursor on Postgres) and encoded one at a time, so neither the queryset cache nor
+the response ever holds more than a chunk of rows, however large the table.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from store.models import Order, OrderItem, Product
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Dataset:
+
+    def __init__(self, model, columns):
+        self.model = model
+        # (header, lookup) pairs; lookups may follow foreign keys
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [header for header, _lookup in self.columns]
+
+    def rows(self, updated_since=None, chunk_size=CHUNK_SIZE):
+        queryset = self.model.objects.order_by()
+        if updated_since is not None:
+            queryset = queryset.filter(updated_date__gte=updated_since)
+        lookups = [lookup for _header, lookup in self.columns]
+        return queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+DATASETS = {
+    "products": Dataset(Product, [
+        ("id", "id"), ("title", "title"), ("slug", "slug"), ("category", "category__name"),
+        ("seller", "seller_id"), ("price", "price"), ("percentage_off", "percentage_off"),
+        ("shipping_fee", "shipping_fee"), ("shipping_out_days", "shipping_out_days"), ("inventory", "inventory"),
+        ("featured_product", "featured_product"), ("rating_count", "rating_count"), ("rating_sum", "rating_sum"),
+        ("created_date", "created_date"), ("updated_date", "updated_date"),
+    ]),
+    "orders": Dataset(Order, [
+        ("id", "id"), ("customer", "customer_id"), ("transaction_ref", "transaction_ref"),
+        ("placed_at", "placed_at"), ("total_price", "total_price"), ("address", "address_id"),
+        ("payment_status", "payment_status"), ("shipping_status", "shipping_status"),
+        ("created_date", "created_date"), ("updated_date", "updated_date"),
+    ]),
+    "order-items": Dataset(OrderItem, [
+        ("id", "id"), ("order", "order_id"), ("customer", "customer_id"), ("product", "product_id"),
+        ("product_title", "product__title"), ("quantity", "quantity"), ("unit_price", "unit_price"),
+        ("size", "size"), ("colour", "colour"), ("ordered", "ordered"),
+        ("created_date", "created_date"), ("updated_date", "updated_date"),
+    ]),
+}
+
+
+class Echo:
+    """
+    A write-only file whose ``write`` hands the line back, so ``csv.writer`` can encode
+    one row at a time for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(headers, rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(headers, row))) + "\n"
+
+
+def buffered(lines, size=64 * 1024):
+    """
+    Joins ``lines`` into chunks of about ``size`` characters, so a streaming response
+    writes to the socket per chunk instead of per row.
+    """
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def export_lines(dataset, file_format, **options):
+    """
+    The encoded lines of ``dataset`` (a ``DATASETS`` key) in ``file_format``.
+    """
+    dataset = DATASETS[dataset]
+    encode = csv_lines if file_format == "csv" else ndjson_lines
+    return encode(dataset.headers, dataset.rows(**options))
@@ -0,0 +1,269 @@
+"""
+Facet counts for the product catalog.
+
+Counts are disjunctive: the buckets of a facet are counted against the products
+matching every *other* active filter, so picking ``size=M`` still shows how many
+products come in L. Each facet is one grouped or conditional-aggregate query, so a
+full set of counts costs ``len(FACETS)`` queries (plus one for the total) however
+large the catalog is.
+
+With ``MATERIALIZED_FACET_COUNTS`` on, the counts for the unfiltered catalog are also
+kept in ``FacetCount`` and the unfiltered facet request reads that single table. The
+signals in ``store.signals`` keep it current incrementally: they take the buckets the
+touched products are in before and after a change and apply the difference with
+UPDATEs (``adjust_facet_counts``), so a save costs a few primary key lookups however
+large the catalog is. Stock reservations (``store.inventory``) apply the same
+difference for the variants they change. Bulk changes that bypass the signals (flash
+sales, repricing) refresh the facets they touch with ``schedule_refresh``, and the
+``refresh_facet_counts`` command fills the table in the first place.
+"""
+import abc
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django_filters.utils import translate_validation
+
+from store.filters import DISCOUNT_STEPS, PRICE_BAND_QS, PRICE_BANDS, RATING_STEPS, ProductFilter, discount_q, rating_q
+from store.models import ColourInventory, FacetCount, Product, SizeInventory
+
+
+class Facet(abc.ABC):
+    # whether the facet lists its empty buckets too
+    keeps_empty = False
+
+    def __init__(self, name, params, fields=()):
+        self.name = name
+        # the filters this facet drives; they are left out when counting its buckets
+        self.params = params
+        # the columns of the counted rows that decide the buckets
+        self.fields = frozenset(fields)
+
+    @abc.abstractmethod
+    def counts(self, queryset):
+        """
+        Returns ``[(value, label, count), ...]`` for the products in ``queryset``.
+        """
+        raise NotImplementedError
+
+    def ordered(self, buckets):
+        return sorted(buckets, key=lambda bucket: (-bucket[2], bucket[1]))
+
+
+class CategoryFacet(Facet):
+
+    def counts(self, queryset):
+        rows = (queryset.filter(category__isnull=False).order_by()
+                .values_list("category_id", "category__name").annotate(count=Count("pk")))
+        return self.ordered((str(category_id), name, count) for category_id, name, count in rows)
+
+
+class VariantFacet(Facet):
+
+    def __init__(self, name, params, model, lookup):
+        super().__init__(name, params, ("product", "size", "colour", "quantity"))
+        self.model = model
+        self.lookup = lookup
+
+    def counts(self, queryset):
+        rows = (self.model.objects.filter(product__in=queryset.order_by().values("pk"), quantity__gt=0)
+                .order_by().values_list(self.lookup).annotate(count=Count("product", distinct=True)))
+        return self.ordered((value, value, count) for value, count in rows)
+
+
+class BandFacet(Facet):
+    """
+    Fixed buckets counted with one ``COUNT(*) FILTER (WHERE ...)`` per bucket in a single
+    aggregate query. Buckets keep their declared order and include zero counts.
+    """
+
+    keeps_empty = True
+
+    def __init__(self, name, params, buckets, fields):
+        super().__init__(name, params, fields)
+        self.buckets = buckets
+
+    def aggregates(self):
+        return {f"{self.name}_{index}": Count("pk", filter=condition)
+                for index, (_value, _label, condition) in enumerate(self.buckets)}
+
+    def from_totals(self, totals):
+        return [(value, label, totals[f"{self.name}_{index}"])
+                for index, (value, label, _condition) in enumerate(self.buckets)]
+
+    def counts(self, queryset):
+        return self.from_totals(queryset.order_by().aggregate(**self.aggregates()))
+
+    def ordered(self, buckets):
+        position = {value: index for index, (value, _label, _condition) in enumerate(self.buckets)}
+        return sorted(buckets, key=lambda bucket: position.get(bucket[0], len(position)))
+
+
+FACETS = (
+    CategoryFacet("category", ("category",), ("category",)),
+    VariantFacet("size", ("size",), SizeInventory, "size__title"),
+    VariantFacet("colour", ("colour",), ColourInventory, "colour__name"),
+    BandFacet("price", ("price_band", "min_price", "max_price"),
+              [(band, label, PRICE_BAND_QS[band]) for band, label, _lower, _upper in PRICE_BANDS], ("price",)),
+    BandFacet("discount", ("min_discount",),
+              [(str(step), f"{step}% off or more", discount_q(step)) for step in DISCOUNT_STEPS],
+              ("percentage_off",)),
+    BandFacet("rating", ("min_rating",),
+              [(str(step), f"{step} star{'s' if step > 1 else ''} & up", rating_q(step)) for step in RATING_STEPS],
+              ("rating_count", "rating_sum")),
+)
+FACETS_BY_NAME = {facet.name: facet for facet in FACETS}
+# the facets decided by the product row alone
+PRODUCT_FACETS = ("category", "price", "discount", "rating")
+FILTER_PARAMS = frozenset(ProductFilter.base_filters)
+
+
+def filter_products(data, queryset=None):
+    filterset = ProductFilter(data, queryset=Product.objects.all() if queryset is None else queryset)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+def serialize_buckets(buckets):
+    return [{"value": value, "label": label, "count": count} for value, label, count in buckets]
+
+
+def compute_facets(data, queryset=None):
+    """
+    Returns ``(total, {facet name: [bucket, ...]})`` for the products matching the
+    filters in ``data`` (a ``QueryDict`` or dict of filter params).
+    """
+    total = filter_products(data, queryset).count()
+    facets = {}
+    for facet in FACETS:
+        others = data.copy()
+        for param in facet.params:
+            others.pop(param, None)
+        facets[facet.name] = serialize_buckets(facet.counts(filter_products(others, queryset)))
+    return total, facets
+
+
+def has_filters(data):
+    return any(data.get(param) not in (None, "") for param in FILTER_PARAMS)
+
+
+def is_materialized():
+    return getattr(settings, "MATERIALIZED_FACET_COUNTS", False)
+
+
+def materialized_facets():
+    """
+    The stored counts for the unfiltered catalog, in the same shape as ``compute_facets``.
+    """
+    buckets = {facet.name: [] for facet in FACETS}
+    for name, value, label, count in FacetCount.objects.order_by().values_list("facet", "value", "label", "count"):
+        if name in buckets:
+            buckets[name].append((value, label, count))
+    return {name: serialize_buckets(FACETS_BY_NAME[name].ordered(rows)) for name, rows in buckets.items()}
+
+
+def refresh_facet_counts(names=None):
+    """
+    Recomputes the stored counts of the named facets (all of them by default) with one
+    grouped query each, upserting the buckets and dropping the ones that went away.
+    """
+    refreshed = 0
+    for facet in FACETS:
+        if names is not None and facet.name not in names:
+            continue
+        rows = facet.counts(Product.objects.all())
+        with transaction.atomic():
+            FacetCount.objects.bulk_create(
+                [FacetCount(facet=facet.name, value=value, label=label[:255], count=count)
+                 for value, label, count in rows],
+                update_conflicts=True,
+                unique_fields=["facet", "value"],
+                update_fields=["label", "count", "updated_date"],
+            )
+            FacetCount.objects.filter(facet=facet.name).exclude(value__in=[value for value, _l, _c in rows]).delete()
+        refreshed += 1
+    return refreshed
+
+
+def schedule_refresh(*names):
+    if is_materialized():
+        transaction.on_commit(lambda: refresh_facet_counts(set(names) or None))
+
+
+def product_buckets(product_ids, names):
+    """
+    ``Counter({(facet, value, label): products})`` of the named facets over the
+    products in ``product_ids``. The category and band facets come from one grouped
+    query, each variant facet takes one more. Empty when the counts are not
+    materialized.
+    """
+    product_ids = [pk for pk in product_ids if pk is not None]
+    if not is_materialized() or not product_ids or not names:
+        return Counter()
+    queryset = Product.objects.filter(pk__in=product_ids)
+    facets = [FACETS_BY_NAME[name] for name in names]
+    bands = [facet for facet in facets if isinstance(facet, BandFacet)]
+    buckets = Counter()
+    if bands or "category" in names:
+        aggregates = {key: count for facet in bands for key, count in facet.aggregates().items()}
+        if "category" in names:
+            rows = queryset.order_by().values("category_id", "category__name").annotate(products=Count("pk"),
+                                                                                       **aggregates)
+        else:
+            rows = [queryset.order_by().aggregate(**aggregates)]
+        totals = Counter()
+        for row in rows:
+            if row.get("category_id") is not None:
+                buckets[("category", str(row["category_id"]), row["category__name"])] += row["products"]
+            totals.update({key: row[key] for key in aggregates})
+        for facet in bands:
+            buckets.update({(facet.name, value, label): count for value, label, count in facet.from_totals(totals)})
+    for facet in facets:
+        if isinstance(facet, VariantFacet):
+            buckets.update({(facet.name, value, label): count for value, label, count in facet.counts(queryset)})
+    return +buckets
+
+
+def facets_for_fields(names, update_fields):
+    """
+    The facets among ``names`` a save of ``update_fields`` (``None`` for all) can move.
+    """
+    if update_fields is None:
+        return names
+    return [name for name in names if FACETS_BY_NAME[name].fields & set(update_fields)]
+
+
+def adjust_facet_counts(before, after):
+    """
+    Applies the change from ``before`` to ``after`` (``product_buckets`` results) to the
+    stored counts, one UPDATE per bucket that changed. Buckets of facets that only list
+    non-empty buckets are dropped when they reach zero.
+    """
+    deltas, labels = Counter(), {}
+    for (name, value, label), count in after.items():
+        deltas[(name, value)] += count
+        labels[(name, value)] = label
+    for (name, value, label), count in before.items():
+        deltas[(name, value)] -= count
+        labels.setdefault((name, value), label)
+    deltas = {bucket: delta for bucket, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=name, value=value, label=labels[(name, value)][:255], count=0)
+             for (name, value), delta in deltas.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        for (name, value), delta in deltas.items():
+            counts = FacetCount.objects.filter(facet=name, value=value)
+            # never below zero, even if the stored counts have drifted
+            counts.update(count=Greatest(F("count") + delta, Value(0)), updated_date=now)
+        emptied = {name for name, _value in deltas if not FACETS_BY_NAME[name].keeps_empty}
+        if emptied:
+            FacetCount.objects.filter(facet__in=emptied, count=0).delete()
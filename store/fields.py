@@ -0,0 +1,15 @@
+from autoslug import AutoSlugField
+
+
+class BulkAutoSlugField(AutoSlugField):
+    """
+    ``AutoSlugField`` that keeps a slug assigned up front by a bulk writer (see
+    ``store.importer.assign_slugs``) instead of re-running its uniqueness queries for
+    every row; the bulk writer sets ``instance._slug_assigned``. Every other save
+    behaves exactly like ``AutoSlugField``.
+    """
+
+    def pre_save(self, instance, add):
+        if getattr(instance, "_slug_assigned", False):
+            return getattr(instance, self.attname)
+        return super().pre_save(instance, add)
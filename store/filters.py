@@ -0,0 +1,107 @@
+from django.db.models import Exists, F, OuterRef, Q
+from django_filters import rest_framework as filters
+
+from store.models import Category, ColourInventory, Product, SizeInventory
+
+# (value, label, lower bound, upper bound), bounds on ``Product.price``
+PRICE_BANDS = (
+    ("0-25", "Under 25", None, 25),
+    ("25-50", "25 to 50", 25, 50),
+    ("50-100", "50 to 100", 50, 100),
+    ("100-250", "100 to 250", 100, 250),
+    ("250-", "250 and above", 250, None),
+)
+DISCOUNT_STEPS = (10, 25, 50)
+RATING_STEPS = (4, 3, 2, 1)
+
+
+def price_band_q(lower, upper):
+    condition = Q()
+    if lower is not None:
+        condition &= Q(price__gte=lower)
+    if upper is not None:
+        condition &= Q(price__lt=upper)
+    return condition
+
+
+PRICE_BAND_QS = {band: price_band_q(lower, upper) for band, _label, lower, upper in PRICE_BANDS}
+
+
+def discount_q(minimum):
+    return Q(percentage_off__gte=minimum)
+
+
+def rating_q(minimum):
+    # average >= minimum without dividing: rating_sum >= minimum * rating_count
+    return Q(rating_count__gt=0, rating_sum__gte=F("rating_count") * minimum)
+
+
+def in_stock_variant(model, lookup, values):
+    return Exists(model.objects.filter(product=OuterRef("pk"), quantity__gt=0, **{f"{lookup}__in": values}))
+
+
+class UUIDInFilter(filters.BaseInFilter, filters.UUIDFilter):
+    pass
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    pass
+
+
+class ChoiceInFilter(filters.BaseInFilter, filters.ChoiceFilter):
+    pass
+
+
+class ProductFilter(filters.FilterSet):
+    """
+    Catalog filters. Comma separated values within one filter are OR'ed
+    (``size=M,L``), different filters are AND'ed. Size and colour match products that
+    have the variant in stock, through an ``EXISTS`` so the result needs no DISTINCT.
+    ``category_tree`` matches a category and all of its subcategories by path range.
+    """
+
+    category = UUIDInFilter(field_name="category_id")
+    category_tree = filters.UUIDFilter(method="filter_category_tree")
+    size = CharInFilter(method="filter_size")
+    colour = CharInFilter(method="filter_colour")
+    price_band = ChoiceInFilter(method="filter_price_band",
+                                choices=[(band, label) for band, label, _lower, _upper in PRICE_BANDS])
+    min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")
+    max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")
+    # on what the customer pays, percentage off included (Product.effective_price)
+    min_effective_price = filters.NumberFilter(field_name="effective_price", lookup_expr="gte")
+    max_effective_price = filters.NumberFilter(field_name="effective_price", lookup_expr="lte")
+    min_discount = filters.NumberFilter(field_name="percentage_off", lookup_expr="gte")
+    min_rating = filters.NumberFilter(method="filter_min_rating")
+    in_stock = filters.BooleanFilter(method="filter_in_stock")
+
+    class Meta:
+        model = Product
+        fields = ("category", "category_tree", "size", "colour", "price_band", "min_price", "max_price",
+                  "min_effective_price", "max_effective_price", "min_discount", "min_rating", "in_stock")
+
+    def filter_category_tree(self, queryset, name, value):
+        path = Category.objects.filter(pk=value).values_list("path", flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(Category.subtree_q(path, prefix="category__"))
+
+    def filter_size(self, queryset, name, value):
+        return queryset.filter(in_stock_variant(SizeInventory, "size__title", value))
+
+    def filter_colour(self, queryset, name, value):
+        return queryset.filter(in_stock_variant(ColourInventory, "colour__name", value))
+
+    def filter_price_band(self, queryset, name, value):
+        condition = Q()
+        for band in value:
+            condition |= PRICE_BAND_QS[band]
+        return queryset.filter(condition)
+
+    def filter_min_rating(self, queryset, name, value):
+        return queryset.filter(rating_q(value))
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(inventory__gt=0)
+        return queryset.filter(Q(inventory__lte=0) | Q(inventory__isnull=True))
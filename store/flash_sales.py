@@ -0,0 +1,204 @@
+"""
+Scheduled flash sales.
+
+A ``FlashSale`` puts its products at ``percentage_off`` between ``starts_at`` and
+``ends_at``. Nothing compares dates per request: the ``run_flash_sales`` command
+moves every sale through its schedule at the boundaries, each step a handful of bulk
+UPDATEs, so the product rows themselves always hold the current price and
+``Product.discount_price``, the cart pricing SQL and the listings need no changes.
+
+- ``WARM_AHEAD_SECONDS`` before the start, ``prepare`` fills the effective-price
+  table (``FlashSalePrice``, one row per product and per size/colour variant) and
+  stores the sale-price detail payloads in the product cache under the version the
+  products will have once the sale starts.
+- At ``starts_at``, ``activate`` snapshots each product's own ``percentage_off`` and
+  switches the products over. Products not changed since they were warmed get
+  ``updated_date = starts_at``, which is exactly the version the warm payloads are
+  stored under, so the first detail requests of the sale are cache hits.
+- At ``ends_at``, ``end`` puts the snapshotted ``percentage_off`` back.
+
+A product already in another sale (or given sale dates by hand) is left alone until
+that sale is over.
+
+Settings, all optional, in ``FLASH_SALES``: ``WARM_AHEAD_SECONDS`` and ``INTERVAL``
+(seconds between scheduler runs of the command).
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from store.api.choices import FLASH_SALE_ACTIVE, FLASH_SALE_CANCELLED, FLASH_SALE_ENDED, FLASH_SALE_SCHEDULED
+from store.api.serializers import ProductReadSerializer
+from store.cache import product_cache
+from store.facets import schedule_refresh
+from store.models import ColourInventory, FlashSale, FlashSalePrice, Product, SizeInventory
+
+DEFAULTS = {
+    "WARM_AHEAD_SECONDS": 60,
+    "INTERVAL": 15,
+}
+
+
+def flash_sale_option(name):
+    return getattr(settings, "FLASH_SALES", {}).get(name, DEFAULTS[name])
+
+
+def unit_price(price, percentage_off):
+    return Product(price=price, percentage_off=percentage_off).get_effective_price()
+
+
+def free_for(sale):
+    # products not held by another sale over this one's start
+    return Q(flash_sale_end_date__isnull=True) | Q(flash_sale_end_date__lte=sale.starts_at)
+
+
+def precompute_prices(sale):
+    """
+    Rebuilds the sale's effective-price table: the regular and the sale price of each
+    product and of each of its sizes and colours (their extra price included).
+    """
+    products = list(sale.products.filter(free_for(sale)).values_list("id", "price", "percentage_off"))
+    product_ids = [product_id for product_id, _price, _percentage_off in products]
+    extras = {product_id: [] for product_id in product_ids}
+    for product_id, size, extra in SizeInventory.objects.filter(product__in=product_ids).values_list(
+            "product_id", "size__title", "extra_price"):
+        extras[product_id].append((size, "", extra or 0))
+    for product_id, colour, extra in ColourInventory.objects.filter(product__in=product_ids).values_list(
+            "product_id", "colour__name", "extra_price"):
+        extras[product_id].append(("", colour, extra or 0))
+
+    rows = []
+    for product_id, price, percentage_off in products:
+        regular, on_sale = unit_price(price, percentage_off), unit_price(price, sale.percentage_off)
+        rows.append(FlashSalePrice(sale=sale, product_id=product_id, regular_price=regular, sale_price=on_sale))
+        rows += [FlashSalePrice(sale=sale, product_id=product_id, size=size, colour=colour,
+                                regular_price=regular + extra, sale_price=on_sale + extra)
+                 for size, colour, extra in extras[product_id]]
+    with transaction.atomic():
+        FlashSalePrice.objects.filter(sale=sale).delete()
+        FlashSalePrice.objects.bulk_create(rows, batch_size=1000)
+    return len(products)
+
+
+def prewarm(sale):
+    """
+    Stores the detail payload every product of the sale will have once it starts.
+    """
+    expand = list(ProductReadSerializer.expandable)
+    products = ProductReadSerializer.setup_queryset(
+        Product.objects.filter(flash_sale_prices__sale=sale, flash_sale_prices__size="",
+                               flash_sale_prices__colour=""), expand=expand)
+    version = sale.starts_at.timestamp()
+    warmed = 0
+    for product in products:
+        product.percentage_off = sale.percentage_off
+        product.flash_sale_start_date, product.flash_sale_end_date = sale.starts_at, sale.ends_at
+        product.effective_price = product.get_effective_price()
+        product_cache.put(product.pk, dict(ProductReadSerializer(product, context={"expand": expand}).data),
+                          version=version)
+        warmed += 1
+    return warmed
+
+
+def prepare(sale, now=None):
+    now = now or timezone.now()
+    precompute_prices(sale)
+    warmed = prewarm(sale) if now < sale.starts_at else 0
+    FlashSale.objects.filter(pk=sale.pk).update(warmed_at=now)
+    sale.warmed_at = now
+    return warmed
+
+
+def activate(sale, now=None):
+    """
+    Switches the sale's products to the sale price. Returns how many were switched, or
+    ``None`` if another worker got the sale first.
+    """
+    now = now or timezone.now()
+    if sale.warmed_at is None:
+        precompute_prices(sale)
+    product_prices = FlashSalePrice.objects.filter(sale=sale, size="", colour="")
+    with transaction.atomic():
+        if not FlashSale.objects.filter(pk=sale.pk, status=FLASH_SALE_SCHEDULED).update(
+                status=FLASH_SALE_ACTIVE, updated_date=now):
+            return None
+        products = Product.objects.filter(free_for(sale), id__in=product_prices.values("product_id"))
+        product_prices.filter(product__in=products).update(regular_percentage_off=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("percentage_off")[:1]))
+        on_sale = dict(percentage_off=sale.percentage_off,
+                       flash_sale_start_date=sale.starts_at, flash_sale_end_date=sale.ends_at)
+        activated = 0
+        if sale.warmed_at is not None and sale.warmed_at < sale.starts_at:
+            # unchanged since they were warmed: take the version the warm payloads are stored under
+            activated += products.filter(updated_date__lte=sale.warmed_at).update(
+                updated_date=sale.starts_at, **on_sale)
+        # the products switched above no longer match free_for(sale)
+        activated += products.update(updated_date=now, **on_sale)
+    schedule_refresh("discount")
+    return activated
+
+
+def end(sale, now=None, status=FLASH_SALE_ENDED):
+    """
+    Puts back the percentage off the sale's products had before it started.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        if not FlashSale.objects.filter(pk=sale.pk, status=FLASH_SALE_ACTIVE).update(status=status, updated_date=now):
+            return None
+        product_prices = FlashSalePrice.objects.filter(sale=sale, size="", colour="",
+                                                       regular_percentage_off__isnull=False)
+        ended = Product.objects.filter(
+            id__in=product_prices.values("product_id"),
+            flash_sale_start_date=sale.starts_at, flash_sale_end_date=sale.ends_at,
+        ).update(
+            percentage_off=Subquery(product_prices.filter(product=OuterRef("pk")).values("regular_percentage_off")[:1]),
+            flash_sale_start_date=None, flash_sale_end_date=None, updated_date=now,
+        )
+    schedule_refresh("discount")
+    return ended
+
+
+def cancel(sale, now=None):
+    if end(sale, now, status=FLASH_SALE_CANCELLED) is None:
+        FlashSale.objects.filter(pk=sale.pk, status=FLASH_SALE_SCHEDULED).update(
+            status=FLASH_SALE_CANCELLED, updated_date=now or timezone.now())
+
+
+def run_scheduler(now=None):
+    """
+    One pass of the schedule: warms the sales about to start, ends the sales that are
+    over, then starts the sales that are due, in that order so a product can go from
+    one sale straight into the next at the same boundary.
+    """
+    now = now or timezone.now()
+    warm_until = now + datetime.timedelta(seconds=flash_sale_option("WARM_AHEAD_SECONDS"))
+    counts = {"warmed": 0, "ended": 0, "activated": 0}
+    for sale in FlashSale.objects.filter(status=FLASH_SALE_SCHEDULED, starts_at__lte=warm_until,
+                                         warmed_at__isnull=True):
+        prepare(sale, now)
+        counts["warmed"] += 1
+    for sale in FlashSale.objects.filter(status=FLASH_SALE_ACTIVE, ends_at__lte=now):
+        if end(sale, now) is not None:
+            counts["ended"] += 1
+    for sale in FlashSale.objects.filter(status=FLASH_SALE_SCHEDULED, starts_at__lte=now):
+        if sale.ends_at <= now:
+            # missed its whole window
+            FlashSale.objects.filter(pk=sale.pk, status=FLASH_SALE_SCHEDULED).update(
+                status=FLASH_SALE_ENDED, updated_date=now)
+        elif activate(sale, now) is not None:
+            counts["activated"] += 1
+    return counts
+
+
+def active_sale_products(now=None):
+    """
+    The products on sale right now, ending soonest first; a range scan of the partial
+    ``product_flash_sale_idx``.
+    """
+    now = now or timezone.now()
+    return Product.objects.filter(percentage_off__gt=0, flash_sale_end_date__gt=now,
+                                  flash_sale_start_date__lte=now).order_by("flash_sale_end_date", "id")
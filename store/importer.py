@@ -0,0 +1,275 @@
+"""
+Bulk product import from CSV or JSON lines.
+
+Rows are streamed from the file and handled in batches: each row is validated
+without touching the database, names are resolved against category, size and
+colour maps loaded once per import, slugs are assigned for the whole batch with two
+queries, and the products with their sizes, colours and images go in with one
+``bulk_create`` per table inside a transaction per batch. A bad row is reported and
+skipped; it never fails the rest of its batch.
+
+``bulk_create`` does not send ``post_save``, so each batch is added to the search
+index, the category counts and the facet counts explicitly.
+"""
+import csv
+import io
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from store.api.serializers import ProductImportRowSerializer
+from store.categories import adjust_counts_for
+from store.facets import FACETS_BY_NAME, adjust_facet_counts, product_buckets
+from store.models import Category, Colour, ColourInventory, Product, ProductImage, Size, SizeInventory
+from store.search import get_search_backend
+
+FORMATS = ("csv", "jsonl")
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, errors):
+        self.errors.append({"line": line, "errors": errors})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed, 1) if self.elapsed else 0.0
+
+    def as_dict(self, max_errors=100):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "failed": len(self.errors),
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": self.rows_per_second,
+            "errors": self.errors[:max_errors],
+        }
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream, format):
+    """
+    Yields ``(line number, row dict)`` from a text stream without reading it all in.
+    Empty CSV cells are dropped so optional columns fall back to their defaults.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip(): value for key, value in row.items()
+                                    if key and value not in (None, "")}
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, error
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("Expected a JSON object.")
+
+
+def text_stream(file):
+    """
+    A text view of an uploaded (binary) file or of an already open text file.
+    """
+    if isinstance(file, io.TextIOBase):
+        return file
+    return io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+
+def assign_slugs(products, taken):
+    """
+    Gives every product in ``products`` a unique slug the way ``AutoSlugField`` would
+    (``title``, then ``title-2``, ``title-3``...) using two queries for the whole batch
+    instead of one or more per row. ``taken`` is the set of slugs already known to be
+    used and is updated in place.
+    """
+    field = Product._meta.get_field("slug")
+    bases = [field.slugify(product.title)[:field.max_length] or Product._meta.model_name for product in products]
+
+    wanted = set(bases) - taken
+    taken.update(Product.objects.filter(slug__in=wanted).values_list("slug", flat=True))
+    seen, clashing = set(), set()
+    for base in bases:
+        if base in taken or base in seen:
+            clashing.add(base)
+        seen.add(base)
+    if clashing:
+        prefixes = Q()
+        for base in clashing:
+            prefixes |= Q(slug__startswith=f"{base}{field.index_sep}")
+        taken.update(Product.objects.filter(prefixes).values_list("slug", flat=True))
+
+    for product, base in zip(products, bases):
+        slug, index = base, 1
+        while slug in taken:
+            index += 1
+            suffix = f"{field.index_sep}{index}"
+            slug = f"{base[:field.max_length - len(suffix)]}{suffix}"
+        taken.add(slug)
+        product.slug = slug
+        product._slug_assigned = True
+
+
+class ProductImporter:
+
+    def __init__(self, seller=None, batch_size=500, create_missing=False, dry_run=False):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.dry_run = dry_run
+        self.categories = {name.lower(): pk for pk, name in Category.objects.values_list("pk", "name")}
+        self.sizes = {title.lower(): pk for pk, title in Size.objects.values_list("pk", "title")}
+        self.colours = {name.lower(): pk for pk, name in Colour.objects.values_list("pk", "name")}
+        self.slugs = set()
+        self.titles = set()
+        # one serializer validates every row, so its fields are only built once
+        self.row_serializer = ProductImportRowSerializer()
+
+    def run(self, rows):
+        report = ImportReport()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return report.finish()
+            report.rows += len(batch)
+            self.import_batch(batch, report)
+
+    def import_batch(self, batch, report):
+        valid = []
+        for line, row in batch:
+            if isinstance(row, Exception):
+                report.add_error(line, {"row": [str(row)]})
+                continue
+            try:
+                valid.append((line, self.row_serializer.run_validation(row)))
+            except ValidationError as error:
+                report.add_error(line, error.detail)
+
+        valid = self.drop_duplicate_titles(valid, report)
+        if self.create_missing:
+            self.create_missing_names(valid)
+        resolved = []
+        for line, data in valid:
+            errors = self.unresolved_names(data)
+            if errors:
+                report.add_error(line, errors)
+            else:
+                resolved.append((line, data))
+        if not resolved or self.dry_run:
+            return
+
+        try:
+            product_ids = self.insert(resolved)
+        except IntegrityError as error:
+            for line, _data in resolved:
+                report.add_error(line, {"row": [f"Batch rolled back: {error}"]})
+            return
+        report.created += len(product_ids)
+        adjust_counts_for(Product.objects.filter(pk__in=product_ids, inventory__gt=0), 1)
+        get_search_backend().index(product_ids)
+        adjust_facet_counts(Counter(), product_buckets(product_ids, FACETS_BY_NAME))
+
+    def drop_duplicate_titles(self, rows, report):
+        titles = [data["title"] for _line, data in rows]
+        self.titles.update(Product.objects.filter(title__in=titles).values_list("title", flat=True))
+        unique = []
+        for line, data in rows:
+            if data["title"] in self.titles:
+                report.add_error(line, {"title": ["A product with this title already exists."]})
+                continue
+            self.titles.add(data["title"])
+            unique.append((line, data))
+        return unique
+
+    def create_missing_names(self, rows):
+        # colours need a hex code, so only categories and sizes can be created from a name
+        categories = {data["category"].strip() for _line, data in rows if data.get("category")}
+        sizes = {name for _line, data in rows for name, _quantity, _extra in data["sizes"]}
+        new_categories = [Category(name=name) for name in categories if name.lower() not in self.categories]
+        new_sizes = [Size(title=title) for title in sizes if title.lower() not in self.sizes and len(title) <= 5]
+        if self.dry_run:
+            # resolvable, nothing is inserted on a dry run
+            self.categories.update((category.name.lower(), None) for category in new_categories)
+            self.sizes.update((size.title.lower(), None) for size in new_sizes)
+            return
+        for category in new_categories:
+            # bulk_create skips Category.save, which sets the path the category_tree filter reads
+            category.path, category.depth = f"{category.pk.hex}/", 0
+        for category in Category.objects.bulk_create(new_categories):
+            self.categories[category.name.lower()] = category.pk
+        for size in Size.objects.bulk_create(new_sizes):
+            self.sizes[size.title.lower()] = size.pk
+
+    def unresolved_names(self, data):
+        errors = {}
+        category = data.get("category", "").strip()
+        if category and category.lower() not in self.categories:
+            errors["category"] = [f"Unknown category '{category}'."]
+        for key, lookup in (("sizes", self.sizes), ("colours", self.colours)):
+            unknown = [name for name, _quantity, _extra in data[key] if name.lower() not in lookup]
+            if unknown:
+                errors[key] = [f"Unknown {key[:-1]} '{name}'." for name in unknown]
+        return errors
+
+    def insert(self, rows):
+        products, sizes, colours, images = [], [], [], []
+        for _line, data in rows:
+            category = data.get("category", "").strip()
+            product = Product(
+                seller=self.seller,
+                title=data["title"],
+                category_id=self.categories[category.lower()] if category else None,
+                description=data.get("description"),
+                style=data.get("style"),
+                price=data["price"],
+                shipping_out_days=data["shipping_out_days"],
+                shipping_fee=data["shipping_fee"],
+                inventory=data["inventory"],
+                percentage_off=data["percentage_off"],
+                featured_product=data["featured_product"],
+            )
+            products.append(product)
+            sizes += [SizeInventory(product=product, size_id=self.sizes[name.lower()], quantity=quantity,
+                                    extra_price=extra) for name, quantity, extra in data["sizes"]]
+            colours += [ColourInventory(product=product, colour_id=self.colours[name.lower()], quantity=quantity,
+                                        extra_price=extra) for name, quantity, extra in data["colours"]]
+            images += [ProductImage(product=product, _image=path) for path in data["images"]]
+
+        assign_slugs(products, self.slugs)
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            SizeInventory.objects.bulk_create(sizes)
+            ColourInventory.objects.bulk_create(colours)
+            ProductImage.objects.bulk_create(images)
+        return [product.pk for product in products]
+
+
+def import_products(file, format=None, **options):
+    """
+    Imports the products in ``file`` (an open text or binary file) and returns the
+    ``ImportReport``. ``options`` are passed to ``ProductImporter``.
+    """
+    format = format or detect_format(getattr(file, "name", "") or "")
+    return ProductImporter(**options).run(read_rows(text_stream(file), format))
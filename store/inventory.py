@@ -0,0 +1,179 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from store.api.choices import RESERVATION_COMMITTED, RESERVATION_HELD, RESERVATION_RELEASED
+from store.categories import adjust_counts_for
+from store.facets import adjust_facet_counts, product_buckets
+from store.models import ColourInventory, InventoryReservation, Product, SizeInventory
+
+RESERVATION_TTL = timezone.timedelta(minutes=getattr(settings, "INVENTORY_RESERVATION_MINUTES", 15))
+
+
+class InsufficientStock(ValidationError):
+    default_detail = "Not enough stock to complete the order."
+    default_code = "insufficient_stock"
+
+
+def _take_many(model, field, quantities):
+    """
+    Decrements ``field`` on every row in ``quantities`` (``{pk: quantity}``) with a single
+    ``UPDATE ... CASE`` that only touches rows with enough left. The check and the write
+    are one statement, so two checkouts can never both see the same last unit; a short
+    row simply isn't updated, which the caller sees in the row count.
+    """
+    if not quantities:
+        return True
+    needed = Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                  output_field=IntegerField())
+    changes = {field: F(field) - needed}
+    if model is Product:
+        changes["updated_date"] = timezone.now()
+    updated = model.objects.filter(pk__in=list(quantities), **{f"{field}__gte": needed}).update(**changes)
+    return updated == len(quantities)
+
+
+def _put_back(queryset, field, quantity):
+    changes = {field: F(field) + quantity}
+    if queryset.model is Product:
+        changes["updated_date"] = timezone.now()
+    return queryset.update(**changes)
+
+
+def _variant_querysets(product_id, size, colour):
+    variants = []
+    if size:
+        variants.append((SizeInventory.objects.filter(product_id=product_id, size__title=size), "quantity"))
+    if colour:
+        variants.append((ColourInventory.objects.filter(product_id=product_id, colour__name=colour), "quantity"))
+    return variants
+
+
+def _variant_facets(sizes, colours):
+    # the facets whose buckets follow the variant quantities an UPDATE here changes
+    return [name for name, changed in (("size", sizes), ("colour", colours)) if changed]
+
+
+def _variant_quantities(model, lookup, wanted):
+    """
+    Maps ``{(product_id, variant name): quantity}`` to ``{variant row pk: quantity}`` with one
+    query. Returns ``None`` if a requested variant does not exist.
+    """
+    if not wanted:
+        return {}
+    condition = Q()
+    for product_id, name in wanted:
+        condition |= Q(product_id=product_id, **{lookup: name})
+    pks = {(product_id, name): pk
+           for pk, product_id, name in model.objects.filter(condition).values_list("pk", "product_id", lookup)}
+    if len(pks) != len(wanted):
+        return None
+    return {pks[key]: quantity for key, quantity in wanted.items()}
+
+
+def reserve_items(items, order=None, cart=None, ttl=RESERVATION_TTL):
+    """
+    Reserves stock for ``items`` (dicts with ``product_id``, ``size``, ``colour`` and
+    ``quantity``) in a single transaction and returns the held reservations. If any
+    line is short, nothing is reserved and ``InsufficientStock`` is raised.
+
+    The number of queries does not depend on the number of items: one UPDATE for the
+    products, a lookup and an UPDATE per variant table and one INSERT (plus the variant
+    buckets before and after when the facet counts are materialized).
+    """
+    lines = Counter()
+    for item in items:
+        lines[(item["product_id"], item.get("size"), item.get("colour"))] += item["quantity"]
+    if not lines:
+        return []
+
+    per_product, per_size, per_colour = Counter(), Counter(), Counter()
+    for (product_id, size, colour), quantity in lines.items():
+        per_product[product_id] += quantity
+        if size:
+            per_size[(product_id, size)] += quantity
+        if colour:
+            per_colour[(product_id, colour)] += quantity
+
+    expires_at = timezone.now() + ttl
+    # the UPDATEs skip the signals, so a variant sold out here is taken off the facet counts directly
+    facets = _variant_facets(per_size, per_colour)
+    variant_products = {product_id for product_id, _name in [*per_size, *per_colour]}
+    with transaction.atomic():
+        if not _take_many(Product, "inventory", per_product):
+            raise InsufficientStock()
+        adjust_counts_for(Product.objects.filter(pk__in=list(per_product), inventory=0), -1)
+
+        before = product_buckets(variant_products, facets)
+        for model, lookup, wanted in ((SizeInventory, "size__title", per_size),
+                                      (ColourInventory, "colour__name", per_colour)):
+            quantities = _variant_quantities(model, lookup, wanted)
+            if quantities is None or not _take_many(model, "quantity", quantities):
+                raise InsufficientStock("Not enough stock of the selected size or colour.")
+        adjust_facet_counts(before, product_buckets(variant_products, facets))
+
+        return InventoryReservation.objects.bulk_create([
+            InventoryReservation(product_id=product_id, size=size, colour=colour, quantity=quantity,
+                                 order=order, cart=cart, expires_at=expires_at)
+            for (product_id, size, colour), quantity in lines.items()
+        ])
+
+
+def reserve_cart(cart, order=None, ttl=RESERVATION_TTL):
+    # read outside the write transaction so SQLite takes its write lock on the first UPDATE
+    items = list(cart.items.values("product_id", "size", "colour", "quantity"))
+    return reserve_items(items, order=order, cart=cart, ttl=ttl)
+
+
+def release(reservations):
+    """
+    Returns the stock of held reservations. A reservation is flipped from held to
+    released with a conditional UPDATE first, so releasing twice (or racing the
+    expiry sweeper) never puts the same units back twice.
+    """
+    released = 0
+    for reservation in reservations:
+        with transaction.atomic():
+            flipped = InventoryReservation.objects.filter(pk=reservation.pk, status=RESERVATION_HELD).update(
+                status=RESERVATION_RELEASED, updated_date=timezone.now())
+            if not flipped:
+                continue
+            _put_back(Product.objects.filter(pk=reservation.product_id), "inventory", reservation.quantity)
+            # back in stock if the units put back are all there is
+            adjust_counts_for(Product.objects.filter(pk=reservation.product_id, inventory=reservation.quantity), 1)
+            facets = _variant_facets(reservation.size, reservation.colour)
+            before = product_buckets([reservation.product_id], facets)
+            for queryset, field in _variant_querysets(reservation.product_id, reservation.size, reservation.colour):
+                _put_back(queryset, field, reservation.quantity)
+            adjust_facet_counts(before, product_buckets([reservation.product_id], facets))
+            released += 1
+    return released
+
+
+def release_order(order):
+    return release(order.reservations.filter(status=RESERVATION_HELD))
+
+
+def commit_order(order):
+    """
+    Makes the held reservations of a paid order permanent; the stock stays taken.
+    """
+    return order.reservations.filter(status=RESERVATION_HELD).update(
+        status=RESERVATION_COMMITTED, updated_date=timezone.now())
+
+
+def release_expired(now=None, batch_size=500):
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(InventoryReservation.objects.filter(status=RESERVATION_HELD, expires_at__lte=now)
+                     .order_by("expires_at").only("id", "product_id", "size", "colour", "quantity")[:batch_size])
+        if not batch:
+            return released
+        released += release(batch)
+        if len(batch) < batch_size:
+            return released
@@ -0,0 +1,72 @@
+import secrets
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Cart, CartItem, Product
+
+
+def legacy_cart_total(cart):
+    # the Python computation Cart.total_price used before it moved into SQL
+    return sum([item.total_price for item in cart.items.all()])
+
+
+class Command(BaseCommand):
+    help = "Compares the SQL cart totals against the per-item Python computation for growing cart sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,50,100,500", help="Comma separated cart sizes")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        products = self.make_products(max(sizes))
+        carts = []
+        try:
+            self.stdout.write(f"{'items':>6} {'python ms':>10} {'queries':>8} {'sql ms':>8} {'queries':>8} {'speedup':>8}")
+            for size in sizes:
+                cart = self.make_cart(products[:size])
+                carts.append(cart)
+                legacy_ms, legacy_queries, legacy_total = self.measure(lambda: legacy_cart_total(cart), options)
+                sql_ms, sql_queries, sql_total = self.measure(lambda: cart.total_price, options)
+                if legacy_total != sql_total:
+                    raise CommandError(f"Totals differ for {size} items: {legacy_total} != {sql_total}")
+                self.stdout.write(f"{size:>6} {legacy_ms:>10.2f} {legacy_queries:>8} {sql_ms:>8.2f} "
+                                  f"{sql_queries:>8} {legacy_ms / sql_ms:>7.1f}x")
+        finally:
+            if not options["keep"]:
+                Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+                Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+
+    @staticmethod
+    def measure(func, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                result = func()
+                timings.append((time.perf_counter() - started) * 1000)
+        return min(timings), len(queries.captured_queries), result
+
+    @staticmethod
+    def make_products(count):
+        token = secrets.token_hex(4)
+        return Product.objects.bulk_create([
+            Product(title=f"bench-{token}-{index}", slug=f"bench-{token}-{index}",
+                    price=Decimal(1000 + index * 37) / 100, percentage_off=(index * 7) % 60,
+                    shipping_fee=Decimal(index % 500) / 100, inventory=10)
+            for index in range(count)
+        ])
+
+    @staticmethod
+    def make_cart(products):
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=index % 3 + 1, extra_price=Decimal(index % 4) / 4)
+            for index, product in enumerate(products)
+        ])
+        return cart
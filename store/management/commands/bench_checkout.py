@@ -0,0 +1,74 @@
+import secrets
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from store.checkout import place_order
+from store.models import Cart, CartItem, Order, Product, Size, SizeInventory
+
+
+class Command(BaseCommand):
+    help = "Places orders from carts of growing size and fails if the checkout query count grows with the cart"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,100,500", help="Comma separated cart sizes")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        products = self.make_products(max(sizes))
+        orders, carts = [], []
+        try:
+            self.stdout.write(f"{'items':>6} {'ms':>9} {'queries':>8} {'inserts':>8}")
+            baseline = None
+            for size in sizes:
+                cart = self.make_cart(products[:size])
+                carts.append(cart)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    orders.append(place_order(cart))
+                    elapsed = (time.perf_counter() - started) * 1000
+
+                statements = [query["sql"] for query in queries.captured_queries]
+                # one INSERT each for the order, its reservations and its items; SQLite caps
+                # bound parameters, so Django splits the bulk ones into batches on big carts
+                inserts = sum(sql.startswith("INSERT") for sql in statements)
+                fixed = len(statements) - (inserts - 3)
+                self.stdout.write(f"{size:>6} {elapsed:>9.2f} {len(statements):>8} {inserts:>8}")
+
+                baseline = fixed if baseline is None else baseline
+                if fixed != baseline:
+                    raise CommandError(f"Checkout ran {fixed} statements for {size} items, {baseline} for {sizes[0]}")
+            self.stdout.write(self.style.SUCCESS("Checkout query count is independent of the cart size."))
+        finally:
+            if not options["keep"]:
+                Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+                Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+                Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+
+    @staticmethod
+    def make_products(count):
+        token = secrets.token_hex(4)
+        size, _ = Size.objects.get_or_create(title="BM")
+        products = Product.objects.bulk_create([
+            Product(title=f"bench-{token}-{index}", slug=f"bench-{token}-{index}",
+                    price=Decimal(1000 + index * 37) / 100, percentage_off=(index * 7) % 60, inventory=1000)
+            for index in range(count)
+        ])
+        SizeInventory.objects.bulk_create([
+            SizeInventory(product=product, size=size, quantity=1000) for product in products[::2]
+        ])
+        return products
+
+    @staticmethod
+    def make_cart(products):
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, size="BM" if index % 2 == 0 else None,
+                     quantity=index % 3 + 1, extra_price=0)
+            for index, product in enumerate(products)
+        ])
+        return cart
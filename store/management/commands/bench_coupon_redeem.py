@@ -0,0 +1,102 @@
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from store import coupons
+from store.models import CouponCode, CouponRedemption, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires parallel redemptions of one coupon code and fails if its usage limit is ever exceeded "
+        "or a use is lost; also times cached against uncached validity checks. Runs against the "
+        "configured database and cleans up after itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--redemptions", type=int, default=500, help="Number of competing orders")
+        parser.add_argument("--workers", type=int, default=32, help="Number of parallel threads")
+        parser.add_argument("--max-uses", type=int, default=200, help="Usage limit of the coupon")
+        parser.add_argument("--validations", type=int, default=2000, help="Validity checks to time")
+        parser.add_argument("--retries", type=int, default=5, help="Retries when the database is locked")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows")
+
+    def handle(self, *args, **options):
+        coupon = CouponCode.objects.create(price=Decimal("5.00"), max_uses=options["max_uses"],
+                                           expiry_date=timezone.now() + timedelta(hours=1))
+        orders = Order.objects.bulk_create([
+            Order(total_price=Decimal("20.00"), transaction_ref=secrets.token_hex(16))
+            for _index in range(options["redemptions"])
+        ])
+        try:
+            self.time_validations(coupon.code, options["validations"])
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                outcomes = list(executor.map(lambda order: self.redeem(coupon.code, order, options["retries"]),
+                                             orders))
+            elapsed = time.perf_counter() - started
+            self.report(coupon, outcomes, elapsed, options)
+        finally:
+            if not options["keep"]:
+                CouponRedemption.objects.filter(coupon=coupon).delete()
+                Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+                coupon.delete()
+
+    def time_validations(self, code, count):
+        started = time.perf_counter()
+        for _index in range(count):
+            coupons.snapshot(code)
+        uncached = (time.perf_counter() - started) / count
+        coupons.coupon_cache.delete(coupons.coupon_cache.make_key(code))
+        started = time.perf_counter()
+        for _index in range(count):
+            coupons.validate(code.lower())
+        cached = (time.perf_counter() - started) / count
+        self.stdout.write(f"validity check: {uncached * 1e6:.0f}us from the database, "
+                          f"{cached * 1e6:.1f}us from the cache ({uncached / cached:.0f}x)")
+
+    @staticmethod
+    def redeem(code, order, retries):
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    # validity from the cache, the use itself in the order's transaction, like place_order
+                    coupon = coupons.validate(code)
+                    with transaction.atomic():
+                        coupons.redeem(coupon, order, coupon["price"])
+                    return "redeemed"
+                except ValidationError:
+                    return "rejected"
+                except OperationalError:
+                    # SQLite only allows one writer; the failed transaction was rolled back
+                    if attempt == retries:
+                        return "error"
+                    time.sleep(0.01 * 2 ** attempt)
+        finally:
+            connection.close()
+
+    def report(self, coupon, outcomes, elapsed, options):
+        redeemed = outcomes.count("redeemed")
+        rejected = outcomes.count("rejected")
+        errors = outcomes.count("error")
+        coupon.refresh_from_db()
+        ledger = CouponRedemption.objects.filter(coupon=coupon).count()
+
+        self.stdout.write(
+            f"{connection.vendor}: {len(outcomes)} redemptions on {options['workers']} workers in {elapsed:.2f}s "
+            f"({len(outcomes) / elapsed:.0f}/s) -> {redeemed} redeemed, {rejected} rejected, {errors} errors"
+        )
+        self.stdout.write(f"limit {options['max_uses']} -> times used {coupon.times_used}, ledger rows {ledger}")
+
+        if coupon.times_used > options["max_uses"] or coupon.times_used != redeemed or ledger != redeemed:
+            raise CommandError("Coupon usage is inconsistent: the limit was exceeded or a use was lost.")
+        if errors == 0 and redeemed != min(len(outcomes), options["max_uses"]):
+            raise CommandError("Redemptions were rejected while uses were still available.")
+        self.stdout.write(self.style.SUCCESS("No lost updates, limit held."))
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from store.benchmarks import DATASET_DEFAULTS, SCENARIOS_BY_NAME, compare, generate_data, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the product list, product detail, category list, cart totals and checkout endpoints "
+            "on generated data in a throwaway test database, optionally failing on regressions against a baseline")
+
+    def add_arguments(self, parser):
+        for name, default in DATASET_DEFAULTS.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+        parser.add_argument("--iterations", type=int, default=200, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario")
+        parser.add_argument("--rounds", type=int, default=3, help="Runs per scenario; the median is reported")
+        parser.add_argument("--scenarios", help=f"Comma separated subset of {', '.join(SCENARIOS_BY_NAME)}")
+        parser.add_argument("--output", help="Write the results as JSON to this file (e.g. to save a baseline)")
+        parser.add_argument("--baseline", help="Compare against the results saved in this file")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed latency and throughput drift against the baseline (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        scenarios = options["scenarios"].split(",") if options["scenarios"] else None
+        unknown = set(scenarios or ()) - set(SCENARIOS_BY_NAME)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        setup_test_environment(debug=False)
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            dataset = generate_data(**{name: options[name] for name in DATASET_DEFAULTS})
+            results = run_benchmarks(dataset, scenarios, iterations=options["iterations"], warmup=options["warmup"],
+                                     rounds=options["rounds"])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'scenario':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>8} {'errors':>7}")
+        for name, result in results["scenarios"].items():
+            self.stdout.write(f"{name:<24} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f} "
+                              f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries']:>8} "
+                              f"{result['errors']:>7}")
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        failed = [name for name, result in results["scenarios"].items() if result["errors"]]
+        if failed:
+            raise CommandError(f"Requests failed in: {', '.join(failed)}")
+        if baseline is not None:
+            regressions = compare(baseline, results, tolerance=options["tolerance"])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f"{name}: {metric} {before} -> {after}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
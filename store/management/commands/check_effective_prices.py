@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = ("Compares the stored Product.effective_price with the price computed in Python "
+            "(Product.get_effective_price) and optionally repairs the drifted rows")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--fix", action="store_true", help="Save the computed price on the drifted products")
+        parser.add_argument("--show", type=int, default=20, help="How many drifted products to list")
+
+    def handle(self, *args, **options):
+        drifted = []
+        products = Product.objects.only("id", "title", "price", "percentage_off", "effective_price")
+        for product in products.iterator(chunk_size=options["batch_size"]):
+            stored, expected = product.effective_price, product.get_effective_price()
+            if stored != expected:
+                product.effective_price = expected
+                drifted.append(product)
+                if len(drifted) <= options["show"]:
+                    self.stdout.write(f"{product.pk} {product.title}: stored {stored}, expected {expected}")
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Every stored effective price matches."))
+            return
+        if not options["fix"]:
+            raise CommandError(f"{len(drifted)} products have a drifted effective price; run with --fix to repair.")
+
+        with transaction.atomic():
+            Product.objects.bulk_update(drifted, ["effective_price"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} products were repaired."))
@@ -0,0 +1,89 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.api.choices import PAYMENT_PENDING
+from store.models import CartItem, Order, Product, ProductReview
+
+# The planner output that means "walks every row of the table". On SQLite a SCAN that
+# goes through an index only to honour ORDER BY is still a full scan unless it is LIMITed.
+SQLITE_FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def hot_path_queries():
+    """
+    The queries the store API runs on every request, as ``(label, queryset)`` pairs.
+    Placeholder ids are used since only the plan matters, not the rows.
+    """
+    now = timezone.now()
+    some_id = uuid.uuid4()
+    return [
+        ("product list", Product.objects.order_by("-created_date", "-id")[:31]),
+        ("product list (seek)", Product.objects.filter(created_date__lt=now).order_by("-created_date", "-id")[:31]),
+        ("product detail", Product.objects.filter(id=some_id)),
+        ("in stock by category",
+         Product.objects.filter(inventory__gt=0, category_id=some_id).order_by("-created_date")[:31]),
+        ("featured in stock",
+         Product.objects.filter(featured_product=True, inventory__gt=0).order_by("-created_date")[:31]),
+        ("active flash sales",
+         Product.objects.filter(percentage_off__gt=0, flash_sale_end_date__isnull=False,
+                                flash_sale_start_date__lte=now, flash_sale_end_date__gt=now)
+         .order_by("flash_sale_end_date")),
+        ("product reviews", ProductReview.objects.filter(product_id=some_id).order_by("-created_date")),
+        ("customer orders by status",
+         Order.objects.filter(customer_id=some_id, payment_status=PAYMENT_PENDING).order_by("-created_date")),
+        ("cart items", CartItem.objects.filter(cart_id=some_id)),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the store API hot path queries and fails if any of them does a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the full plan of every query")
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"EXPLAIN checks are not supported on {vendor}")
+
+        failures = []
+        for label, queryset in hot_path_queries():
+            plan = self.explain(queryset)
+            scanned = self.full_scans(plan, bounded=queryset.query.high_mark is not None)
+            if options["verbose_plans"]:
+                self.stdout.write(plan)
+            if scanned:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok         {label}"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot path queries regressed to a full table scan")
+
+    @staticmethod
+    def explain(queryset):
+        if connection.vendor != "postgresql":
+            return queryset.explain()
+        # On small tables Postgres prefers a seq scan even when an index fits,
+        # so ask whether the planner *can* use an index at all.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+
+    @staticmethod
+    def full_scans(plan, bounded=False):
+        if connection.vendor == "postgresql":
+            return sorted(set(POSTGRES_FULL_SCAN.findall(plan)))
+        scanned = set()
+        for line in plan.splitlines():
+            match = SQLITE_FULL_SCAN.search(line)
+            if match and not (bounded and "USING" in line):
+                scanned.add(match.group(1))
+        return sorted(scanned)
@@ -0,0 +1,53 @@
+import argparse
+import bz2
+import gzip
+import lzma
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store.export import CHUNK_SIZE, DATASETS, FORMATS, export_lines
+
+OPENERS = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+def iso_datetime(value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        # well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"'{value}' is not an ISO 8601 datetime")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Streams a catalog or order export to a compressed CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--compression", choices=sorted(OPENERS), default="gz")
+        parser.add_argument("--output", help="Defaults to <dataset>-<timestamp>.<format>.<compression>")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--updated-since", type=iso_datetime, help="Only rows changed since (ISO 8601)")
+
+    def handle(self, *args, **options):
+        dataset, file_format, compression = options["dataset"], options["format"], options["compression"]
+        output = options["output"] or f"{dataset}-{timezone.now():%Y%m%d%H%M%S}.{file_format}.{compression}"
+        updated_since = options["updated_since"]
+
+        started = time.perf_counter()
+        lines = 0
+        with OPENERS[compression](output, "wt", encoding="utf-8", newline="") as file:
+            for line in export_lines(dataset, file_format, updated_since=updated_since,
+                                     chunk_size=options["chunk_size"]):
+                file.write(line)
+                lines += 1
+        rows = lines - 1 if file_format == "csv" else lines
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} {dataset} to {output} in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)."))
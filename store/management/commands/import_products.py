@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Seller
+from store.importer import FORMATS, import_products
+
+
+class Command(BaseCommand):
+    help = "Imports products with their sizes, colours and images from a CSV or JSON lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON lines file")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--seller", help="Email of the seller the products belong to")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--create-missing", action="store_true", help="Create unknown categories and sizes")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without saving")
+
+    def handle(self, *args, **options):
+        seller = None
+        if options["seller"]:
+            seller = Seller.objects.filter(user__email=options["seller"]).first()
+            if seller is None:
+                raise CommandError(f"No seller with the email {options['seller']}")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as file:
+            report = import_products(file, options["format"], seller=seller, batch_size=options["batch_size"],
+                                     create_missing=options["create_missing"], dry_run=options["dry_run"])
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.created} of {report.rows} rows imported ({len(report.errors)} failed) "
+            f"in {report.elapsed:.2f}s, {report.rows_per_second} rows/s."))
@@ -0,0 +1,99 @@
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from store.inventory import InsufficientStock, reserve_cart
+from store.models import Cart, CartItem, InventoryReservation, Product, Size, SizeInventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires parallel checkouts at a single product and fails if stock is ever oversold. "
+        "Runs against the configured database (SQLite or Postgres) and cleans up after itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checkouts", type=int, default=300, help="Number of competing carts")
+        parser.add_argument("--workers", type=int, default=32, help="Number of parallel threads")
+        parser.add_argument("--stock", type=int, default=100, help="Units of stock to fight over")
+        parser.add_argument("--quantity", type=int, default=1, help="Units each cart wants")
+        parser.add_argument("--retries", type=int, default=5, help="Retries when the database is locked")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows")
+
+    def handle(self, *args, **options):
+        product, carts = self.setup(options)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                outcomes = list(executor.map(lambda cart: self.checkout(cart, options["retries"]), carts))
+            elapsed = time.perf_counter() - started
+            self.report(product, outcomes, elapsed, options)
+        finally:
+            if not options["keep"]:
+                Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+                product.delete()
+
+    @staticmethod
+    def setup(options):
+        token = secrets.token_hex(4)
+        size, _ = Size.objects.get_or_create(title="LT")
+        product = Product.objects.create(title=f"loadtest-{token}", price=10, inventory=options["stock"])
+        SizeInventory.objects.create(product=product, size=size, quantity=options["stock"])
+
+        carts = Cart.objects.bulk_create([Cart() for _ in range(options["checkouts"])])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, size=size.title, quantity=options["quantity"], extra_price=0)
+            for cart in carts
+        ])
+        return product, carts
+
+    @staticmethod
+    def checkout(cart, retries):
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    reserve_cart(cart)
+                    return "reserved"
+                except InsufficientStock:
+                    return "sold_out"
+                except OperationalError:
+                    # SQLite only allows one writer; the failed transaction was rolled back
+                    if attempt == retries:
+                        return "error"
+                    time.sleep(0.01 * 2 ** attempt)
+        finally:
+            connection.close()
+
+    def report(self, product, outcomes, elapsed, options):
+        reserved = outcomes.count("reserved")
+        sold_out = outcomes.count("sold_out")
+        errors = outcomes.count("error")
+
+        product.refresh_from_db()
+        variant_left = SizeInventory.objects.get(product=product).quantity
+        held = InventoryReservation.objects.filter(product=product).aggregate(total=Sum("quantity"))["total"] or 0
+        taken = reserved * options["quantity"]
+
+        self.stdout.write(
+            f"{connection.vendor}: {len(outcomes)} checkouts on {options['workers']} workers in {elapsed:.2f}s "
+            f"({len(outcomes) / elapsed:.0f}/s) -> {reserved} reserved, {sold_out} sold out, {errors} errors"
+        )
+        self.stdout.write(f"stock {options['stock']} -> product {product.inventory}, variant {variant_left}, "
+                          f"reserved units {held}")
+
+        oversold = (
+            product.inventory < 0 or variant_left < 0
+            or taken > options["stock"]
+            or product.inventory != options["stock"] - taken
+            or variant_left != options["stock"] - taken
+            or held != taken
+        )
+        if oversold:
+            raise CommandError("Stock accounting is inconsistent: inventory was oversold or lost.")
+        if errors == 0 and reserved != min(len(outcomes), options["stock"] // options["quantity"]):
+            raise CommandError("Checkouts were rejected while stock was still available.")
+        self.stdout.write(self.style.SUCCESS("No oversell."))
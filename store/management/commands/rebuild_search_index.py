@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Product
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text product search index in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            backend.clear()
+        indexed, batch = 0, []
+        for product_id in Product.objects.order_by().values_list("id", flat=True).iterator(chunk_size=batch_size):
+            batch.append(product_id)
+            if len(batch) == batch_size:
+                indexed += self.index(backend, batch)
+                batch = []
+        if batch:
+            indexed += self.index(backend, batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} products with {type(backend).__name__} in {elapsed:.2f}s."))
+
+    @staticmethod
+    def index(backend, product_ids):
+        with transaction.atomic():
+            backend.index(product_ids)
+        return len(product_ids)
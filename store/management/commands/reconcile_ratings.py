@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Product
+
+RATING_FIELDS = Product.RATING_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored product rating aggregates from the product reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Report drifted products without saving")
+
+    def handle(self, *args, **options):
+        aggregates = Product.rating_aggregates()
+        empty = dict.fromkeys(RATING_FIELDS, 0)
+
+        drifted = []
+        for product in Product.objects.only("id", *RATING_FIELDS).iterator(chunk_size=options["batch_size"]):
+            expected = aggregates.get(product.id, empty)
+            if any(getattr(product, field) != value for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(product, field, value)
+                drifted.append(product)
+
+        if not options["dry_run"]:
+            with transaction.atomic():
+                Product.objects.bulk_update(drifted, RATING_FIELDS, batch_size=options["batch_size"])
+
+        action = "would be" if options["dry_run"] else "were"
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} products {action} reconciled."))
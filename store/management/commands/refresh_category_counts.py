@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from store.categories import rebuild_paths, refresh_category_counts
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored in-stock product counts of every category, and optionally the category paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild-paths", action="store_true",
+                            help="Also recompute the materialized paths from the parent links")
+
+    def handle(self, *args, **options):
+        if options["rebuild_paths"]:
+            self.stdout.write(f"Rebuilt the paths of {rebuild_paths()} categories.")
+        self.stdout.write(self.style.SUCCESS(f"Updated the counts of {refresh_category_counts()} categories."))
@@ -0,0 +1,108 @@
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from common.models import BaseModel
+from common.uuids import uuid7
+from core.models import User
+from store.categories import rebuild_paths
+from store.facets import is_materialized, refresh_facet_counts
+from store.search import get_search_backend
+
+
+def time_field(model):
+    return "date_joined" if model is User else "created_date"
+
+
+def references(model):
+    """
+    ``(model, foreign key)`` of every column pointing at ``model``'s primary key,
+    including the hidden ones of auto-created many-to-many tables.
+    """
+    return [(relation.related_model, relation.field) for relation in model._meta.get_fields(include_hidden=True)
+            if relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)
+            and relation.field.concrete and relation.field.target_field.primary_key]
+
+
+def remap(column, pairs):
+    return Case(*[When(**{column: old}, then=Value(new)) for old, new in pairs], output_field=models.UUIDField())
+
+
+class Command(BaseCommand):
+    help = ("Replaces the random (version 4) primary keys of existing rows with time-ordered version 7 keys "
+            "stamped with the row's creation time, rewriting every foreign key that points at them")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", help="Comma separated app_label.Model names (default: every BaseModel)")
+        parser.add_argument("--users", action="store_true",
+                            help="Also rekey core.User; issued tokens and one-time codes stop working")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be rekeyed")
+
+    def handle(self, *args, **options):
+        targets = self.target_models(options)
+        rekeyed = {}
+        for model in targets:
+            started = time.perf_counter()
+            count = self.rekey(model, options["batch_size"], options["dry_run"])
+            rekeyed[model] = count
+            verb = "Would rekey" if options["dry_run"] else "Rekeyed"
+            self.stdout.write(f"{verb} {count} {model._meta.label} rows in {time.perf_counter() - started:.2f}s")
+        if options["dry_run"] or not any(rekeyed.values()):
+            return
+
+        # ids are also kept outside the foreign keys: in paths, indexes and caches
+        store_category = apps.get_model("store", "Category")
+        if rekeyed.get(store_category):
+            rebuild_paths()
+            if is_materialized():
+                refresh_facet_counts({"category"})
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            "Done. Restart the app servers so no process keeps the old ids in memory (slug map, local caches)."))
+
+    @staticmethod
+    def target_models(options):
+        if options["models"]:
+            try:
+                return [apps.get_model(label) for label in options["models"].split(",")]
+            except (LookupError, ValueError) as error:
+                raise CommandError(error)
+        targets = [model for model in apps.get_models() if issubclass(model, BaseModel)]
+        if options["users"]:
+            targets.append(User)
+        return targets
+
+    @staticmethod
+    def rekey(model, batch_size, dry_run):
+        field = time_field(model)
+        pairs = [(pk, uuid7(created)) for pk, created in
+                 model._base_manager.order_by(field, "pk").values_list("pk", field).iterator(chunk_size=2000)
+                 if pk.version != 7]
+        if dry_run:
+            return len(pairs)
+
+        pk_column = model._meta.pk.attname
+        columns = references(model)
+        # the search table references the product ids too (a real foreign key on Postgres),
+        # but outside the models, so references() does not find it
+        search = get_search_backend() if model is apps.get_model("store", "Product") else None
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            old_keys = [old for old, _new in batch]
+            # foreign keys are checked at commit, so the keys and the references can move in any order
+            with transaction.atomic():
+                if search is not None:
+                    search.remove(old_keys)
+                model._base_manager.filter(pk__in=old_keys).update(**{pk_column: remap(pk_column, batch)})
+                for related_model, foreign_key in columns:
+                    column = foreign_key.attname
+                    related_model._base_manager.filter(**{f"{column}__in": old_keys}).update(
+                        **{column: remap(column, batch)})
+                if search is not None:
+                    search.index([new for _old, new in batch])
+        return len(pairs)
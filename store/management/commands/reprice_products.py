@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from rest_framework.exceptions import ValidationError
+
+from store.facets import filter_products
+from store.repricing import RULES, apply_plan, plan_repricing
+
+CHANGE_FIELDS = ("price", "percentage_off", "shipping_fee", "effective_price")
+
+
+class Command(BaseCommand):
+    help = ("Reprices a selection of products with a pipeline of rules (see store.repricing), "
+            "previewing the changes unless --apply is given")
+
+    def add_arguments(self, parser):
+        parser.add_argument("rules", help=f"e.g. 'markup:5,round:0.05,charm:99'; rules: {', '.join(RULES)}")
+        parser.add_argument("--filter", default="",
+                            help="Product list filters as a query string, e.g. 'category_tree=<id>&max_price=50'")
+        parser.add_argument("--apply", action="store_true", help="Write the new prices")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Products per UPDATE")
+        parser.add_argument("--show", type=int, default=20, help="How many changed products to list")
+
+    def handle(self, *args, **options):
+        try:
+            queryset = filter_products(QueryDict(options["filter"]))
+            started = time.perf_counter()
+            plan = plan_repricing(queryset, options["rules"])
+        except (ValueError, ValidationError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+
+        for change in plan.changes(limit=options["show"]):
+            self.stdout.write(f"{change['id']} {change['title']}: " + ", ".join(
+                f"{field} {change[field][0]} -> {change[field][1]}" for field in CHANGE_FIELDS
+                if change[field][0] != change[field][1]))
+        summary = plan.summary()
+        self.stdout.write(
+            f"{summary['changed']} of {summary['selected']} products change, planned in {elapsed:.2f}s; "
+            f"their effective prices add up to {summary['effective_before']} -> {summary['effective_after']}.")
+
+        if not options["apply"]:
+            self.stdout.write("Preview only, run with --apply to write the new prices.")
+            return
+        started = time.perf_counter()
+        updated = apply_plan(plan, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} products were repriced in {time.perf_counter() - started:.2f}s."))
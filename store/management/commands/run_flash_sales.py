@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.flash_sales import flash_sale_option, run_scheduler
+
+
+class Command(BaseCommand):
+    help = "Warms, starts and ends the scheduled flash sales as their boundaries come up"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the schedule once and exit")
+        parser.add_argument("--interval", type=float, default=None, help="Seconds between runs")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] if options["interval"] is not None else flash_sale_option("INTERVAL")
+        while True:
+            counts = run_scheduler()
+            if any(counts.values()):
+                self.stdout.write(", ".join(f"{count} {step}" for step, count in counts.items()) + ".")
+            if options["once"]:
+                return
+            time.sleep(interval)
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_alter_cart_options_alter_product_price"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="cart",
+            options={"verbose_name_plural": "Carts"},
+        ),
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(
+                fields=["customer", "-created_date"], name="cart_customer_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(
+                fields=["cart", "product"], name="cartitem_cart_product_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "payment_status", "-created_date"],
+                name="order_customer_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["payment_status", "shipping_status", "-created_date"],
+                name="order_status_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-created_date", "-id"], name="product_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("inventory__gt", 0)),
+                fields=["category", "-created_date"],
+                name="product_instock_category_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("featured_product", True), ("inventory__gt", 0)),
+                fields=["-created_date"],
+                name="product_featured_instock_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(
+                    ("flash_sale_end_date__isnull", False), ("percentage_off__gt", 0)
+                ),
+                fields=["flash_sale_end_date", "flash_sale_start_date"],
+                name="product_flash_sale_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productreview",
+            index=models.Index(
+                fields=["product", "-created_date"], name="review_product_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:35
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    ProductReview = apps.get_model("store", "ProductReview")
+
+    aggregates = {}
+    rows = (
+        ProductReview.objects.filter(ratings__isnull=False)
+        .order_by()
+        .values_list("product_id", "ratings")
+        .annotate(total=Count("id"))
+    )
+    for product_id, rating, total in rows:
+        values = aggregates.setdefault(product_id, {"rating_count": 0, "rating_sum": 0})
+        values["rating_count"] += total
+        values["rating_sum"] += rating * total
+        values[f"rating_{rating}_count"] = total
+
+    for product_id, values in aggregates.items():
+        Product.objects.filter(pk=product_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_catalog_order_cart_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="1 Star Ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="2 Star Ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="3 Star Ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="4 Star Ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="5 Star Ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text=" This holds the number of rated reviews of the product",
+                verbose_name="Rating Count",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text=" This holds the sum of all the review ratings of the product",
+                verbose_name="Rating Sum",
+            ),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:36
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryReservation",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "size",
+                    models.CharField(
+                        blank=True,
+                        help_text="This holds the size variant whose stock is reserved",
+                        max_length=20,
+                        null=True,
+                        verbose_name="Size",
+                    ),
+                ),
+                (
+                    "colour",
+                    models.CharField(
+                        blank=True,
+                        help_text="This holds the colour variant whose stock is reserved",
+                        max_length=20,
+                        null=True,
+                        verbose_name="Colour",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(
+                        help_text="This holds the reserved quantity",
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="Quantity",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("H", "Held"), ("C", "Committed"), ("R", "Released")],
+                        default="H",
+                        help_text="This holds the state of the reservation",
+                        max_length=1,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        help_text="This holds the time a held reservation is released if the order is not paid",
+                        verbose_name="Expires At",
+                    ),
+                ),
+                (
+                    "cart",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="This holds the cart the stock was reserved from",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="reservations",
+                        to="store.cart",
+                        verbose_name="Cart",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="This holds the order the stock is reserved for",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="store.order",
+                        verbose_name="Order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        help_text="This holds the product whose stock is reserved",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="store.product",
+                        verbose_name="Product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_date",),
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="reservation_status_expiry_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_inventoryreservation"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="total_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                help_text="This holds the total price of the products orderd by the customer",
+                max_digits=12,
+                null=True,
+                verbose_name="Total Price",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                help_text="This holds the unit price of the order item that was placed",
+                max_digits=10,
+                verbose_name="Unit Price",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS store_product_search USING fts5(
+        product_id UNINDEXED, title, description, style, category,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO store_product_search (product_id, title, description, style, category)
+    SELECT p.id, coalesce(p.title, ''), coalesce(p.description, ''), coalesce(p.style, ''), coalesce(c.name, '')
+    FROM store_product p LEFT JOIN store_category c ON c.id = p.category_id
+    """,
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE IF NOT EXISTS store_product_search (
+        product_id uuid PRIMARY KEY REFERENCES store_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS store_product_search_document_idx ON store_product_search USING GIN (document)",
+    """
+    INSERT INTO store_product_search (product_id, document)
+    SELECT p.id,
+        setweight(to_tsvector('english', coalesce(p.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(c.name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(p.style, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(p.description, '')), 'D')
+    FROM store_product p LEFT JOIN store_category c ON c.id = p.category_id
+    ON CONFLICT (product_id) DO NOTHING
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_widen_order_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:48
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_product_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FacetCount",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "facet",
+                    models.CharField(
+                        help_text="This holds the name of the facet, e.g. size or category",
+                        max_length=20,
+                        verbose_name="Facet",
+                    ),
+                ),
+                (
+                    "value",
+                    models.CharField(
+                        help_text="This holds the filter value of the facet bucket",
+                        max_length=64,
+                        verbose_name="Value",
+                    ),
+                ),
+                (
+                    "label",
+                    models.CharField(
+                        blank=True,
+                        help_text="This holds the display name of the facet bucket",
+                        max_length=255,
+                        verbose_name="Label",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="This holds the number of catalog products in the facet bucket",
+                        verbose_name="Count",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_date",),
+                "abstract": False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="facetcount",
+            constraint=models.UniqueConstraint(
+                fields=("facet", "value"), name="facetcount_facet_value_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:56
+
+from django.db import migrations
+import store.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_facetcount"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="slug",
+            field=store.fields.BulkAutoSlugField(
+                always_update=True,
+                editable=False,
+                help_text=" This holds the slug of the product",
+                null=True,
+                populate_from="title",
+                unique=True,
+                verbose_name="Slug",
+            ),
+        ),
+    ]
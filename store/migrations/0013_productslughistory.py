@@ -0,0 +1,55 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0012_bulk_slug_field"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSlugHistory",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "slug",
+                    models.SlugField(
+                        help_text="This holds a previous slug of the product, redirected to its current slug",
+                        unique=True,
+                        verbose_name="Slug",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        help_text="This holds the product the slug used to point to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slug_history",
+                        to="store.product",
+                        verbose_name="Product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product Slug History",
+                "ordering": ("-created_date",),
+                "abstract": False,
+            },
+        ),
+    ]
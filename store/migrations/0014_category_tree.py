@@ -0,0 +1,93 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def backfill_category_tree(apps, schema_editor):
+    # every existing category is a top level one: its path is its own id
+    Category = apps.get_model("store", "Category")
+    Product = apps.get_model("store", "Product")
+
+    counts = dict(
+        Product.objects.filter(inventory__gt=0, category__isnull=False)
+        .order_by()
+        .values_list("category_id")
+        .annotate(total=Count("id"))
+    )
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = f"{category.pk.hex}/"
+        category.product_count = category.tree_product_count = counts.get(
+            category.pk, 0
+        )
+    Category.objects.bulk_update(
+        categories, ["path", "product_count", "tree_product_count"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0013_productslughistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                editable=False,
+                help_text="This holds how deep the category is nested, 0 for a top level category",
+                verbose_name="Depth",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="This holds the category this category is nested under",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="store.category",
+                verbose_name="Parent Category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="This holds the ids of the category and its ancestors",
+                max_length=255,
+                verbose_name="Path",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.IntegerField(
+                default=0,
+                editable=False,
+                help_text="This holds the number of in stock products of the category itself",
+                verbose_name="Product Count",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="tree_product_count",
+            field=models.IntegerField(
+                default=0,
+                editable=False,
+                help_text="This holds the number of in stock products of the category and its subcategories",
+                verbose_name="Tree Product Count",
+            ),
+        ),
+        migrations.RunPython(backfill_category_tree, migrations.RunPython.noop),
+    ]
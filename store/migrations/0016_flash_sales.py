@@ -0,0 +1,221 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:24
+
+import common.uuids
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0015_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlashSale",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=common.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "title",
+                    models.CharField(
+                        help_text="This holds the name of the flash sale",
+                        max_length=255,
+                        verbose_name="Title",
+                    ),
+                ),
+                (
+                    "percentage_off",
+                    models.PositiveIntegerField(
+                        help_text="This holds the percentage the products are sold off during the sale",
+                        validators=[
+                            django.core.validators.MinValueValidator(1),
+                            django.core.validators.MaxValueValidator(99),
+                        ],
+                        verbose_name="Percentage Off",
+                    ),
+                ),
+                (
+                    "starts_at",
+                    models.DateTimeField(
+                        help_text="This holds when the sale prices go live",
+                        verbose_name="Starts At",
+                    ),
+                ),
+                (
+                    "ends_at",
+                    models.DateTimeField(
+                        help_text="This holds when the regular prices come back",
+                        verbose_name="Ends At",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("S", "Scheduled"),
+                            ("A", "Active"),
+                            ("E", "Ended"),
+                            ("C", "Cancelled"),
+                        ],
+                        default="S",
+                        editable=False,
+                        help_text="This holds where the sale is in its schedule, moved on by the run_flash_sales command",
+                        max_length=1,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "warmed_at",
+                    models.DateTimeField(
+                        blank=True,
+                        editable=False,
+                        help_text="This holds when the sale prices were computed and the product caches pre-warmed",
+                        null=True,
+                        verbose_name="Warmed At",
+                    ),
+                ),
+                (
+                    "products",
+                    models.ManyToManyField(
+                        blank=True,
+                        help_text="This holds the products on sale",
+                        related_name="flash_sales",
+                        to="store.product",
+                        verbose_name="Products",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_date",),
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="FlashSalePrice",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=common.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "size",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="This holds the size of the variant",
+                        max_length=20,
+                        verbose_name="Size",
+                    ),
+                ),
+                (
+                    "colour",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="This holds the colour of the variant",
+                        max_length=20,
+                        verbose_name="Colour",
+                    ),
+                ),
+                (
+                    "regular_price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="This holds the price of the variant outside the sale",
+                        max_digits=8,
+                        verbose_name="Regular Price",
+                    ),
+                ),
+                (
+                    "sale_price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="This holds the price of the variant during the sale",
+                        max_digits=8,
+                        verbose_name="Sale Price",
+                    ),
+                ),
+                (
+                    "regular_percentage_off",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="This holds the product's own percentage off, put back when the sale ends",
+                        null=True,
+                        verbose_name="Regular Percentage Off",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        help_text="This holds the product the price belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flash_sale_prices",
+                        to="store.product",
+                        verbose_name="Product",
+                    ),
+                ),
+                (
+                    "sale",
+                    models.ForeignKey(
+                        help_text="This holds the sale the price belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prices",
+                        to="store.flashsale",
+                        verbose_name="Flash Sale",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_date",),
+                "abstract": False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="flashsaleprice",
+            constraint=models.UniqueConstraint(
+                fields=("sale", "product", "size", "colour"),
+                name="flashsaleprice_variant_uniq",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashsale",
+            index=models.Index(
+                fields=["status", "starts_at"], name="flashsale_status_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashsale",
+            index=models.Index(
+                fields=["status", "ends_at"], name="flashsale_status_end_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="flashsale",
+            constraint=models.CheckConstraint(
+                check=models.Q(("ends_at__gt", models.F("starts_at"))),
+                name="flashsale_window_check",
+                violation_error_message="The sale must end after it starts.",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+from store.pricing import effective_price
+
+
+def backfill_effective_price(apps, schema_editor):
+    # one UPDATE, with the SQL version of Product.get_effective_price
+    Product = apps.get_model("store", "Product")
+    Product.objects.update(effective_price=effective_price())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_flash_sales"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                editable=False,
+                help_text=" This holds the price of the product after its percentage off",
+                max_digits=8,
+                verbose_name="Effective Price",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["effective_price", "id"], name="product_effective_price_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:32
+
+import common.uuids
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_uuid7_primary_keys"),
+        ("store", "0017_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CouponRedemption",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=common.uuids.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="This holds how much the coupon took off the order",
+                        max_digits=8,
+                        verbose_name="Amount",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_date",),
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="couponcode",
+            name="max_uses",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text=" This holds how many orders can use the code, blank for no limit",
+                null=True,
+                verbose_name="Max Uses",
+            ),
+        ),
+        migrations.AddField(
+            model_name="couponcode",
+            name="times_used",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text=" This holds how many orders have used the code",
+                verbose_name="Times Used",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="couponcode",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    ("max_uses__isnull", True),
+                    ("times_used__lte", models.F("max_uses")),
+                    _connector="OR",
+                ),
+                name="couponcode_usage_within_limit",
+            ),
+        ),
+        migrations.AddField(
+            model_name="couponredemption",
+            name="coupon",
+            field=models.ForeignKey(
+                help_text="This holds the coupon code that was used",
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="redemptions",
+                to="store.couponcode",
+                verbose_name="Coupon Code",
+            ),
+        ),
+        migrations.AddField(
+            model_name="couponredemption",
+            name="customer",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="This holds the customer who used the coupon",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="coupon_redemptions",
+                to="core.customer",
+                verbose_name="Customer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="couponredemption",
+            name="order",
+            field=models.OneToOneField(
+                help_text="This holds the order the coupon was used on",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="coupon_redemption",
+                to="store.order",
+                verbose_name="Order",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="couponredemption",
+            index=models.Index(
+                fields=["coupon", "-created_date"], name="couponredemption_coupon_idx"
+            ),
+        ),
+    ]
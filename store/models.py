@@ -1,18 +1,22 @@
 import secrets
+import uuid
+from collections import defaultdict
 
-from autoslug import AutoSlugField
-from django.core.validators import MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.db import models
-from django.db.models import Avg
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
-from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
 
 from common.models import BaseModel
 from core.models import Customer, Seller
 from core.validators import validate_phone_number
-from store.api.choices import PAYMENT_PENDING, PAYMENT_STATUS, RATING_CHOICES, SHIPPING_STATUS_CHOICES, SHIPPING_STATUS_PENDING
+from store.api.choices import (FLASH_SALE_SCHEDULED, FLASH_SALE_STATUS_CHOICES, PAYMENT_PENDING, PAYMENT_STATUS, RATING_CHOICES, RESERVATION_HELD,
+                               RESERVATION_STATUS_CHOICES, SHIPPING_STATUS_CHOICES, SHIPPING_STATUS_PENDING)
+from store.fields import BulkAutoSlugField
+from store.pricing import CENT, cents, effective_price, integer, to_money, unit_price_cents
 from store.validators import validate_image_size
 
 
@@ -23,10 +27,95 @@ class Category(BaseModel):
         verbose_name = _("Category Name"),
         help_text =_("This holds the name of the category")
         )
+    
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE,
+        null=True, blank=True, related_name="children",
+        verbose_name = _("Parent Category"),
+        help_text = _("This holds the category this category is nested under")
+        )
+    
+    # materialized path: the hex ids of the ancestors and of the category itself, each
+    # followed by "/", so a subtree is one indexed range of paths (see subtree_q)
+    path = models.CharField(
+        max_length=255, editable=False, db_index=True, default="",
+        verbose_name = _("Path"),
+        help_text = _("This holds the ids of the category and its ancestors")
+        )
+    
+    depth = models.PositiveSmallIntegerField(
+        default=0, editable=False,
+        verbose_name = _("Depth"),
+        help_text = _("This holds how deep the category is nested, 0 for a top level category")
+        )
+    
+    product_count = models.IntegerField(
+        default=0, editable=False,
+        verbose_name = _("Product Count"),
+        help_text = _("This holds the number of in stock products of the category itself")
+        )
+    
+    tree_product_count = models.IntegerField(
+        default=0, editable=False,
+        verbose_name = _("Tree Product Count"),
+        help_text = _("This holds the number of in stock products of the category and its subcategories")
+        )
+
+    COUNT_FIELDS = ("product_count", "tree_product_count")
+    SEGMENT_LENGTH = 33
+    MAX_DEPTH = 255 // SEGMENT_LENGTH - 1
 
     def __str__(self):
         return str(self.name)
 
+    @staticmethod
+    def subtree_q(path, prefix=""):
+        """
+        Matches the categories under ``path`` (itself included). The path alphabet is hex
+        digits and "/", and "0" sorts right after "/", so the subtree is the range
+        ``[path, path[:-1] + "0")``: a plain B-tree range scan on any database.
+        """
+        return Q(**{f"{prefix}path__gte": path, f"{prefix}path__lt": path[:-1] + "0"})
+
+    @staticmethod
+    def path_ids(path):
+        """
+        The ids in ``path``: the ancestors, root first, then the category itself.
+        """
+        return [uuid.UUID(segment) for segment in path.split("/") if segment]
+
+    def save(self, *args, **kwargs):
+        self._moved = False
+        previous = parent = None
+        if not self._state.adding:
+            previous = Category.objects.filter(pk=self.pk).values_list("path", "depth").first()
+        if self.parent_id:
+            parent = Category.objects.filter(pk=self.parent_id).values_list("path", "depth").first()
+        if parent is not None and previous is not None and parent[0].startswith(previous[0]):
+            raise ValidationError({"parent": "A category cannot be nested under itself or its subcategories."})
+        if parent is not None and parent[1] >= self.MAX_DEPTH:
+            raise ValidationError({"parent": f"Categories can only be nested {self.MAX_DEPTH} levels deep."})
+
+        self.path = (parent[0] if parent else "") + f"{self.pk.hex}/"
+        self.depth = parent[1] + 1 if parent else 0
+        fields = kwargs.get("update_fields")
+        if fields is not None and "parent" in fields:
+            kwargs["update_fields"] = {*fields, "path", "depth"}
+        elif fields is None and previous is not None:
+            # the counts are kept with UPDATEs (store.categories), never write back stale ones
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNT_FIELDS]
+
+        if previous is not None and previous[0] and previous[0] != self.path:
+            # moved: rewrite the paths of the old subtree in one UPDATE
+            old_path, old_depth = previous
+            Category.objects.filter(Category.subtree_q(old_path)).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr("path", len(old_path) + 1)),
+                depth=F("depth") + (self.depth - old_depth),
+            )
+            self._moved = True
+        super().save(*args, **kwargs)
+
 
 class Size(BaseModel):
     
@@ -61,13 +150,38 @@ class Colour(BaseModel):
         return f"{self.name} ---- {self.hex_code}"
 
 
-class ProductsManager(models.Manager):
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps ``Product.effective_price`` in step with ``price`` and ``percentage_off`` on
+    the bulk paths that skip ``Product.save()``.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for product in objs:
+            product.effective_price = product.get_effective_price()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if Product.PRICE_FIELDS & set(fields) and "effective_price" not in fields:
+            objs = list(objs)
+            for product in objs:
+                product.effective_price = product.get_effective_price()
+            fields = [*fields, "effective_price"]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if Product.PRICE_FIELDS & set(kwargs) and "effective_price" not in kwargs:
+            kwargs["effective_price"] = effective_price(kwargs.get("price"), kwargs.get("percentage_off"))
+        return super().update(**kwargs)
+
+
+class ProductsManager(models.Manager.from_queryset(ProductQuerySet)):
+    # in stock products only; what to load alongside them is decided per
+    # representation by ProductReadSerializer.setup_queryset
     def get_queryset(self):
         return super(ProductsManager,
-                     self).get_queryset().prefetch_related(
-                         'category', 'product_reviews',
-                        'size_inventory', 'color_inventory',
-                        'images').filter(inventory__gt=0)
+                     self).get_queryset().filter(inventory__gt=0)
 
 
 class Product(BaseModel):
@@ -87,7 +201,7 @@ class Product(BaseModel):
         help_text= _("This holds the title of the product")
         )
     
-    slug = AutoSlugField(
+    slug = BulkAutoSlugField(
         populate_from="title", 
         unique=True, always_update=True, 
         editable=False, null=True,
@@ -157,23 +271,143 @@ class Product(BaseModel):
         help_text= _(" This holds the flashsale end date of the product")
         )
     
+    # what a customer pays per unit (see get_effective_price), stored so the product list
+    # can sort and range-filter on it; Django 4.2 has no generated columns, so save() and
+    # ProductQuerySet keep it current
+    effective_price = models.DecimalField(
+        max_digits=8, decimal_places=2,
+        default=0, editable=False,
+        verbose_name= _("Effective Price"),
+        help_text= _(" This holds the price of the product after its percentage off")
+        )
+    
     featured_product = models.BooleanField(
         default=False,
         verbose_name= _("Featured Product"),
         help_text= _(" This holds the featured product")
         )
     
+    rating_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name= _("Rating Count"),
+        help_text= _(" This holds the number of rated reviews of the product")
+        )
+    
+    rating_sum = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name= _("Rating Sum"),
+        help_text= _(" This holds the sum of all the review ratings of the product")
+        )
+    
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("1 Star Ratings"))
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("2 Star Ratings"))
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("3 Star Ratings"))
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("4 Star Ratings"))
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("5 Star Ratings"))
     
-    objects = models.Manager()
+    objects = ProductQuerySet.as_manager()
     categorized = ProductsManager()
 
+    PRICE_FIELDS = frozenset({"price", "percentage_off"})
+    RATING_FIELDS = ["rating_count", "rating_sum"] + [f"rating_{rating}_count" for rating, _label in RATING_CHOICES]
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # keyset pagination on the product listing
+            models.Index(fields=["-created_date", "-id"], name="product_created_id_idx"),
+            # ProductsManager: in stock products of a category, newest first
+            models.Index(
+                fields=["category", "-created_date"],
+                condition=Q(inventory__gt=0),
+                name="product_instock_category_idx",
+            ),
+            models.Index(
+                fields=["-created_date"],
+                condition=Q(featured_product=True, inventory__gt=0),
+                name="product_featured_instock_idx",
+            ),
+            models.Index(
+                fields=["flash_sale_end_date", "flash_sale_start_date"],
+                condition=Q(percentage_off__gt=0, flash_sale_end_date__isnull=False),
+                name="product_flash_sale_idx",
+            ),
+            # price ordering and range filters, id breaks ties for the keyset cursor
+            models.Index(fields=["effective_price", "id"], name="product_effective_price_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} --- {self.category}"
 
-    @cached_property
+    @property
     def average_ratings(self):
-        result = self.product_reviews.aggregate(Avg("ratings"))
-        return result["ratings__avg"] or 0
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @property
+    def rating_histogram(self):
+        return {rating: getattr(self, f"rating_{rating}_count") for rating, _label in RATING_CHOICES}
+
+    @classmethod
+    def update_ratings(cls, product_id, rating, delta):
+        """
+        Adds (delta=1) or removes (delta=-1) a single review rating from the stored
+        aggregates with one UPDATE, so concurrent reviews never lose a write. A removal
+        the stored aggregates cannot take (they have drifted) recomputes the product's
+        aggregates from its reviews instead.
+        """
+        if product_id is None or rating is None:
+            return
+        products = cls.objects.filter(pk=product_id)
+        if delta < 0:
+            products = products.filter(rating_count__gte=-delta, rating_sum__gte=-delta * rating,
+                                       **{f"rating_{rating}_count__gte": -delta})
+        updated = products.update(
+            updated_date=timezone.now(),
+            rating_count=F("rating_count") + delta,
+            rating_sum=F("rating_sum") + delta * rating,
+            **{f"rating_{rating}_count": F(f"rating_{rating}_count") + delta},
+        )
+        if not updated and delta < 0:
+            cls.reconcile_ratings(product_id)
+
+    @classmethod
+    def rating_aggregates(cls, product_ids=None):
+        """
+        Returns ``{product_id: {field: value}}`` for the reviewed products (all of them
+        by default), computed from the reviews with a single ``GROUP BY product, rating``.
+        """
+        aggregates = defaultdict(lambda: dict.fromkeys(cls.RATING_FIELDS, 0))
+        reviews = ProductReview.objects.filter(ratings__isnull=False)
+        if product_ids is not None:
+            reviews = reviews.filter(product__in=product_ids)
+        for product_id, rating, total in reviews.order_by().values_list("product_id", "ratings").annotate(
+                total=Count("id")):
+            values = aggregates[product_id]
+            values["rating_count"] += total
+            values["rating_sum"] += rating * total
+            values[f"rating_{rating}_count"] = total
+        return aggregates
+
+    @classmethod
+    def reconcile_ratings(cls, *product_ids):
+        """
+        Overwrites the stored aggregates of ``product_ids`` with the ones computed from
+        their reviews.
+        """
+        aggregates = cls.rating_aggregates(product_ids)
+        empty = dict.fromkeys(cls.RATING_FIELDS, 0)
+        for product_id in product_ids:
+            cls.objects.filter(pk=product_id).update(updated_date=timezone.now(),
+                                                     **aggregates.get(product_id, empty))
+
+    @classmethod
+    def touch(cls, *product_ids):
+        """
+        Bumps ``updated_date`` without a full save, for changes to rows that hang off the
+        product (images, inventories, reviews) so conditional GETs see them.
+        """
+        cls.objects.filter(pk__in=[pk for pk in product_ids if pk is not None]).update(updated_date=timezone.now())
 
     @property
     def discount_price(self):
@@ -182,6 +416,44 @@ class Product(BaseModel):
             return round(discount, 2)
         return 0
 
+    def get_effective_price(self):
+        # what CartItem.total_price charges per unit before shipping and extras
+        discount_price = self.discount_price
+        return discount_price if discount_price > 0 else self.price
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.get_effective_price()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.PRICE_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "effective_price"}
+        elif update_fields is None and not self._state.adding:
+            # the ratings are kept with UPDATEs (ProductReview signals), never write back stale ones
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.RATING_FIELDS]
+        super().save(*args, **kwargs)
+
+
+
+class ProductSlugHistory(BaseModel):
+    
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE,
+        related_name="slug_history",
+        verbose_name= _("Product"),
+        help_text= _("This holds the product the slug used to point to")
+        )
+    
+    slug = models.SlugField(
+        max_length=50, unique=True,
+        verbose_name= _("Slug"),
+        help_text= _("This holds a previous slug of the product, redirected to its current slug")
+        )
+
+    class Meta(BaseModel.Meta):
+        verbose_name_plural = "Product Slug History"
+
+    def __str__(self):
+        return f"{self.slug} ---- {self.product_id}"
 
 
 class ColourInventory(models.Model):
@@ -309,6 +581,11 @@ class ProductReview(BaseModel):
         help_text= _(" This holds the descriptions of review the product has")
     )
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["product", "-created_date"], name="review_product_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.customer.user.full_name} --- {self.product.title} --- {self.ratings} stars"
 
@@ -361,6 +638,29 @@ class CouponCode(BaseModel):
         verbose_name= _("Expiry Date"),
         help_text= _(" This holds the expiry date of the code")
         )
+    
+    max_uses = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name= _("Max Uses"),
+        help_text= _(" This holds how many orders can use the code, blank for no limit")
+        )
+    
+    # only ever changed by the conditional UPDATEs in store.coupons.redeem/release
+    times_used = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name= _("Times Used"),
+        help_text= _(" This holds how many orders have used the code")
+        )
+
+    COUNT_FIELDS = ("times_used",)
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.CheckConstraint(
+                check=Q(max_uses__isnull=True) | Q(times_used__lte=F("max_uses")),
+                name="couponcode_usage_within_limit",
+            ),
+        ]
 
     def __str__(self):
         return self.code
@@ -368,13 +668,17 @@ class CouponCode(BaseModel):
     def save(self, *args, **kwargs):
         if not self.code:
             self.code = secrets.token_hex(4).upper()  # creates 8 letters
+        self.code = self.code.upper()
 
         if self.expiry_date and timezone.now() > self.expiry_date:
+            # ensure a new code's expiry date is in the future; an existing one just expires
+            if self._state.adding:
+                raise ValidationError('Expiry date must be in the future.')
             self.expired = True
-
-        # ensure expiry date is always in the future
-        if self.expiry_date < timezone.now():
-            raise ValidationError('Expiry date must be in the future.')
+        if kwargs.get("update_fields") is None and not self._state.adding:
+            # the usage counter is kept with UPDATEs (store.coupons), never write back a stale one
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNT_FIELDS]
         super().save(*args, **kwargs)
 
 
@@ -400,7 +704,7 @@ class Order(BaseModel):
         )
     
     total_price = models.DecimalField(
-        max_digits=6, decimal_places=2,
+        max_digits=12, decimal_places=2,
         null=True,
         verbose_name = _("Total Price"),
         help_text = _("This holds the total price of the products orderd by the customer")
@@ -428,6 +732,18 @@ class Order(BaseModel):
         help_text = _("This holds the Shipping status of the order placed by the customer")
         )
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["customer", "payment_status", "-created_date"],
+                name="order_customer_status_idx",
+            ),
+            models.Index(
+                fields=["payment_status", "shipping_status", "-created_date"],
+                name="order_status_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.transaction_ref} --- {self.placed_at}"
 
@@ -460,7 +776,7 @@ class OrderItem(BaseModel):
         )
     
     unit_price = models.DecimalField(
-        max_digits=6, decimal_places=2,
+        max_digits=10, decimal_places=2,
         verbose_name = _("Unit Price"),
         help_text = _("This holds the unit price of the order item that was placed")
         )
@@ -489,6 +805,44 @@ class OrderItem(BaseModel):
         )
 
 
+class CouponRedemption(BaseModel):
+    
+    coupon = models.ForeignKey(
+        CouponCode, on_delete=models.PROTECT,
+        related_name="redemptions",
+        verbose_name = _("Coupon Code"),
+        help_text = _("This holds the coupon code that was used")
+        )
+    
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE,
+        related_name="coupon_redemption",
+        verbose_name = _("Order"),
+        help_text = _("This holds the order the coupon was used on")
+        )
+    
+    customer = models.ForeignKey(
+        Customer, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="coupon_redemptions",
+        verbose_name = _("Customer"),
+        help_text = _("This holds the customer who used the coupon")
+        )
+    
+    amount = models.DecimalField(
+        max_digits=8, decimal_places=2,
+        verbose_name = _("Amount"),
+        help_text = _("This holds how much the coupon took off the order")
+        )
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["coupon", "-created_date"], name="couponredemption_coupon_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon_id} ---- {self.order_id} ---- {self.amount}"
+
+
 class Cart(BaseModel):
     
     customer = models.ForeignKey(
@@ -499,11 +853,60 @@ class Cart(BaseModel):
     
     class Meta:
         verbose_name_plural = _("Carts")
+        indexes = [
+            models.Index(fields=["customer", "-created_date"], name="cart_customer_created_idx"),
+        ]
 
     @property
     def total_price(self):
-        cart_total = sum([item.total_price for item in self.items.all()])
-        return cart_total
+        return self.items.totals()["total"]
+
+
+class CartItemQuerySet(models.QuerySet):
+
+    def with_pricing(self):
+        """
+        Annotates every line with the prices ``total_price`` computes in Python:
+        ``unit_price``, ``shipping_fee``, ``extra``, ``line_discount`` and ``line_total``.
+        """
+        return self.annotate(
+            list_price_cents=cents(F("product__price")),
+            unit_price_cents=unit_price_cents("product__"),
+            shipping_fee_cents=cents(F("product__shipping_fee")),
+            extra_cents=cents(F("extra_price"), nullable=True),
+        ).annotate(
+            line_items_cents=integer(F("quantity") * (F("unit_price_cents") + F("extra_cents"))),
+            line_shipping_cents=integer(F("quantity") * F("shipping_fee_cents")),
+            line_discount_cents=integer(F("quantity") * (F("list_price_cents") - F("unit_price_cents"))),
+        ).annotate(
+            unit_price=to_money(F("unit_price_cents")),
+            line_discount=to_money(F("line_discount_cents")),
+            line_total=to_money(F("line_items_cents") + F("line_shipping_cents")),
+        )
+
+    def totals(self):
+        """
+        The cart summary (subtotal, shipping, discount and total) in one aggregate query.
+        """
+        # aggregating the bare expressions keeps the query (and its compile cost)
+        # much smaller than aggregating over the with_pricing() annotations
+        quantity = F("quantity")
+        totals = self.aggregate(
+            list_cents=Sum(integer(quantity * cents(F("product__price")))),
+            unit_cents=Sum(integer(quantity * unit_price_cents("product__"))),
+            extra_cents=Sum(integer(quantity * cents(F("extra_price"), nullable=True))),
+            shipping_cents=Sum(integer(quantity * cents(F("product__shipping_fee")))),
+            count=Sum("quantity"),
+        )
+        totals = {key: value or 0 for key, value in totals.items()}
+        summary = {
+            "subtotal": (totals["unit_cents"] + totals["extra_cents"]) * CENT,
+            "shipping": totals["shipping_cents"] * CENT,
+            "discount": (totals["list_cents"] - totals["unit_cents"]) * CENT,
+            "count": totals["count"],
+        }
+        summary["total"] = summary["subtotal"] + summary["shipping"]
+        return summary
 
 
 class CartItem(BaseModel):
@@ -544,9 +947,16 @@ class CartItem(BaseModel):
         help_text = _("This holds the extra price of the cart item")
         )
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["cart", "product"], name="cartitem_cart_product_idx"),
+        ]
+
     @property
     def total_price(self):
-        extra_price = self.extra_price
+        extra_price = self.extra_price or 0
         if float(self.product.discount_price) > 0:
             return self.quantity * (
                 self.product.discount_price + self.product.shipping_fee + extra_price
@@ -557,6 +967,221 @@ class CartItem(BaseModel):
         return f"Cart id({self.cart.id}) ---- {self.product.title} ---- {self.quantity}"
 
 
+class InventoryReservation(BaseModel):
+    
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE,
+        related_name="reservations",
+        verbose_name = _("Product"),
+        help_text = _("This holds the product whose stock is reserved")
+        )
+    
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE,
+        null=True, blank=True, related_name="reservations",
+        verbose_name = _("Order"),
+        help_text = _("This holds the order the stock is reserved for")
+        )
+    
+    cart = models.ForeignKey(
+        Cart, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="reservations",
+        verbose_name = _("Cart"),
+        help_text = _("This holds the cart the stock was reserved from")
+        )
+    
+    size = models.CharField(
+        max_length=20, null=True, blank=True,
+        verbose_name = _("Size"),
+        help_text = _("This holds the size variant whose stock is reserved")
+        )
+    
+    colour = models.CharField(
+        max_length=20, null=True, blank=True,
+        verbose_name = _("Colour"),
+        help_text = _("This holds the colour variant whose stock is reserved")
+        )
+    
+    quantity = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name = _("Quantity"),
+        help_text = _("This holds the reserved quantity")
+        )
+    
+    status = models.CharField(
+        max_length=1, choices=RESERVATION_STATUS_CHOICES,
+        default=RESERVATION_HELD,
+        verbose_name = _("Status"),
+        help_text = _("This holds the state of the reservation")
+        )
+    
+    expires_at = models.DateTimeField(
+        verbose_name = _("Expires At"),
+        help_text = _("This holds the time a held reservation is released if the order is not paid")
+        )
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["status", "expires_at"], name="reservation_status_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ---- {self.quantity} ---- {self.get_status_display()}"
+
+
+class FacetCount(BaseModel):
+    
+    facet = models.CharField(
+        max_length=20,
+        verbose_name = _("Facet"),
+        help_text = _("This holds the name of the facet, e.g. size or category")
+        )
+    
+    value = models.CharField(
+        max_length=64,
+        verbose_name = _("Value"),
+        help_text = _("This holds the filter value of the facet bucket")
+        )
+    
+    label = models.CharField(
+        max_length=255, blank=True,
+        verbose_name = _("Label"),
+        help_text = _("This holds the display name of the facet bucket")
+        )
+    
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name = _("Count"),
+        help_text = _("This holds the number of catalog products in the facet bucket")
+        )
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["facet", "value"], name="facetcount_facet_value_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.facet} ---- {self.value} ---- {self.count}"
+
+
+class FlashSale(BaseModel):
+    
+    title = models.CharField(
+        max_length=255,
+        verbose_name = _("Title"),
+        help_text = _("This holds the name of the flash sale")
+        )
+    
+    percentage_off = models.PositiveIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(99)],
+        verbose_name = _("Percentage Off"),
+        help_text = _("This holds the percentage the products are sold off during the sale")
+        )
+    
+    starts_at = models.DateTimeField(
+        verbose_name = _("Starts At"),
+        help_text = _("This holds when the sale prices go live")
+        )
+    
+    ends_at = models.DateTimeField(
+        verbose_name = _("Ends At"),
+        help_text = _("This holds when the regular prices come back")
+        )
+    
+    status = models.CharField(
+        max_length=1, choices=FLASH_SALE_STATUS_CHOICES,
+        default=FLASH_SALE_SCHEDULED, editable=False,
+        verbose_name = _("Status"),
+        help_text = _("This holds where the sale is in its schedule, moved on by the run_flash_sales command")
+        )
+    
+    warmed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        verbose_name = _("Warmed At"),
+        help_text = _("This holds when the sale prices were computed and the product caches pre-warmed")
+        )
+    
+    products = models.ManyToManyField(
+        Product, blank=True,
+        related_name="flash_sales",
+        verbose_name = _("Products"),
+        help_text = _("This holds the products on sale")
+        )
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # the scheduler's "due to start" and "due to end" scans
+            models.Index(fields=["status", "starts_at"], name="flashsale_status_start_idx"),
+            models.Index(fields=["status", "ends_at"], name="flashsale_status_end_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(ends_at__gt=F("starts_at")),
+                name="flashsale_window_check",
+                violation_error_message=_("The sale must end after it starts."),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ---- {self.percentage_off}% ---- {self.get_status_display()}"
+
+
+class FlashSalePrice(BaseModel):
+    
+    sale = models.ForeignKey(
+        FlashSale, on_delete=models.CASCADE,
+        related_name="prices",
+        verbose_name = _("Flash Sale"),
+        help_text = _("This holds the sale the price belongs to")
+        )
+    
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE,
+        related_name="flash_sale_prices",
+        verbose_name = _("Product"),
+        help_text = _("This holds the product the price belongs to")
+        )
+    
+    # blank for the product itself, else the size or colour whose extra price is included
+    size = models.CharField(
+        max_length=20, blank=True, default="",
+        verbose_name = _("Size"),
+        help_text = _("This holds the size of the variant")
+        )
+    
+    colour = models.CharField(
+        max_length=20, blank=True, default="",
+        verbose_name = _("Colour"),
+        help_text = _("This holds the colour of the variant")
+        )
+    
+    regular_price = models.DecimalField(
+        max_digits=8, decimal_places=2,
+        verbose_name = _("Regular Price"),
+        help_text = _("This holds the price of the variant outside the sale")
+        )
+    
+    sale_price = models.DecimalField(
+        max_digits=8, decimal_places=2,
+        verbose_name = _("Sale Price"),
+        help_text = _("This holds the price of the variant during the sale")
+        )
+    
+    regular_percentage_off = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name = _("Regular Percentage Off"),
+        help_text = _("This holds the product's own percentage off, put back when the sale ends")
+        )
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["sale", "product", "size", "colour"], name="flashsaleprice_variant_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ---- {self.size or '-'} ---- {self.colour or '-'} ---- {self.sale_price}"
+
+
 class Country(BaseModel):
     
     name = models.CharField(
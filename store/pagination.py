@@ -0,0 +1,202 @@
+import uuid
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over the ``(created_date, id)`` pair of ``BaseModel``,
+    or over one of the other ``orderings`` a view allows through ``?ordering=``.
+
+    Every page is fetched with an indexed ``WHERE (created_date, id) < (..)`` seek
+    instead of an OFFSET, so page 1000 costs the same as page 1. Cursors are signed
+    so clients cannot forge positions, and ``has_next`` is worked out by reading one
+    extra row rather than running ``COUNT(*)``.
+    """
+
+    page_size = api_settings.PAGE_SIZE or 30
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    ordering_query_param = "ordering"
+    # ?ordering= value: (column, descending); the id breaks ties in the same direction
+    orderings = {
+        "-created_date": ("created_date", True),
+    }
+    default_ordering = "-created_date"
+    # how a cursor position is read back, per ordering column
+    cursor_parsers = {
+        "created_date": parse_datetime,
+    }
+    signing_salt = "store.pagination.keyset"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The sliced queryset for the requested page, one row longer than the page so
+        ``has_next`` can be answered without counting.
+        """
+        self.ordering = self.get_ordering_name(request)
+        position, reverse = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position, reverse))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering_name(request)
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        # COUNT(*) is only paid for when the client explicitly asks for it
+        self.count = queryset.count() if self.include_count(request) else None
+
+        results = list(self.get_page_queryset(queryset, request))
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict(self.get_pagination_data() + [("results", data)]))
+
+    def get_pagination_data(self):
+        data = [
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("has_next", self.has_next),
+        ]
+        if self.count is not None:
+            data.append(("count", self.count))
+        return data
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def include_count(self, request):
+        return request.query_params.get(self.count_query_param, "").lower() in ("1", "true", "yes")
+
+    def get_ordering_name(self, request):
+        ordering = request.query_params.get(self.ordering_query_param) or self.default_ordering
+        if ordering not in self.orderings:
+            raise ValidationError({self.ordering_query_param: [
+                f"Unknown ordering '{ordering}', use one of: {', '.join(self.orderings)}."]})
+        return ordering
+
+    def descending(self, reverse):
+        _column, descending = self.orderings[self.ordering]
+        return descending != reverse
+
+    def get_ordering(self, reverse):
+        column, _descending = self.orderings[self.ordering]
+        if self.descending(reverse):
+            return (f"-{column}", "-id")
+        return (column, "id")
+
+    def get_seek_filter(self, position, reverse):
+        column, _descending = self.orderings[self.ordering]
+        value, pk = position
+        lookup = "lt" if self.descending(reverse) else "gt"
+        return (
+            Q(**{f"{column}__{lookup}": value})
+            | Q(**{column: value, f"id__{lookup}": pk})
+        )
+
+    def encode_cursor(self, instance, reverse):
+        column, _descending = self.orderings[self.ordering]
+        value = getattr(instance, column)
+        value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        payload = [value, str(instance.pk), int(reverse)]
+        if self.ordering != self.default_ordering:
+            payload.append(self.ordering)
+        token = signing.dumps(payload, salt=self.signing_salt, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            value, pk, reverse, *ordering = signing.loads(token, salt=self.signing_salt)
+            pk = uuid.UUID(pk)
+        except (signing.BadSignature, TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # a cursor is only valid for the ordering it was made for
+        if (ordering[0] if ordering else self.default_ordering) != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+        value = self.parse_position(value)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), bool(reverse)
+
+    def parse_position(self, value):
+        column, _descending = self.orderings[self.ordering]
+        try:
+            return self.cursor_parsers[column](value)
+        except (InvalidOperation, TypeError, ValueError):
+            return None
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "has_next": {"type": "boolean"},
+                "count": {"type": "integer"},
+                "results": schema,
+            },
+        }
+
+
+class ProductPagination(KeysetPagination):
+    """
+    ``KeysetPagination`` that can also sort by the stored ``Product.effective_price``
+    (``?ordering=price`` or ``-price``), seeking on ``product_effective_price_idx``.
+    """
+
+    orderings = {
+        **KeysetPagination.orderings,
+        "price": ("effective_price", False),
+        "-price": ("effective_price", True),
+    }
+    cursor_parsers = {
+        **KeysetPagination.cursor_parsers,
+        "effective_price": Decimal,
+    }
@@ -0,0 +1,88 @@
+"""
+Database-side versions of the price rules in ``Product.discount_price``,
+``Product.get_effective_price`` and ``CartItem.total_price``.
+
+The arithmetic is done on integer cents so that SQLite (which does integer division
+on whole-number prices) and Postgres return exactly what the ``Decimal`` maths in
+Python returns, including ``round()``'s round-half-even behaviour.
+"""
+from decimal import Decimal
+
+from django.db.models import BigIntegerField, Case, DecimalField, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Mod, Round
+from django.db.models.lookups import GreaterThan, LessThan
+
+CENT = Decimal("0.01")
+
+
+def money_field(max_digits=12):
+    return DecimalField(max_digits=max_digits, decimal_places=2)
+
+
+def integer(expression):
+    return ExpressionWrapper(expression, output_field=BigIntegerField())
+
+
+def cents(expression, nullable=False):
+    """
+    A money column (or expression) as whole cents.
+    """
+    if nullable:
+        expression = Coalesce(expression, Value(0))
+    return Cast(Round(ExpressionWrapper(expression * 100, output_field=money_field())), BigIntegerField())
+
+
+def to_money(cents_expression, max_digits=12):
+    return ExpressionWrapper(cents_expression * Value(CENT), output_field=money_field(max_digits))
+
+
+def divide_half_even(numerator, divisor):
+    """
+    ``round(numerator / divisor)`` for a non-negative integer ``numerator`` and an even
+    ``divisor``, rounding ties to even like ``round()`` on a ``Decimal``.
+    """
+    # adding divisor/2 - 1, plus 1 more when the truncated quotient is odd, bumps the
+    # quotient exactly when the remainder is past half, or at half with an odd quotient.
+    # The Cast matters: SQLite's MOD returns a float, which would make this a real division.
+    odd = Cast(Mod(integer(numerator / divisor), 2), BigIntegerField())
+    return integer((numerator + (divisor // 2 - 1) + odd) / divisor)
+
+
+def has_discount(prefix=""):
+    # discount_price is 0 (so the list price is charged) unless 0 < percentage_off < 100
+    return Q(**{f"{prefix}percentage_off__gt": 0, f"{prefix}percentage_off__lt": 100})
+
+
+def unit_price_cents(prefix=""):
+    """
+    What ``CartItem.total_price`` charges per unit before shipping and extras:
+    ``Product.discount_price`` when there is one, otherwise the list price.
+    """
+    return discounted_cents(F(f"{prefix}price"), F(f"{prefix}percentage_off"), has_discount(prefix))
+
+
+def discounted_cents(price, percentage_off, discounted=None):
+    price = cents(price)
+    if discounted is None:
+        discounted = Q(GreaterThan(percentage_off, 0), LessThan(percentage_off, 100))
+    discount_price = divide_half_even(integer(price * (100 - percentage_off)), 100)
+    # a discount that rounds down to 0 charges the list price, like the "> 0" checks in Python
+    return Case(When(Q(discounted, GreaterThan(discount_price, 0)), then=discount_price), default=price,
+                output_field=BigIntegerField())
+
+
+def as_expression(value):
+    return value if hasattr(value, "resolve_expression") else Value(value)
+
+
+def effective_price(price=None, percentage_off=None):
+    """
+    ``Product.get_effective_price()`` for the stored ``effective_price`` column. An
+    UPDATE that sets ``price`` or ``percentage_off`` passes their new values (plain
+    values or expressions), since the columns still read as the old ones in its SET.
+    """
+    if price is None and percentage_off is None:
+        return to_money(unit_price_cents(), max_digits=8)
+    price = F("price") if price is None else as_expression(price)
+    percentage_off = F("percentage_off") if percentage_off is None else as_expression(percentage_off)
+    return to_money(discounted_cents(price, percentage_off), max_digits=8)
@@ -0,0 +1,321 @@
+"""
+Bulk repricing.
+
+A selection of products is loaded once as integer-cent NumPy arrays (``price``,
+``percentage_off``, ``shipping_fee``), a pipeline of rules is applied to the whole
+arrays at once, and only the rows that changed are written back, with only the
+columns the rules write, in chunked ``bulk_update`` calls. No ``Product.save()`` runs,
+so slugs are not regenerated; the stored ``effective_price`` is kept current by
+``ProductQuerySet.bulk_update``.
+
+Rules are written ``name:argument`` and separated by commas, e.g.
+``markup:5,round:0.05,charm:99``. They run left to right:
+
+- ``markup:P``: price times ``(100 + P) / 100``, ``P`` may be negative and have two decimals
+- ``discount:N``: set ``percentage_off`` to ``N``
+- ``round:STEP``: price to the nearest multiple of ``STEP``
+- ``charm:CC``: price up to the next price ending in ``.CC``
+- ``min_price:X`` / ``max_price:X``: clamp the price
+- ``shipping:X``: set the shipping fee
+- ``free_shipping_over:X``: no shipping fee when the effective price is ``X`` or more
+
+All arithmetic is done on whole cents with ties rounded to even, exactly like
+``round()`` on the ``Decimal`` in ``Product.discount_price`` (and store.pricing in SQL),
+so the previewed effective prices are the ones the store will charge.
+"""
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from store.api.choices import FLASH_SALE_ACTIVE
+from store.facets import schedule_refresh
+from store.models import FlashSalePrice, Product
+from store.pricing import CENT
+
+FIELDS = ("price", "percentage_off", "shipping_fee")
+# the largest values the columns hold, in cents (DecimalField(8, 2) and (6, 2))
+MAX_CENTS = {"price": 10 ** 8 - 1, "shipping_fee": 10 ** 6 - 1}
+
+
+def divide_half_even(numerator, divisor):
+    """
+    ``round(numerator / divisor)`` element-wise, ties to even, for integer arrays.
+    """
+    quotient, remainder = np.divmod(numerator, divisor)
+    twice = 2 * remainder
+    return quotient + ((twice > divisor) | ((twice == divisor) & (quotient % 2 == 1)))
+
+
+def effective_cents(price, percentage_off):
+    """
+    ``Product.get_effective_price()`` in cents: the discount price when there is one
+    (0 < percentage_off < 100 and it does not round down to 0), else the list price.
+    """
+    discounted = divide_half_even(price * (100 - percentage_off), 100)
+    has_discount = (percentage_off > 0) & (percentage_off < 100) & (discounted > 0)
+    return np.where(has_discount, discounted, price)
+
+
+def to_cents(value):
+    try:
+        amount = Decimal(value)
+        rounded = amount.quantize(CENT)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"'{value}' is not an amount")
+    if amount != rounded:
+        raise ValueError(f"'{value}' has more than two decimals")
+    return int(amount / CENT)
+
+
+def to_money(cents):
+    return CENT * int(cents)
+
+
+class Rule:
+
+    def __init__(self, name, argument):
+        self.name = name
+        self.argument = argument
+        parse, self.function, self.field = RULES[name]
+        self.value = parse(argument)
+
+    def __str__(self):
+        return f"{self.name}:{self.argument}"
+
+    def apply(self, columns):
+        self.function(columns, self.value)
+
+
+def parse_basis_points(value):
+    # a percentage with up to two decimals, in hundredths of a percent
+    basis_points = to_cents(value)
+    if basis_points <= -10_000:
+        raise ValueError("a markdown has to stay above -100%")
+    return basis_points
+
+
+def parse_percentage(value):
+    if not str(value).isdigit() or int(value) > 100:
+        raise ValueError(f"'{value}' is not a percentage from 0 to 100")
+    return int(value)
+
+
+def parse_step(value):
+    step = to_cents(value)
+    if step <= 0:
+        raise ValueError("the rounding step has to be at least 0.01")
+    return step
+
+
+def parse_ending(value):
+    if not str(value).isdigit() or int(value) > 99:
+        raise ValueError(f"'{value}' is not a price ending from 00 to 99")
+    return int(value)
+
+
+def parse_amount(value):
+    cents = to_cents(value)
+    if cents < 0:
+        raise ValueError("amounts cannot be negative")
+    return cents
+
+
+def markup(columns, basis_points):
+    columns["price"] = divide_half_even(columns["price"] * (10_000 + basis_points), 10_000)
+
+
+def discount(columns, percentage_off):
+    columns["percentage_off"] = np.full_like(columns["percentage_off"], percentage_off)
+
+
+def round_to(columns, step):
+    columns["price"] = np.maximum(divide_half_even(columns["price"], step), 1) * step
+
+
+def charm(columns, ending):
+    price = columns["price"]
+    charmed = price // 100 * 100 + ending
+    columns["price"] = np.where(charmed < price, charmed + 100, charmed)
+
+
+def min_price(columns, cents):
+    columns["price"] = np.maximum(columns["price"], cents)
+
+
+def max_price(columns, cents):
+    columns["price"] = np.minimum(columns["price"], cents)
+
+
+def shipping(columns, cents):
+    columns["shipping_fee"] = np.full_like(columns["shipping_fee"], cents)
+
+
+def free_shipping_over(columns, cents):
+    over = effective_cents(columns["price"], columns["percentage_off"]) >= cents
+    columns["shipping_fee"] = np.where(over, 0, columns["shipping_fee"])
+
+
+# name: (argument parser, vectorized function, the column it writes)
+RULES = {
+    "markup": (parse_basis_points, markup, "price"),
+    "discount": (parse_percentage, discount, "percentage_off"),
+    "round": (parse_step, round_to, "price"),
+    "charm": (parse_ending, charm, "price"),
+    "min_price": (parse_amount, min_price, "price"),
+    "max_price": (parse_amount, max_price, "price"),
+    "shipping": (parse_amount, shipping, "shipping_fee"),
+    "free_shipping_over": (parse_amount, free_shipping_over, "shipping_fee"),
+}
+
+
+def parse_rules(text):
+    """
+    ``"markup:5, round:0.05"`` into rules; raises ``ValueError`` naming the bad rule.
+    """
+    rules = []
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        name, _colon, argument = part.partition(":")
+        name = name.strip()
+        if name not in RULES:
+            raise ValueError(f"Unknown rule '{name}', use one of: {', '.join(RULES)}.")
+        try:
+            rules.append(Rule(name, argument.strip()))
+        except ValueError as error:
+            raise ValueError(f"Invalid rule '{part}': {error}.")
+    if not rules:
+        raise ValueError("No repricing rules given.")
+    return rules
+
+
+class RepricingPlan:
+    """
+    The before and after columns of a selection; only rows that change are written,
+    and only the ``fields`` the rules write.
+    """
+
+    def __init__(self, ids, titles, before, after, fields=FIELDS):
+        self.ids = ids
+        self.titles = titles
+        self.before = before
+        self.after = after
+        self.fields = fields
+        changed = np.zeros(len(ids), dtype=bool)
+        for field in FIELDS:
+            changed |= before[field] != after[field]
+        self.changed = np.flatnonzero(changed)
+
+    @property
+    def selected_count(self):
+        return len(self.ids)
+
+    @property
+    def changed_count(self):
+        return len(self.changed)
+
+    def effective(self, columns):
+        return effective_cents(columns["price"], columns["percentage_off"])
+
+    def summary(self):
+        before = self.effective(self.before)[self.changed]
+        after = self.effective(self.after)[self.changed]
+        return {
+            "selected": self.selected_count,
+            "changed": self.changed_count,
+            "effective_before": to_money(before.sum()),
+            "effective_after": to_money(after.sum()),
+        }
+
+    def changes(self, limit=None):
+        """
+        One dict per changed product, old and new values as ``Decimal``/``int``.
+        """
+        rows = self.changed if limit is None else self.changed[:limit]
+        effective_before, effective_after = self.effective(self.before), self.effective(self.after)
+        for index in rows:
+            yield {
+                "id": self.ids[index],
+                "title": self.titles[index],
+                "price": (to_money(self.before["price"][index]), to_money(self.after["price"][index])),
+                "percentage_off": (int(self.before["percentage_off"][index]),
+                                   int(self.after["percentage_off"][index])),
+                "shipping_fee": (to_money(self.before["shipping_fee"][index]),
+                                 to_money(self.after["shipping_fee"][index])),
+                "effective_price": (to_money(effective_before[index]), to_money(effective_after[index])),
+            }
+
+
+def plan_repricing(queryset, rules):
+    """
+    Applies ``rules`` (a list or a rule string) to the products of ``queryset`` in
+    memory. Raises ``ValueError`` if a new price would not fit its column.
+    """
+    if isinstance(rules, str):
+        rules = parse_rules(rules)
+    rows = list(queryset.order_by().values_list("id", "title", *FIELDS))
+    ids = [row[0] for row in rows]
+    titles = [row[1] for row in rows]
+    before = {
+        "price": np.fromiter((int(row[2] / CENT) for row in rows), dtype=np.int64, count=len(rows)),
+        "percentage_off": np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows)),
+        "shipping_fee": np.fromiter((int(row[4] / CENT) for row in rows), dtype=np.int64, count=len(rows)),
+    }
+    after = {field: values.copy() for field, values in before.items()}
+    for rule in rules:
+        rule.apply(after)
+    for field, limit in MAX_CENTS.items():
+        if len(ids) and (after[field].max() > limit or after[field].min() < 0):
+            raise ValueError(f"The rules put a {field.replace('_', ' ')} outside 0 to {to_money(limit)}.")
+    fields = tuple(field for field in FIELDS if any(rule.field == field for rule in rules))
+    return RepricingPlan(ids, titles, before, after, fields)
+
+
+def apply_plan(plan, batch_size=1000):
+    """
+    Writes the changed rows back, ``batch_size`` products per UPDATE, and returns how
+    many products were updated.
+
+    Only the columns the rules write are updated; the others are read again (and
+    locked) here, so the stored effective price is computed from current values. A
+    product held by a flash sale keeps the sale's percentage off: a new one goes into
+    the sale's snapshot instead, which ``flash_sales.end`` restores.
+    """
+    now = timezone.now()
+    changed = {plan.ids[index]: index for index in plan.changed}
+    with transaction.atomic():
+        current = Product.objects.select_for_update().filter(pk__in=list(changed)).values_list(
+            "pk", *FIELDS, "flash_sale_end_date")
+        products, held = [], []
+        for pk, price, percentage_off, shipping_fee, flash_sale_end_date in current:
+            index = changed[pk]
+            product = Product(pk=pk, price=price, percentage_off=percentage_off, shipping_fee=shipping_fee,
+                              updated_date=now)
+            if "price" in plan.fields:
+                product.price = to_money(plan.after["price"][index])
+            if "shipping_fee" in plan.fields:
+                product.shipping_fee = to_money(plan.after["shipping_fee"][index])
+            if "percentage_off" in plan.fields:
+                if flash_sale_end_date is not None and flash_sale_end_date > now:
+                    held.append((pk, int(plan.after["percentage_off"][index])))
+                else:
+                    product.percentage_off = int(plan.after["percentage_off"][index])
+            products.append(product)
+
+        written = [field for field in plan.fields if field != "percentage_off"]
+        held_ids = {pk for pk, _percentage_off in held}
+        Product.objects.bulk_update([product for product in products if product.pk not in held_ids],
+                                    [*plan.fields, "updated_date"], batch_size=batch_size)
+        if written:
+            Product.objects.bulk_update([product for product in products if product.pk in held_ids],
+                                        [*written, "updated_date"], batch_size=batch_size)
+        if held:
+            FlashSalePrice.objects.filter(product__in=held_ids, size="", colour="", sale__status=FLASH_SALE_ACTIVE,
+                                          regular_percentage_off__isnull=False).update(
+                regular_percentage_off=Case(*[When(product_id=pk, then=Value(percentage_off))
+                                              for pk, percentage_off in held]))
+    facets = [facet for field, facet in (("price", "price"), ("percentage_off", "discount")) if field in plan.fields]
+    if products and facets:
+        schedule_refresh(*facets)
+    return len(products)
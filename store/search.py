@@ -0,0 +1,187 @@
+"""
+Full-text product search over title, description, style and category name.
+
+SQLite uses an FTS5 virtual table and Postgres a ``tsvector`` column with a GIN
+index; both live in ``store_product_search`` (created by migration 0010) and are kept
+in sync by the signals in ``store.signals``. Other databases fall back to
+``icontains`` so the interface works everywhere.
+"""
+import abc
+import re
+import uuid
+
+from django.db import connection
+
+from store.models import Product
+
+SEARCH_TABLE = "store_product_search"
+INDEXED_VALUES = ("id", "title", "description", "style", "category__name")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class BaseSearchBackend(abc.ABC):
+
+    @abc.abstractmethod
+    def search(self, query, limit=30):
+        """
+        Returns ``[(product_id, rank), ...]``, best match first. Every term is matched
+        as a prefix, so ``"snea"`` finds "sneakers".
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def index(self, product_ids):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def documents(product_ids):
+        return Product.objects.filter(pk__in=list(product_ids)).order_by().values_list(*INDEXED_VALUES)
+
+    @staticmethod
+    def db_id(product_id):
+        return Product._meta.pk.get_db_prep_value(product_id, connection)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # bm25 column weights: product_id (unindexed), title, description, style, category
+    weights = (0.0, 10.0, 1.0, 2.0, 4.0)
+
+    def search(self, query, limit=30):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id, bm25({SEARCH_TABLE}, {weights}) AS rank FROM {SEARCH_TABLE} "
+                f"WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+            # bm25 is lower-is-better, flip it so callers can always sort descending
+            return [(uuid.UUID(product_id), -rank) for product_id, rank in cursor.fetchall()]
+
+    def index(self, product_ids):
+        rows = [(self.db_id(pk), title or "", description or "", style or "", category or "")
+                for pk, title, description, style, category in self.documents(product_ids)]
+        self.remove(product_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, title, description, style, category) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        ids = [self.db_id(pk) for pk in product_ids]
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id IN ({', '.join(['%s'] * len(ids))})", ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    config = "english"
+    document_sql = (
+        "setweight(to_tsvector(%(config)s, coalesce(%(title)s, '')), 'A') || "
+        "setweight(to_tsvector(%(config)s, coalesce(%(category)s, '')), 'B') || "
+        "setweight(to_tsvector(%(config)s, coalesce(%(style)s, '')), 'C') || "
+        "setweight(to_tsvector(%(config)s, coalesce(%(description)s, '')), 'D')"
+    )
+
+    def search(self, query, limit=30):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id, ts_rank_cd(document, query) AS rank "
+                f"FROM {SEARCH_TABLE}, to_tsquery(%s, %s) AS query "
+                f"WHERE document @@ query ORDER BY rank DESC LIMIT %s",
+                [self.config, tsquery, limit],
+            )
+            return cursor.fetchall()
+
+    def index(self, product_ids):
+        rows = [
+            {"id": pk, "title": title, "description": description, "style": style, "category": category,
+             "config": self.config}
+            for pk, title, description, style, category in self.documents(product_ids)
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%(id)s, {self.document_sql}) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+    def remove(self, product_ids):
+        ids = list(product_ids)
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = ANY(%s)", [ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {SEARCH_TABLE}")
+
+
+class FallbackSearchBackend(BaseSearchBackend):
+    """
+    ``icontains`` on every term, for databases without a full-text index. Unranked.
+    """
+
+    def search(self, query, limit=30):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        queryset = Product.objects.all()
+        for term in terms:
+            queryset = queryset.filter(title__icontains=term) | queryset.filter(category__name__icontains=term)
+        return [(pk, 0) for pk in queryset.values_list("id", flat=True)[:limit]]
+
+    def index(self, product_ids):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_products(query, limit=30):
+    """
+    Ranked product search. Returns the product ids, best match first.
+    """
+    return [product_id for product_id, _rank in get_search_backend().search(query, limit)]
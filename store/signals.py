@@ -0,0 +1,229 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from store import categories, coupons, facets, inventory
+from store.api.choices import FLASH_SALE_SCHEDULED, PAYMENT_COMPLETE, PAYMENT_FAILED
+from store.cache import product_cache
+from store.models import Category, ColourInventory, CouponCode, FacetCount, FlashSale, Order, Product, ProductImage, ProductReview, SizeInventory
+from store.search import get_search_backend
+from store.slugs import record_slug_change, slug_map
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_review_rating(sender, instance, **kwargs):
+    # keeps the stored (product, rating) so an edit can be applied as a delta
+    instance._previous_rating = (None, None)
+    if instance._state.adding:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list("product_id", "ratings").first()
+    if previous is not None:
+        instance._previous_rating = previous
+
+
+@receiver(post_save, sender=ProductReview)
+def handle_review_rating_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_rating", (None, None))
+    current = (instance.product_id, instance.ratings)
+    if previous == current:
+        return
+    product_ids = {previous[0], current[0]}
+    with transaction.atomic():
+        before = facets.product_buckets(product_ids, ["rating"])
+        Product.update_ratings(*previous, delta=-1)
+        Product.update_ratings(*current, delta=1)
+        facets.adjust_facet_counts(before, facets.product_buckets(product_ids, ["rating"]))
+
+
+@receiver(post_delete, sender=ProductReview)
+def handle_review_rating_deleted(sender, instance, **kwargs):
+    with transaction.atomic():
+        before = facets.product_buckets([instance.product_id], ["rating"])
+        Product.update_ratings(instance.product_id, instance.ratings, delta=-1)
+        facets.adjust_facet_counts(before, facets.product_buckets([instance.product_id], ["rating"]))
+
+
+# the detail payload is keyed by updated_date: drop the version a change supersedes
+@receiver(post_save, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    version = getattr(instance, "_previous_version", None)
+    if version is not None:
+        transaction.on_commit(lambda: product_cache.invalidate(instance.pk, version.timestamp()))
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: product_cache.invalidate(instance.pk, instance.updated_date.timestamp()))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=SizeInventory)
+@receiver(post_delete, sender=SizeInventory)
+@receiver(post_save, sender=ColourInventory)
+@receiver(post_delete, sender=ColourInventory)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def handle_product_child_changed(sender, instance, **kwargs):
+    version = Product.objects.filter(pk=instance.product_id).values_list("updated_date", flat=True).first()
+    Product.touch(instance.product_id)
+    if version is not None:
+        transaction.on_commit(lambda: product_cache.invalidate(instance.product_id, version.timestamp()))
+
+
+@receiver(post_save, sender=Order)
+def handle_order_payment_status(sender, instance, created, **kwargs):
+    if instance.payment_status == PAYMENT_FAILED:
+        inventory.release_order(instance)
+        coupons.release(instance)
+    elif instance.payment_status == PAYMENT_COMPLETE:
+        inventory.commit_order(instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().index([instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products_for_search(sender, instance, created, **kwargs):
+    if created:
+        return
+    product_ids = list(instance.products.values_list("id", flat=True))
+    transaction.on_commit(lambda: get_search_backend().index(product_ids))
+
+
+# facet buckets: remember the ones the product is in before the change and apply the
+# difference afterwards (store.facets.adjust_facet_counts)
+FACET_SOURCES = {
+    Product: ("pk", facets.PRODUCT_FACETS),
+    SizeInventory: ("product_id", ("size",)),
+    ColourInventory: ("product_id", ("colour",)),
+}
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+@receiver(pre_save, sender=SizeInventory)
+@receiver(pre_delete, sender=SizeInventory)
+@receiver(pre_save, sender=ColourInventory)
+@receiver(pre_delete, sender=ColourInventory)
+def remember_facet_buckets(sender, instance, update_fields=None, **kwargs):
+    attribute, names = FACET_SOURCES[sender]
+    names = facets.facets_for_fields(names, update_fields)
+    adding = instance._state.adding and sender is Product
+    instance._facet_buckets = None if adding else facets.product_buckets([getattr(instance, attribute)], names)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=SizeInventory)
+@receiver(post_delete, sender=SizeInventory)
+@receiver(post_save, sender=ColourInventory)
+@receiver(post_delete, sender=ColourInventory)
+def adjust_facet_buckets(sender, instance, update_fields=None, **kwargs):
+    attribute, names = FACET_SOURCES[sender]
+    names = facets.facets_for_fields(names, update_fields)
+    before = getattr(instance, "_facet_buckets", None) or Counter()
+    facets.adjust_facet_counts(before, facets.product_buckets([getattr(instance, attribute)], names))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_facet_counts(sender, instance, created, **kwargs):
+    if not created and facets.is_materialized():
+        # a rename only changes the bucket label
+        FacetCount.objects.filter(facet="category", value=str(instance.pk)).update(label=instance.name[:255])
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_product_state(sender, instance, **kwargs):
+    # AutoSlugField rewrites the slug on every save, so keep the stored one to detect renames,
+    # the stored category and stock to keep the category counts current, and the stored
+    # updated_date to drop the cached detail payload of that version
+    instance._previous_slug, instance._previous_listing, instance._previous_version = None, (None, False), None
+    if not instance._state.adding:
+        previous = sender.objects.filter(pk=instance.pk).values_list("slug", "category_id", "inventory",
+                                                                     "updated_date").first()
+        if previous is not None:
+            instance._previous_slug = previous[0]
+            instance._previous_listing = (previous[1], categories.in_stock(previous[2]))
+            instance._previous_version = previous[3]
+
+
+@receiver(post_save, sender=Product)
+def handle_product_slug_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_slug", None)
+    if previous != instance.slug:
+        record_slug_change(instance, previous)
+
+    def update_slug_map():
+        if previous and previous != instance.slug:
+            slug_map.discard(previous)
+        slug_map.set(instance.slug, instance.pk)
+
+    transaction.on_commit(update_slug_map)
+
+
+@receiver(post_delete, sender=Product)
+def handle_product_slug_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: slug_map.discard(instance.slug))
+
+
+@receiver(post_save, sender=Product)
+def handle_product_category_count_saved(sender, instance, **kwargs):
+    previous_category, was_listed = getattr(instance, "_previous_listing", (None, False))
+    inventory = instance.inventory
+    if not isinstance(inventory, (int, type(None))):
+        # saved with an expression such as F("inventory") - 1
+        inventory = sender.objects.filter(pk=instance.pk).values_list("inventory", flat=True).first()
+    listed = categories.in_stock(inventory)
+    if (previous_category, was_listed) != (instance.category_id, listed):
+        deltas = Counter()
+        deltas[previous_category] -= was_listed
+        deltas[instance.category_id] += listed
+        categories.adjust_counts(deltas)
+
+
+@receiver(post_delete, sender=Product)
+def handle_product_category_count_deleted(sender, instance, **kwargs):
+    if categories.in_stock(instance.inventory):
+        categories.adjust_counts({instance.category_id: -1})
+
+
+@receiver(post_save, sender=Category)
+def handle_category_saved(sender, instance, **kwargs):
+    if getattr(instance, "_moved", False):
+        # the moved subtree's counts leave its old ancestors and join the new ones
+        categories.refresh_category_counts()
+    categories.invalidate()
+
+
+@receiver(post_delete, sender=Category)
+def handle_category_deleted(sender, instance, **kwargs):
+    categories.invalidate()
+
+
+@receiver(post_save, sender=FlashSale)
+def rewarm_edited_flash_sale(sender, instance, created, **kwargs):
+    # prices and cached payloads computed for the old terms are redone on the next scheduler run
+    if not created:
+        sender.objects.filter(pk=instance.pk, status=FLASH_SALE_SCHEDULED).update(warmed_at=None)
+
+
+@receiver(m2m_changed, sender=FlashSale.products.through)
+def rewarm_flash_sale_products(sender, instance, action, reverse, **kwargs):
+    if not reverse and action in ("post_add", "post_remove", "post_clear"):
+        FlashSale.objects.filter(pk=instance.pk, status=FLASH_SALE_SCHEDULED).update(warmed_at=None)
+
+
+@receiver(post_save, sender=CouponCode)
+@receiver(post_delete, sender=CouponCode)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    coupons.invalidate(instance.code)
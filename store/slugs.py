@@ -0,0 +1,82 @@
+"""
+Slug -> product id resolution for the slug detail route.
+
+``slug_map`` keeps the slugs of the newest ``SLUG_MAP_MAX_SIZE`` products in
+process memory. It is loaded with one query the first time it is used and kept
+current by the product signals, so resolving a known slug costs no query. It is a
+hint: other processes may rename or delete a product, so callers check the product
+they get back (see ``ProductSlugDetailView``). A slug the map does not know falls back
+to the unique index on ``Product.slug``.
+
+Old slugs live in ``ProductSlugHistory`` and resolve to the product's current slug
+with one query.
+"""
+import threading
+
+from django.conf import settings
+
+from store.models import Product, ProductSlugHistory
+
+
+class SlugMap:
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._ids = {}
+        self._lock = threading.Lock()
+        self._warm = False
+
+    def warm(self):
+        rows = Product.objects.filter(slug__isnull=False).order_by("-created_date").values_list("slug", "id")
+        ids = dict(rows[:self.maxsize])
+        with self._lock:
+            self._ids = ids
+            self._warm = True
+
+    def get(self, slug):
+        if not self._warm:
+            self.warm()
+        return self._ids.get(slug)
+
+    def set(self, slug, product_id):
+        if not slug:
+            return
+        with self._lock:
+            if slug in self._ids or len(self._ids) < self.maxsize:
+                self._ids[slug] = product_id
+
+    def discard(self, *slugs):
+        with self._lock:
+            for slug in slugs:
+                self._ids.pop(slug, None)
+
+    def resolve(self, slug):
+        """
+        The id of the product whose current slug is ``slug``, or ``None``.
+        """
+        product_id = self.get(slug)
+        if product_id is None:
+            product_id = Product.objects.filter(slug=slug).values_list("id", flat=True).first()
+            if product_id is not None:
+                self.set(slug, product_id)
+        return product_id
+
+
+def current_slug(old_slug):
+    """
+    The current slug of the product that used to be at ``old_slug``, or ``None``.
+    """
+    return ProductSlugHistory.objects.filter(slug=old_slug).values_list("product__slug", flat=True).first()
+
+
+def record_slug_change(product, previous_slug):
+    """
+    Remembers ``previous_slug`` for ``product`` after a rename. A slug that is live again
+    (the product was renamed back, or another product took it) leaves the history.
+    """
+    ProductSlugHistory.objects.filter(slug=product.slug).delete()
+    if previous_slug and previous_slug != product.slug:
+        ProductSlugHistory.objects.update_or_create(slug=previous_slug, defaults={"product": product})
+
+
+slug_map = SlugMap(maxsize=getattr(settings, "SLUG_MAP_MAX_SIZE", 100_000))
@@ -1,3 +1,1054 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import random
+import uuid
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from common.uuids import uuid7_time
+from core.models import User
+from store.api.choices import (FLASH_SALE_ACTIVE, FLASH_SALE_ENDED, PAYMENT_COMPLETE, PAYMENT_FAILED,
+                               RESERVATION_COMMITTED, RESERVATION_RELEASED)
+from store.api.forms import CouponCodeAdminForm
+from store.benchmarks import compare, generate_data, run_benchmarks
+from store.cache import MISSING, product_cache
+from store.coupons import coupon_cache, redeem, validate
+from store.checkout import place_order
+from store.categories import category_cache, refresh_category_counts
+from store.flash_sales import run_scheduler
+from store.facets import Facet, compute_facets, filter_products, materialized_facets, refresh_facet_counts
+from store.export import export_lines
+from store.importer import import_products
+from store.inventory import InsufficientStock, release_expired, reserve_items
+from store.search import BaseSearchBackend, PostgresSearchBackend, SQLiteSearchBackend, get_search_backend
+from store.slugs import current_slug, slug_map
+from store.repricing import apply_plan, effective_cents, parse_rules, plan_repricing
+from store.models import Cart, CartItem, Category, Colour, ColourInventory, CouponCode, CouponRedemption, FlashSale, FlashSalePrice, InventoryReservation, Order, Product, ProductImage, ProductReview, ProductSlugHistory, Size, SizeInventory
+
+
+class ProductListQueryCountTests(TestCase):
+    expand = "category,images,sizes,colours,reviews"
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Shoes")
+        size = Size.objects.create(title="M")
+        colour = Colour.objects.create(name="Red", hex_code="#ff0000")
+        customer = User.objects.create_user(email="buyer@example.com", full_name="Jane Doe", password=None).customer
+        for index in range(40):
+            product = Product.objects.create(title=f"Product {index}", category=category, price=10, inventory=5)
+            SizeInventory.objects.create(product=product, size=size, quantity=2)
+            ColourInventory.objects.create(product=product, colour=colour, quantity=2)
+            ProductImage.objects.create(product=product, _image=f"store/images/{index}.png")
+            ProductReview.objects.create(product=product, customer=customer, ratings=4, description="Good")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries), response.json()["data"]
+
+    def test_expanded_list_query_count_does_not_depend_on_page_size(self):
+        counts = set()
+        for page_size in (1, 10, 40):
+            count, data = self.count_queries(f"/store/product/?page_size={page_size}&expand={self.expand}")
+            self.assertEqual(len(data), page_size)
+            counts.add(count)
+        # freshness check, the page, then one query per expanded to-many relation
+        self.assertEqual(counts, {6})
+
+    def test_expanded_relations_are_rendered(self):
+        _count, data = self.count_queries(f"/store/product/?page_size=1&expand={self.expand}")
+        product = data[0]
+        self.assertEqual(product["category"], {"name": "Shoes"})
+        self.assertEqual(product["sizes"][0]["size"], "M")
+        self.assertEqual(product["colours"][0]["hex_code"], "#ff0000")
+        self.assertEqual(product["reviews"][0]["customer"], "Jane Doe")
+        self.assertEqual(len(product["images"]), 1)
+
+    def test_sparse_fieldset_only_renders_requested_fields(self):
+        count, data = self.count_queries("/store/product/?fields=id,title,discount_price")
+        self.assertEqual(count, 2)
+        self.assertEqual(set(data[0]), {"id", "title", "discount_price"})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/store/product/?expand=suppliers")
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        self.size = Size.objects.create(title="M")
+        self.products = []
+        for index in range(3):
+            product = Product.objects.create(title=f"Product {index}", category=None, price=10, inventory=5)
+            SizeInventory.objects.create(product=product, size=self.size, quantity=5)
+            self.products.append(product)
+
+    def make_cart(self, lines):
+        cart = Cart.objects.create()
+        for product in self.products[:lines]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2, size="M")
+        return cart
+
+    def test_a_cart_is_only_checked_out_once(self):
+        cart = self.make_cart(2)
+        self.assertEqual(self.client.post(f"/store/cart/{cart.pk}/checkout/").status_code, 201)
+        response = self.client.post(f"/store/cart/{cart.pk}/checkout/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 3)
+
+    def test_a_cart_changed_after_pricing_is_not_checked_out(self):
+        cart = self.make_cart(2)
+
+        def change_cart(code):
+            # runs between pricing the lines and the order transaction
+            CartItem.objects.filter(cart=cart, product=self.products[0]).update(quantity=3)
+
+        with mock.patch("store.checkout.get_coupon", side_effect=change_cart), self.assertRaises(ValidationError):
+            place_order(cart)
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 5)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        counts = set()
+        for lines in (1, 3):
+            cart = self.make_cart(lines)
+            with CaptureQueriesContext(connection) as queries:
+                order = place_order(cart)
+            self.assertEqual(order.items.count(), lines)
+            counts.add(len(queries.captured_queries))
+        self.assertEqual(len(counts), 1)
+
+
+class CartPricingTests(TestCase):
+
+    # (price, percentage_off, shipping_fee, extra_price, quantity); the discounts land
+    # exactly on half a cent, or round down to nothing, so round-half-even decides them
+    LINES = [
+        ("0.05", 50, "0", None, 1),
+        ("0.15", 50, "1.00", "0.25", 3),
+        ("1.05", 50, "0.99", None, 2),
+        ("0.03", 50, "0", "0.10", 7),
+        ("2.50", 99, "0", None, 4),
+        ("0.01", 50, "0.50", None, 5),
+        ("19.99", 0, "4.99", "1.50", 2),
+        ("12.34", 100, "0", None, 1),
+    ]
+
+    def setUp(self):
+        self.cart = Cart.objects.create()
+        for index, (price, percentage_off, shipping_fee, extra_price, quantity) in enumerate(self.LINES):
+            product = Product.objects.create(title=f"Product {index}", price=Decimal(price),
+                                             percentage_off=percentage_off, shipping_fee=Decimal(shipping_fee))
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity,
+                                    extra_price=extra_price and Decimal(extra_price))
+
+    def test_line_totals_match_total_price(self):
+        for item in self.cart.items.with_pricing().select_related("product"):
+            self.assertEqual(item.line_total, item.total_price, item.product.title)
+
+    def test_cart_totals_match_total_price(self):
+        items = list(self.cart.items.select_related("product"))
+        totals = self.cart.items.totals()
+        self.assertEqual(totals["total"], sum(item.total_price for item in items))
+        self.assertEqual(totals["count"], sum(item.quantity for item in items))
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner = Product.objects.create(title="Trail runner", category=self.shoes, price=10,
+                                                 style="Sport", description="A light shoe")
+            self.sneaker = Product.objects.create(title="Canvas sneakers", category=self.shoes, price=10,
+                                                  description="For running errands")
+            self.hat = Product.objects.create(title="Sun hat", price=10, description="Wide brim")
+
+    def search(self, query, **params):
+        response = self.client.get("/store/product/search/", {"q": query, "fields": "id,title", **params})
+        self.assertEqual(response.status_code, 200)
+        return [product["title"] for product in response.json()["data"]]
+
+    def test_prefix_terms_ranked_by_field_weight(self):
+        # a title match outranks a description match
+        self.assertEqual(self.search("run"), ["Trail runner", "Canvas sneakers"])
+        self.assertEqual(self.search("snea shoes"), ["Canvas sneakers"])
+        self.assertEqual(self.search("!!!"), [])
+        self.assertEqual(self.client.get("/store/product/search/").status_code, 400)
+
+    def test_limit_is_clamped(self):
+        for limit, expected in (("-5", 1), ("0", 1), ("1", 1), ("500", 2), ("many", 2)):
+            self.assertEqual(len(self.search("run", limit=limit)), expected)
+
+    def test_index_follows_product_and_category_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hat.title = "Sun visor"
+            self.hat.save()
+        self.assertEqual(self.search("visor"), ["Sun visor"])
+        self.assertEqual(self.search("hat"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoes.name = "Footwear"
+            self.shoes.save()
+        self.assertEqual(set(self.search("footwear")), {"Trail runner", "Canvas sneakers"})
+
+        self.runner.delete()
+        self.assertEqual(self.search("run"), ["Canvas sneakers"])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 backend")
+    def test_sqlite_backend_reindexes_without_duplicates(self):
+        backend = get_search_backend()
+        self.assertIsInstance(backend, SQLiteSearchBackend)
+        backend.index([self.runner.pk, self.runner.pk])
+        backend.index([self.runner.pk])
+        self.assertEqual([product_id for product_id, _rank in backend.search("trail")], [self.runner.pk])
+        backend.clear()
+        self.assertEqual(backend.search("trail"), [])
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector backend")
+    def test_postgres_backend_reindexes_without_duplicates(self):
+        backend = get_search_backend()
+        self.assertIsInstance(backend, PostgresSearchBackend)
+        backend.index([self.runner.pk])
+        backend.index([self.runner.pk])
+        self.assertEqual([product_id for product_id, _rank in backend.search("trail")], [self.runner.pk])
+        backend.remove([self.runner.pk])
+        self.assertEqual(backend.search("trail"), [])
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class SearchOnlyBackend(BaseSearchBackend):
+            def search(self, query, limit=30):
+                return []
+
+        with self.assertRaises(TypeError):
+            SearchOnlyBackend()
+
+
+class ProductFacetTests(TestCase):
+
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.hats = Category.objects.create(name="Hats")
+        self.m, self.l = Size.objects.create(title="M"), Size.objects.create(title="L")
+        self.customer = User.objects.create_user(email="buyer@example.com", full_name="Jane Doe",
+                                                 password=None).customer
+        self.runner = Product.objects.create(title="Runner", category=self.shoes, price=40, percentage_off=20)
+        self.boot = Product.objects.create(title="Boot", category=self.shoes, price=120)
+        self.cap = Product.objects.create(title="Cap", category=self.hats, price=15)
+        SizeInventory.objects.create(product=self.runner, size=self.m, quantity=3)
+        SizeInventory.objects.create(product=self.boot, size=self.l, quantity=1)
+        SizeInventory.objects.create(product=self.cap, size=self.m, quantity=0)
+        ProductReview.objects.create(product=self.runner, customer=self.customer, ratings=5, description="Great")
+
+    def buckets(self, facets, name):
+        return {bucket["value"]: bucket["count"] for bucket in facets[name] if bucket["count"]}
+
+    def test_counts_are_disjunctive(self):
+        total, facets = compute_facets({"size": "M", "category": str(self.shoes.pk)})
+        self.assertEqual(total, 1)
+        # the size buckets ignore the size filter, the category buckets the category filter
+        self.assertEqual(self.buckets(facets, "size"), {"M": 1, "L": 1})
+        self.assertEqual(self.buckets(facets, "category"), {str(self.shoes.pk): 1})
+        self.assertEqual(self.buckets(facets, "price"), {"25-50": 1})
+        self.assertEqual(self.buckets(facets, "rating"), {"1": 1, "2": 1, "3": 1, "4": 1})
+
+        response = self.client.get("/store/product/facets/", {"price_band": "0-25,100-250"})
+        self.assertEqual(self.buckets(response.json()["data"], "category"),
+                         {str(self.shoes.pk): 1, str(self.hats.pk): 1})
+        self.assertEqual(self.client.get("/store/product/facets/", {"price_band": "cheap"}).status_code, 400)
+
+    def test_filters_combine(self):
+        titles = lambda **params: set(filter_products(params).values_list("title", flat=True))
+        self.assertEqual(titles(size="M,L"), {"Runner", "Boot"})
+        self.assertEqual(titles(category_tree=str(self.hats.pk)), {"Cap"})
+        self.assertEqual(titles(min_discount="10", max_price="50"), {"Runner"})
+        self.assertEqual(titles(min_rating="4"), {"Runner"})
+        self.assertEqual(titles(in_stock="true"), set())
+
+    @override_settings(MATERIALIZED_FACET_COUNTS=True)
+    def test_materialized_counts_follow_changes_without_a_refresh(self):
+        refresh_facet_counts()
+        with mock.patch("store.facets.refresh_facet_counts") as refresh, self.captureOnCommitCallbacks(execute=True):
+            self.boot.price, self.boot.category = 45, self.hats
+            self.boot.save()
+            self.cap.delete()
+            SizeInventory.objects.filter(product=self.runner).get().delete()
+            SizeInventory.objects.create(product=self.boot, size=self.m, quantity=2)
+            review = ProductReview.objects.get()
+            review.product = self.boot
+            review.save()
+            ProductReview.objects.create(product=self.runner, customer=self.customer, ratings=2, description="Meh")
+            self.hats.name = "Caps"
+            self.hats.save()
+        refresh.assert_not_called()
+        self.assertEqual(materialized_facets(), compute_facets({})[1])
+        self.assertEqual(self.buckets(materialized_facets(), "category"), {str(self.shoes.pk): 1, str(self.hats.pk): 1})
+
+        runner = Product.objects.get(pk=self.runner.pk)
+        with CaptureQueriesContext(connection) as queries:
+            runner.save(update_fields=["title"])
+        self.assertFalse([query for query in queries.captured_queries if "COUNT" in query["sql"]])
+        with CaptureQueriesContext(connection) as queries:
+            runner.save()
+        # the buckets before and after, nothing written when they did not change
+        self.assertEqual(len([query for query in queries.captured_queries if "COUNT" in query["sql"]]), 2)
+        self.assertFalse([query for query in queries.captured_queries if "store_facetcount" in query["sql"]])
+
+    @override_settings(MATERIALIZED_FACET_COUNTS=True)
+    def test_materialized_counts_follow_reservations(self):
+        refresh_facet_counts()
+        self.boot.inventory = 5
+        self.boot.save()
+        reservations = reserve_items([{"product_id": self.boot.pk, "size": "L", "quantity": 1}])
+        # the boot's last L is held, so no product is left in L
+        self.assertEqual(self.buckets(materialized_facets(), "size"), {"M": 1})
+        self.assertEqual(materialized_facets(), compute_facets({})[1])
+
+        InventoryReservation.objects.filter(pk=reservations[0].pk).update(expires_at=timezone.now())
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(self.buckets(materialized_facets(), "size"), {"M": 1, "L": 1})
+        self.assertEqual(materialized_facets(), compute_facets({})[1])
+
+    def test_facet_without_counts_cannot_be_created(self):
+        class UncountedFacet(Facet):
+            pass
+
+        with self.assertRaises(TypeError):
+            UncountedFacet("uncounted", ())
+
+    @override_settings(MATERIALIZED_FACET_COUNTS=True)
+    def test_imported_products_are_counted(self):
+        refresh_facet_counts()
+        rows = io.BytesIO(b"title,category,price,inventory,sizes\nSandal,Shoes,30,4,M:4\nBeanie,Hats,12,1,\n")
+        self.assertEqual(import_products(rows, "csv").created, 2)
+        self.assertEqual(materialized_facets(), compute_facets({})[1])
+
+
+class ProductDetailCacheTests(TestCase):
+
+    def setUp(self):
+        product_cache.cache.local.clear()
+        product_cache.cache.shared.clear()
+        self.product = Product.objects.create(title="Runner", price=40, inventory=5)
+        self.url = f"/store/product/{self.product.pk}/"
+
+    def test_conditional_requests_get_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_child_row_change_gives_a_new_etag_and_payload(self):
+        first = self.client.get(self.url)
+        version = Product.objects.get(pk=self.product.pk).updated_date.timestamp()
+        self.assertIsNot(product_cache.cache.get(product_cache.key(self.product.pk, version)), MISSING)
+        with self.captureOnCommitCallbacks(execute=True):
+            SizeInventory.objects.create(product=self.product, size=Size.objects.create(title="M"), quantity=2)
+        self.assertIs(product_cache.cache.get(product_cache.key(self.product.pk, version)), MISSING)
+
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()["data"]["sizes"][0]["size"], "M")
+
+    def test_saving_drops_the_superseded_version(self):
+        self.client.get(self.url)
+        version = Product.objects.get(pk=self.product.pk).updated_date.timestamp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 45
+            self.product.save()
+        self.assertIs(product_cache.cache.get(product_cache.key(self.product.pk, version)), MISSING)
+        self.assertEqual(self.client.get(self.url).json()["data"]["price"], 45)
+
+
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        self.runner = Product.objects.create(title="Runner", price=40)
+        self.boot = Product.objects.create(title="Boot", price=90)
+        self.customer = User.objects.create_user(email="buyer@example.com", full_name="Jane Doe",
+                                                 password=None).customer
+
+    def aggregates(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum, product.rating_histogram
+
+    def review(self, product, ratings):
+        return ProductReview.objects.create(product=product, customer=self.customer, ratings=ratings,
+                                            description="Review")
+
+    def test_reviews_are_applied_as_deltas(self):
+        review = self.review(self.runner, 5)
+        self.review(self.runner, 3)
+        self.assertEqual(self.aggregates(self.runner), (2, 8, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}))
+        self.assertEqual(self.runner.average_ratings, 4)
+
+        review.ratings = 4
+        review.save()
+        self.assertEqual(self.aggregates(self.runner), (2, 7, {1: 0, 2: 0, 3: 1, 4: 1, 5: 0}))
+
+        review.product = self.boot
+        review.save()
+        self.assertEqual(self.aggregates(self.runner), (1, 3, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}))
+        self.assertEqual(self.aggregates(self.boot)[:2], (1, 4))
+
+        review.delete()
+        self.assertEqual(self.aggregates(self.boot)[:2], (0, 0))
+
+    def test_saving_a_stale_product_keeps_the_ratings(self):
+        stale = Product.objects.get(pk=self.runner.pk)
+        self.review(self.runner, 5)
+        stale.title = "Trail runner"
+        stale.save()
+        self.assertEqual(self.aggregates(self.runner), (1, 5, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}))
+        self.assertEqual(self.runner.title, "Trail runner")
+
+    def test_drifted_aggregates_are_repaired_instead_of_failing(self):
+        review = self.review(self.runner, 5)
+        self.review(self.runner, 2)
+        Product.objects.filter(pk=self.runner.pk).update(rating_count=0, rating_sum=0, rating_5_count=0)
+        review.delete()
+        self.assertEqual(self.aggregates(self.runner), (1, 2, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0}))
+
+    def test_command_reconciles_drifted_products(self):
+        self.review(self.runner, 4)
+        Product.objects.filter(pk=self.boot.pk).update(rating_count=3, rating_sum=9)
+        out = io.StringIO()
+        call_command("reconcile_ratings", "--dry-run", stdout=out)
+        self.assertIn("1 products would be reconciled", out.getvalue())
+        call_command("reconcile_ratings", stdout=io.StringIO())
+        self.assertEqual(self.aggregates(self.boot)[:2], (0, 0))
+        self.assertEqual(self.aggregates(self.runner)[:2], (1, 4))
+
+
+class InventoryReservationTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(title="Runner", price=40, inventory=5)
+        self.size = SizeInventory.objects.create(product=self.product, size=Size.objects.create(title="M"), quantity=3)
+        self.colour = ColourInventory.objects.create(product=self.product, quantity=2,
+                                                     colour=Colour.objects.create(name="Red", hex_code="#ff0000"))
+
+    def stock(self):
+        return (Product.objects.get(pk=self.product.pk).inventory,
+                SizeInventory.objects.get(pk=self.size.pk).quantity,
+                ColourInventory.objects.get(pk=self.colour.pk).quantity)
+
+    def line(self, quantity, size="M", colour="Red"):
+        return {"product_id": self.product.pk, "size": size, "colour": colour, "quantity": quantity}
+
+    def test_nothing_is_reserved_beyond_the_stock(self):
+        with self.assertRaises(InsufficientStock):
+            reserve_items([self.line(6, size="", colour="")])
+        # the product has enough, the colour does not: the product decrement is rolled back too
+        with self.assertRaises(InsufficientStock):
+            reserve_items([self.line(1), self.line(2)])
+        with self.assertRaises(InsufficientStock):
+            reserve_items([self.line(1, size="XL")])
+        self.assertEqual(self.stock(), (5, 3, 2))
+        self.assertFalse(InventoryReservation.objects.exists())
+
+        self.assertEqual(len(reserve_items([self.line(2)])), 1)
+        self.assertEqual(self.stock(), (3, 1, 0))
+
+    def test_failed_payment_releases_and_paid_order_commits(self):
+        failed = Order.objects.create(transaction_ref="failed")
+        paid = Order.objects.create(transaction_ref="paid")
+        reserve_items([self.line(1)], order=failed)
+        reserve_items([self.line(1)], order=paid)
+        self.assertEqual(self.stock(), (3, 1, 0))
+
+        for order, payment_status in ((failed, PAYMENT_FAILED), (paid, PAYMENT_COMPLETE)):
+            order.payment_status = payment_status
+            order.save()
+        # a repeated notification does not put the units back twice
+        failed.save()
+        self.assertEqual(self.stock(), (4, 2, 1))
+        statuses = dict(InventoryReservation.objects.values_list("order__transaction_ref", "status"))
+        self.assertEqual(statuses, {"failed": RESERVATION_RELEASED, "paid": RESERVATION_COMMITTED})
+
+        paid.payment_status = PAYMENT_FAILED
+        paid.save()
+        self.assertEqual(self.stock(), (4, 2, 1))
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.old = Product.objects.create(title="Old, boot", price=40)
+        Product.objects.filter(pk=self.old.pk).update(updated_date=timezone.now() - datetime.timedelta(days=3))
+        self.new = Product.objects.create(title="New runner", price=Decimal("19.99"))
+
+    def test_lines_are_encoded_per_row(self):
+        lines = list(export_lines("products", "csv", chunk_size=1))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("id,title,slug,category"))
+        self.assertIn('"Old, boot"', "".join(lines))
+
+        since = timezone.now() - datetime.timedelta(days=1)
+        rows = [json.loads(line) for line in export_lines("products", "ndjson", updated_since=since)]
+        self.assertEqual([(row["title"], row["price"]) for row in rows], [("New runner", "19.99")])
+
+    def test_endpoint_streams_for_admins_only(self):
+        url = "/store/export/products.ndjson"
+        self.assertEqual(self.client.get(url).status_code, 403)
+        User.objects.create_superuser(email="admin@example.com", full_name="Admin", password="secret")
+        self.client.login(email="admin@example.com", password="secret")
+
+        response = self.client.get(url, {"updated_since": "2000-01-01T00:00:00Z"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 2)
+        for value in ("yesterday", "2024-13-01T00:00:00"):
+            self.assertEqual(self.client.get(url, {"updated_since": value}).status_code, 400)
+        self.assertEqual(self.client.get("/store/export/users.csv").status_code, 404)
+
+    def test_command_rejects_a_malformed_date(self):
+        with self.assertRaisesMessage(CommandError, "is not an ISO 8601 datetime"):
+            call_command("export_data", "products", "--updated-since", "yesterday")
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        for index, price in enumerate((30, 10, 50, 20, 40)):
+            Product.objects.create(title=f"Product {index}", price=price)
+
+    def page(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [product["title"] for product in body["data"]], body
+
+    def test_next_and_previous_links_walk_the_pages(self):
+        titles, body = self.page("/store/product/", page_size=2, fields="title")
+        self.assertEqual((titles, body["previous"], "count" in body), (["Product 4", "Product 3"], None, False))
+        pages = [titles]
+        while body["next"]:
+            titles, body = self.page(body["next"])
+            pages.append(titles)
+        self.assertEqual(pages, [["Product 4", "Product 3"], ["Product 2", "Product 1"], ["Product 0"]])
+
+        titles, body = self.page(body["previous"])
+        self.assertEqual((titles, body["has_next"]), (["Product 2", "Product 1"], True))
+        titles, body = self.page(body["previous"])
+        self.assertEqual((titles, body["previous"]), (["Product 4", "Product 3"], None))
+
+    def test_price_ordering_and_count(self):
+        titles, body = self.page("/store/product/", page_size=3, ordering="price", with_count="true", fields="title")
+        self.assertEqual((titles, body["count"]), (["Product 1", "Product 3", "Product 0"], 5))
+        titles, _body = self.page(body["next"])
+        self.assertEqual(titles, ["Product 4", "Product 2"])
+        self.assertEqual(self.client.get("/store/product/", {"ordering": "title"}).status_code, 400)
+
+    def test_tampered_and_foreign_cursors_are_not_found(self):
+        _titles, body = self.page("/store/product/", page_size=2, ordering="price")
+        cursor = parse_qs(urlparse(body["next"]).query)["cursor"][0]
+        # made for ?ordering=price, not the default ordering
+        self.assertEqual(self.client.get("/store/product/", {"cursor": cursor}).status_code, 404)
+        self.assertEqual(self.client.get("/store/product/", {"cursor": cursor[:-2] + "xx",
+                                                             "ordering": "price"}).status_code, 404)
+        forged = signing.dumps(["not a price", str(uuid.uuid4()), 0, "price"], salt="store.pagination.keyset",
+                               compress=True)
+        self.assertEqual(self.client.get("/store/product/", {"cursor": forged, "ordering": "price"}).status_code, 404)
+        self.assertEqual(self.client.get("/store/product/", {"cursor": "garbage"}).status_code, 404)
+
+
+class ProductSlugTests(TestCase):
+
+    def setUp(self):
+        product_cache.cache.local.clear()
+        product_cache.cache.shared.clear()
+        self.product = Product.objects.create(title="Trail Runner", price=40)
+        slug_map.warm()
+
+    def test_known_slug_resolves_without_a_lookup(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(slug_map.resolve("trail-runner"), self.product.pk)
+        response = self.client.get("/store/product/trail-runner/")
+        self.assertEqual(response.json()["data"]["id"], str(self.product.pk))
+        self.assertEqual(self.client.get("/store/product/no-such-shoe/").status_code, 404)
+
+    def test_old_slug_redirects_permanently_to_the_current_one(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "Road Runner"
+            self.product.save()
+        self.assertEqual(current_slug("trail-runner"), "road-runner")
+        self.assertIsNone(slug_map.get("trail-runner"))
+        response = self.client.get("/store/product/trail-runner/?fields=id")
+        self.assertEqual((response.status_code, response["Location"]), (301, "/store/product/road-runner/?fields=id"))
+        self.assertEqual(self.client.get(response["Location"]).json()["data"]["id"], str(self.product.pk))
+
+        # renamed back: the old slug is live again and leaves the history
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "Trail Runner"
+            self.product.save()
+        self.assertEqual(self.client.get("/store/product/trail-runner/").status_code, 200)
+        self.assertEqual(self.client.get("/store/product/road-runner/").status_code, 301)
+
+    def test_deleted_product_leaves_the_map(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertIsNone(slug_map.get("trail-runner"))
+        self.assertEqual(self.client.get("/store/product/trail-runner/").status_code, 404)
+
+    def test_stale_map_entry_falls_back(self):
+        # another process renamed the product without this map hearing of it
+        Product.objects.filter(pk=self.product.pk).update(slug="road-runner")
+        ProductSlugHistory.objects.create(slug="trail-runner", product=self.product)
+        response = self.client.get("/store/product/trail-runner/")
+        self.assertEqual((response.status_code, response["Location"]), (301, "/store/product/road-runner/"))
+        self.assertIsNone(slug_map.get("trail-runner"))
+
+
+class ProductImportTests(TestCase):
+
+    def test_csv_rows_are_imported_in_bulk_with_unique_slugs(self):
+        Colour.objects.create(name="Red", hex_code="#ff0000")
+        Product.objects.create(title="Trail Runner", price=10, inventory=1)
+        rows = ["title,category,price,inventory,sizes,colours,images"]
+        rows += [f"Item {index},Shoes,9.99,3,S:2;M:1:1.50,Red:4,{index}.png" for index in range(30)]
+        rows += ["Trail Runner!,Shoes,5,1,,,", "Broken,Shoes,free,1,,,", "Item 3,Shoes,1,1,,,"]
+        upload = io.BytesIO("\n".join(rows).encode())
+
+        with CaptureQueriesContext(connection) as queries:
+            report = import_products(upload, "csv", batch_size=100, create_missing=True)
+
+        self.assertEqual((report.rows, report.created), (33, 31))
+        self.assertEqual([error["line"] for error in report.errors], [33, 34])
+        # the import's own budget plus 3 for the category counts (group, ancestor paths, UPDATE)
+        self.assertLess(len(queries.captured_queries), 20 + 3)
+        self.assertEqual(Product.objects.get(title="Trail Runner!").slug, "trail-runner-2")
+        self.assertEqual(SizeInventory.objects.filter(product__title="Item 7").count(), 2)
+        self.assertEqual(ProductImage.objects.filter(product__category__name="Shoes").count(), 30)
+
+        shoes = Category.objects.get(name="Shoes")
+        response = self.client.get("/store/product/", {"category_tree": shoes.pk, "page_size": 50})
+        self.assertEqual(len(response.json()["data"]), 31)
+
+
+class BenchmarkSuiteTests(TestCase):
+    # served from the category cache after the warmup, so they run no queries
+    cached_scenarios = {"category-list"}
+
+    def test_every_scenario_runs_and_query_growth_is_a_regression(self):
+        dataset = generate_data(sellers=2, customers=3, products=20, carts=3, orders=5)
+        results = run_benchmarks(dataset, iterations=3, warmup=1, rounds=1)
+
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(ProductReview.objects.count(), 100)
+        self.assertFalse(Category.objects.exclude(path__endswith="/").exists())
+        for name, result in results["scenarios"].items():
+            self.assertEqual(result["errors"], 0, name)
+            if name not in self.cached_scenarios:
+                self.assertGreater(result["queries"], 0, name)
+
+        self.assertEqual(compare(results, results), [])
+        worse = {"scenarios": {"checkout": {**results["scenarios"]["checkout"]}}}
+        worse["scenarios"]["checkout"]["queries"] += 1
+        self.assertEqual([metric for _name, metric, _before, _after in compare(results, worse)], ["queries"])
+
+
+class CategoryTreeTests(TestCase):
+
+    def setUp(self):
+        category_cache.local.clear()
+        category_cache.shared.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.men = Category.objects.create(name="Men")
+            self.shoes = Category.objects.create(name="Shoes", parent=self.men)
+            self.running = Category.objects.create(name="Running", parent=self.shoes)
+            self.women = Category.objects.create(name="Women")
+            for category, stock in ((self.men, 1), (self.shoes, 2), (self.running, 3), (self.running, 0),
+                                    (self.women, 4)):
+                Product.objects.create(title=f"{category.name} {stock}", category=category, price=10, inventory=stock)
+
+    def counts(self):
+        return {name: (own, tree) for name, own, tree in
+                Category.objects.values_list("name", "product_count", "tree_product_count")}
+
+    def test_paths_and_counts_are_maintained(self):
+        self.assertEqual(self.running.path, f"{self.men.pk.hex}/{self.shoes.pk.hex}/{self.running.pk.hex}/")
+        self.assertEqual(self.running.depth, 2)
+        self.assertEqual(self.counts(), {"Men": (1, 3), "Shoes": (1, 2), "Running": (1, 1), "Women": (1, 1)})
+
+        product = Product.objects.get(title="Running 0")
+        product.inventory = 5
+        product.save()
+        Product.objects.get(title="Shoes 2").delete()
+        self.assertEqual(self.counts(), {"Men": (1, 3), "Shoes": (0, 2), "Running": (2, 2), "Women": (1, 1)})
+        self.assertEqual(refresh_category_counts(), 0)
+
+    def test_subtree_filter_is_one_range_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/store/product/?category_tree={self.shoes.pk}")
+        titles = {product["title"] for product in response.json()["data"]}
+        self.assertEqual(titles, {"Shoes 2", "Running 3", "Running 0"})
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertIn('"store_category"."path" >=', sql)
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        self.shoes.parent = self.women
+        self.shoes.save()
+        self.running.refresh_from_db()
+        self.assertEqual(self.running.path, f"{self.women.pk.hex}/{self.shoes.pk.hex}/{self.running.pk.hex}/")
+        self.assertEqual(self.counts(), {"Men": (1, 1), "Shoes": (1, 2), "Running": (1, 1), "Women": (1, 3)})
+
+        self.women.parent = self.running
+        with self.assertRaises(ValidationError):
+            self.women.save()
+
+    def test_selling_the_last_unit_updates_the_counts(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=Product.objects.get(title="Men 1"), quantity=1)
+        self.client.post(f"/store/cart/{cart.pk}/checkout/")
+        self.assertEqual(self.counts()["Men"], (0, 2))
+
+    def test_tree_is_cached_until_categories_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tree = self.client.get("/store/category/tree/").json()["data"]
+        self.assertEqual([node["name"] for node in tree], ["Men", "Women"])
+        self.assertEqual(tree[0]["children"][0]["children"][0]["name"], "Running")
+        self.assertEqual(tree[0]["tree_product_count"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(title="Women 4")
+            product.price = 12
+            product.save()
+        with self.assertNumQueries(0):
+            self.client.get("/store/category/tree/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Kids")
+        with self.assertNumQueries(1):
+            tree = self.client.get("/store/category/tree/").json()["data"]
+        self.assertEqual([node["name"] for node in tree], ["Kids", "Men", "Women"])
+
+
+class RekeyUUID7Tests(TestCase):
+
+    def test_existing_keys_and_their_references_are_rewritten(self):
+        men = Category.objects.create(id=uuid.uuid4(), name="Men")
+        shoes = Category.objects.create(id=uuid.uuid4(), name="Shoes", parent=men)
+        product = Product.objects.create(id=uuid.uuid4(), title="Runner", category=shoes, price=10, inventory=2)
+        cart = Cart.objects.create()
+        CartItem.objects.create(id=uuid.uuid4(), cart=cart, product=product, quantity=1)
+
+        call_command("rekey_uuid7", models="store.Category,store.Product", stdout=io.StringIO())
+
+        product = Product.objects.select_related("category__parent").get(title="Runner")
+        self.assertEqual(product.pk.version, 7)
+        self.assertLess(abs(uuid7_time(product.pk) - product.created_date).total_seconds(), 0.001)
+        self.assertEqual((product.category.name, product.category.parent.name), ("Shoes", "Men"))
+        self.assertEqual(product.category.path, f"{product.category.parent.pk.hex}/{product.category.pk.hex}/")
+        self.assertEqual(CartItem.objects.get().product_id, product.pk)
+        self.assertEqual(Cart.objects.get().pk, cart.pk)
+        self.assertEqual(Category.objects.filter(pk__in=[men.pk, shoes.pk]).count(), 0)
+
+    def test_search_index_follows_rekeyed_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(id=uuid.uuid4(), title="Trail runner", price=10)
+
+        call_command("rekey_uuid7", models="store.Product", batch_size=1, stdout=io.StringIO())
+
+        product = Product.objects.get(title="Trail runner")
+        self.assertEqual(product.pk.version, 7)
+        self.assertEqual([product_id for product_id, _rank in get_search_backend().search("trail")], [product.pk])
+
+    @skipUnless(connection.vendor == "postgresql", "search table foreign key")
+    def test_search_table_foreign_key_holds_after_rekeying(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                Product.objects.create(id=uuid.uuid4(), title=f"Runner {index}", price=10)
+
+        call_command("rekey_uuid7", models="store.Product", batch_size=2, stdout=io.StringIO())
+
+        # deferred constraints are checked at commit, which a test never reaches
+        connection.check_constraints()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT product_id FROM store_product_search")
+            indexed = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(indexed, set(Product.objects.values_list("id", flat=True)))
+
+
+class FlashSaleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        product_cache.cache.local.clear()
+        self.client = APIClient()
+        self.starts_at = timezone.now() - datetime.timedelta(minutes=10)
+        self.product = Product.objects.create(title="Runner", price=100, percentage_off=10, inventory=5)
+        SizeInventory.objects.create(product=self.product, size=Size.objects.create(title="L"), extra_price=5)
+        Product.objects.filter(pk=self.product.pk).update(updated_date=self.starts_at - datetime.timedelta(hours=1))
+        self.sale = FlashSale.objects.create(title="Weekend", percentage_off=30, starts_at=self.starts_at,
+                                             ends_at=self.starts_at + datetime.timedelta(hours=1))
+        self.sale.products.add(self.product)
+
+    def test_sale_is_warmed_started_and_ended_at_its_boundaries(self):
+        self.assertEqual(run_scheduler(self.starts_at - datetime.timedelta(seconds=30))["warmed"], 1)
+        prices = {(price.size, price.regular_price, price.sale_price) for price in FlashSalePrice.objects.all()}
+        self.assertEqual(prices, {("", 90, 70), ("L", 95, 75)})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.percentage_off, 10)
+
+        self.assertEqual(run_scheduler(self.starts_at)["activated"], 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.percentage_off, self.product.discount_price), (30, 70))
+        self.assertEqual(self.product.updated_date, self.starts_at)
+        # the detail payload was stored before the sale started, only the freshness check runs
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/store/product/{self.product.pk}/")
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(response.json()["data"]["discount_price"], 70)
+        listing = self.client.get("/store/product/flash-sales/?fields=id,discount_price").json()["data"]
+        self.assertEqual(listing, [{"id": str(self.product.pk), "discount_price": 70}])
+
+        self.assertEqual(run_scheduler(self.sale.ends_at)["ended"], 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.percentage_off, self.product.flash_sale_end_date), (10, None))
+        self.assertEqual(FlashSale.objects.get().status, FLASH_SALE_ENDED)
+
+    def test_product_held_by_another_sale_is_left_alone(self):
+        other_end = self.sale.ends_at + datetime.timedelta(hours=1)
+        Product.objects.filter(pk=self.product.pk).update(
+            percentage_off=50, flash_sale_start_date=self.starts_at, flash_sale_end_date=other_end)
+
+        run_scheduler(self.starts_at)
+        self.product.refresh_from_db()
+        self.assertEqual(FlashSale.objects.get().status, FLASH_SALE_ACTIVE)
+        self.assertEqual((self.product.percentage_off, self.product.flash_sale_end_date), (50, other_end))
+        run_scheduler(self.sale.ends_at)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.percentage_off, 50)
+
+    def test_listing_limit_is_clamped(self):
+        run_scheduler(self.starts_at)
+        Product.objects.create(title="Boot", price=80, percentage_off=30, inventory=5,
+                               flash_sale_start_date=self.starts_at, flash_sale_end_date=self.sale.ends_at)
+        for limit, expected in (("-5", 1), ("0", 1), ("1", 1), ("500", 2), ("many", 2)):
+            response = self.client.get(f"/store/product/flash-sales/?fields=id&limit={limit}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["data"]), expected)
+
+
+class EffectivePriceTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_consistent(self):
+        for product in Product.objects.all():
+            self.assertEqual(product.effective_price, product.get_effective_price(), product.title)
+
+    def test_column_follows_every_write_path(self):
+        product = Product.objects.create(title="Saved", price=Decimal("19.99"), percentage_off=15)
+        self.assertEqual(Product.objects.get(pk=product.pk).effective_price, Decimal("16.99"))
+        product.percentage_off = 0
+        product.save(update_fields=["percentage_off"])
+        self.assertEqual(Product.objects.get(pk=product.pk).effective_price, Decimal("19.99"))
+
+        prices = [Decimal("0.05"), Decimal("0.15"), Decimal("10.01"), Decimal("99.99"), Decimal("123.45")]
+        Product.objects.bulk_create([Product(title=f"Bulk {index}", slug=f"bulk-{index}", price=price)
+                                     for index, price in enumerate(prices)])
+        self.assert_consistent()
+        # including the half-cent ties that round to even
+        for percentage_off in (1, 33, 50, 99, 100):
+            Product.objects.update(percentage_off=percentage_off)
+            self.assert_consistent()
+        products = list(Product.objects.all())
+        for product in products:
+            product.price += 1
+        Product.objects.bulk_update(products, ["price"])
+        self.assert_consistent()
+
+    def test_consistency_checker_reports_and_repairs_drift(self):
+        Product.objects.create(title="Runner", price=50, percentage_off=10)
+        call_command("check_effective_prices", stdout=io.StringIO())
+        Product.objects.update(effective_price=1)
+        with self.assertRaises(CommandError):
+            call_command("check_effective_prices", stdout=io.StringIO())
+        call_command("check_effective_prices", fix=True, stdout=io.StringIO())
+        self.assertEqual(Product.objects.get().effective_price, 45)
+
+    def test_list_sorts_and_filters_on_the_effective_price(self):
+        for index, (price, percentage_off) in enumerate([(100, 50), (40, 0), (80, 10), (60, 0), (30, 0)]):
+            Product.objects.create(title=f"Product {index}", price=price, percentage_off=percentage_off)
+
+        seen, url = [], "/store/product/?ordering=price&page_size=2&fields=id,effective_price"
+        while url:
+            body = self.client.get(url).json()
+            seen += [product["effective_price"] for product in body["data"]]
+            url = body["next"]
+        self.assertEqual(seen, [30, 40, 50, 60, 72])
+
+        body = self.client.get("/store/product/?ordering=-price&min_effective_price=45&max_effective_price=65").json()
+        self.assertEqual([product["effective_price"] for product in body["data"]], [60, 50])
+        self.assertEqual(self.client.get("/store/product/?ordering=rating").status_code, 400)
+
+
+class RepricingTests(TestCase):
+
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.runner = Product.objects.create(title="Runner", category=self.shoes, price=Decimal("19.99"))
+        self.boot = Product.objects.create(title="Boot", category=self.shoes, price=Decimal("120.00"), percentage_off=25)
+        self.hat = Product.objects.create(title="Hat", price=Decimal("9.99"))
+
+    def test_vectorized_effective_price_matches_the_model(self):
+        rng = random.Random(7)
+        products = [Product(price=Decimal(rng.randint(1, 10 ** 6)) / 100, percentage_off=rng.randint(0, 110))
+                    for _index in range(2000)]
+        products += [Product(price=Decimal(cents) / 100, percentage_off=50) for cents in (1, 3, 5, 25, 45)]
+        prices = np.array([int(product.price * 100) for product in products])
+        percentages = np.array([product.percentage_off for product in products])
+        self.assertEqual([Decimal(int(cents)) / 100 for cents in effective_cents(prices, percentages)],
+                         [product.get_effective_price() for product in products])
+
+    def test_rules_are_previewed_then_written_in_bulk(self):
+        plan = plan_repricing(Product.objects.filter(category=self.shoes), "markup:10,round:0.05,charm:99")
+        changes = {change["title"]: change for change in plan.changes()}
+        self.assertEqual(changes["Runner"]["price"], (Decimal("19.99"), Decimal("22.99")))
+        self.assertEqual(changes["Boot"]["effective_price"], (Decimal("90.00"), Decimal("99.74")))
+        self.assertEqual(Product.objects.get(pk=self.runner.pk).price, Decimal("19.99"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(apply_plan(plan), 2)
+        # the locking read of the current columns and one UPDATE, inside a savepoint
+        self.assertLessEqual(len(queries.captured_queries), 4)
+        boot = Product.objects.get(pk=self.boot.pk)
+        self.assertEqual((boot.price, boot.effective_price, boot.slug), (Decimal("132.99"), Decimal("99.74"), "boot"))
+        self.assertEqual(Product.objects.get(pk=self.hat.pk).price, Decimal("9.99"))
+
+    def test_only_the_written_columns_are_updated(self):
+        plan = plan_repricing(Product.objects.filter(pk=self.boot.pk), "markup:10")
+        self.assertEqual(plan.fields, ("price",))
+        # changed after the plan was made, e.g. by a flash sale starting
+        Product.objects.filter(pk=self.boot.pk).update(percentage_off=50)
+        apply_plan(plan)
+        boot = Product.objects.get(pk=self.boot.pk)
+        self.assertEqual((boot.price, boot.percentage_off, boot.effective_price),
+                         (Decimal("132.00"), 50, Decimal("66.00")))
+
+    def test_products_in_a_flash_sale_keep_the_sale_percentage(self):
+        starts_at = timezone.now() - datetime.timedelta(minutes=5)
+        sale = FlashSale.objects.create(title="Weekend", percentage_off=40, starts_at=starts_at,
+                                        ends_at=starts_at + datetime.timedelta(hours=1))
+        sale.products.add(self.boot)
+        run_scheduler(starts_at)
+        plan = plan_repricing(Product.objects.filter(category=self.shoes), "discount:15")
+        self.assertEqual(apply_plan(plan), 2)
+        boot, runner = Product.objects.get(pk=self.boot.pk), Product.objects.get(pk=self.runner.pk)
+        self.assertEqual((boot.percentage_off, boot.effective_price), (40, Decimal("72.00")))
+        self.assertEqual(runner.percentage_off, 15)
+
+        run_scheduler(sale.ends_at)
+        self.assertEqual(Product.objects.get(pk=self.boot.pk).percentage_off, 15)
+
+    def test_invalid_rules_are_rejected(self):
+        for rules in ("", "double:2", "markup:-100", "round:0.001", "discount:120"):
+            with self.assertRaises(ValueError):
+                parse_rules(rules)
+        with self.assertRaises(ValueError):
+            plan_repricing(Product.objects.all(), "min_price:1000000")
+
+    # the admin templates need static URLs without a collectstatic manifest
+    @override_settings(STORAGES={"default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                                 "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}})
+    def test_admin_action_previews_before_applying(self):
+        User.objects.create_superuser(email="admin@example.com", full_name="Admin", password="secret")
+        self.client.login(email="admin@example.com", password="secret")
+        data = {"action": "reprice", "_selected_action": [str(self.hat.pk)], "rules": "shipping:4.50"}
+        response = self.client.post("/admin/store/product/", data)
+        self.assertContains(response, "1 of 1 products change")
+        self.assertEqual(Product.objects.get(pk=self.hat.pk).shipping_fee, 0)
+
+        self.client.post("/admin/store/product/", {**data, "apply": "1"})
+        self.assertEqual(Product.objects.get(pk=self.hat.pk).shipping_fee, Decimal("4.50"))
+
+
+class CouponServiceTests(TestCase):
+
+    def setUp(self):
+        coupon_cache.local.clear()
+        coupon_cache.shared.clear()
+        self.product = Product.objects.create(title="Boot", category=Category.objects.create(name="Shoes"),
+                                              price=50, inventory=10)
+        self.coupon = CouponCode.objects.create(price=15, max_uses=1,
+                                                expiry_date=timezone.now() + datetime.timedelta(days=1))
+
+    def checkout(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        return self.client.post(f"/store/cart/{cart.pk}/checkout/", {"coupon_code": self.coupon.code.lower()})
+
+    def test_validation_is_cached(self):
+        self.assertEqual(validate(self.coupon.code.lower())["id"], self.coupon.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f"/store/coupon/{self.coupon.code}/").json()["data"]["price"], 15)
+        with self.assertRaises(ValidationError):
+            validate("NOPE1234")
+        with self.assertNumQueries(0), self.assertRaises(ValidationError):
+            validate("nope1234")
+
+    def test_usage_limit_is_enforced_and_released(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["data"]["total_price"], 35)
+        redemption = CouponRedemption.objects.get()
+        self.assertEqual((redemption.coupon_id, redemption.amount), (self.coupon.pk, 15))
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("coupon_code", response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = redemption.order
+            order.payment_status = PAYMENT_FAILED
+            order.save()
+        self.assertFalse(CouponRedemption.objects.exists())
+        self.assertEqual(self.checkout().status_code, 201)
+
+    def test_saving_does_not_overwrite_concurrent_redemptions(self):
+        self.coupon.max_uses = 5
+        self.coupon.save()
+        admin_copy = CouponCode.objects.get(pk=self.coupon.pk)
+        for _ in range(3):
+            order = Order.objects.create(transaction_ref=uuid.uuid4().hex)
+            redeem(validate(self.coupon.code), order, 15)
+        admin_copy.price = 20
+        admin_copy.save()
+        self.coupon.refresh_from_db()
+        self.assertEqual((self.coupon.times_used, self.coupon.price), (3, 20))
+
+        data = {"price": 20, "expired": False, "expiry_date": self.coupon.expiry_date, "max_uses": 2}
+        form = CouponCodeAdminForm(data, instance=admin_copy)
+        self.assertIn("max_uses", form.errors)
+        self.assertTrue(CouponCodeAdminForm({**data, "max_uses": 3}, instance=admin_copy).is_valid())